@@ -0,0 +1,70 @@
+from datetime import datetime, timezone
+from decimal import Decimal
+from enum import Enum
+from typing import Literal, Optional
+from uuid import uuid4
+
+from pydantic import BaseModel, Field
+
+JobFlow = Literal["brazilian_ecommerce_dimensional_etl", "update_posts_users_table"]
+
+
+class JobRequest(BaseModel):
+    job_id: str = Field(default_factory=lambda: uuid4().hex)
+    flow: JobFlow = "brazilian_ecommerce_dimensional_etl"
+    # Staging tables or file names to load; all of DATASETS when omitted.
+    datasets: Optional[list[str]] = None
+    mode: Literal["full", "incremental"] = "full"
+
+
+class JobState(str, Enum):
+    queued = "queued"
+    running = "running"
+    succeeded = "succeeded"
+    failed = "failed"
+
+    @property
+    def finished(self) -> bool:
+        return self in (JobState.succeeded, JobState.failed)
+
+
+class JobStatus(BaseModel):
+    job_id: str
+    request: JobRequest
+    state: JobState = JobState.queued
+    message: str = "queued"
+    error: Optional[str] = None
+    submitted_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    # Bumped on every change so streaming clients only send updates.
+    version: int = 0
+
+
+class Customer(BaseModel):
+    customer_sk: int
+    customer_id: str
+    customer_unique_id: Optional[str] = None
+    zip_code_prefix: Optional[str] = None
+    city: Optional[str] = None
+    state: Optional[str] = None
+
+
+class Order(BaseModel):
+    order_id: str
+    customer_id: Optional[str] = None
+    order_status: Optional[str] = None
+    purchase_date_key: Optional[int] = None
+    items_count: Optional[int] = None
+    order_item_total: Optional[Decimal] = None
+    freight_total: Optional[Decimal] = None
+    payment_total: Optional[Decimal] = None
+
+
+class CustomerOrderTotals(BaseModel):
+    customer_id: str
+    orders_count: int
+    items_count: int
+    order_item_total: Decimal
+    freight_total: Decimal
+    payment_total: Decimal
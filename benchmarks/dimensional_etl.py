@@ -0,0 +1,343 @@
+"""
+Benchmark the brazilian_ecommerce_dimensional_etl stages on synthetic Olist-shaped data.
+
+Generates the nine DATASETS files at a scale factor of the real Olist dump, runs
+every load_csv_to_table call, index_staging_tables, load_dimensions and load_facts
+against the database behind ``--block-name``, and writes one JSON object per stage:
+
+    python -m benchmarks.dimensional_etl --scale 1 --scale 10 --output bench.jsonl
+
+``process_peak_rss_kb`` is the peak RSS of the whole benchmark process up to the
+end of a stage, so a stage shows the peak of an earlier one unless it exceeds it.
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import random
+import resource
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Iterator
+
+from prefect import flow
+from sqlalchemy import text
+
+from etl.db_connection import BLOCK_NAME, pooled_connector
+from etl.flows.prefect_brazilian_ecommerce_dimensional import (
+    DATASETS,
+    DIMENSION_LOADS,
+    FACT_LOADS,
+    STAGING_SCHEMAS,
+    create_dw_tables,
+    create_staging_tables,
+    index_staging_tables,
+    load_csv_to_table,
+    load_dimensions,
+    load_facts,
+)
+
+# Row counts of the public Olist dump, i.e. scale factor 1.
+OLIST_ORDERS = 99_441
+OLIST_GEOLOCATIONS = 1_000_163
+OLIST_PRODUCTS = 32_951
+OLIST_SELLERS = 3_095
+
+STATES = ["SP", "RJ", "MG", "RS", "PR", "SC", "BA", "DF", "GO", "ES"]
+CITIES = ["sao paulo", "rio de janeiro", "belo horizonte", "curitiba", "porto alegre", "campinas"]
+ORDER_STATUSES = ["delivered"] * 20 + ["shipped", "canceled", "invoiced", "processing", "unavailable"]
+PAYMENT_TYPES = ["credit_card"] * 7 + ["boleto", "boleto", "voucher", "debit_card"]
+CATEGORIES = [
+    ("beleza_saude", "health_beauty"),
+    ("cama_mesa_banho", "bed_bath_table"),
+    ("esporte_lazer", "sports_leisure"),
+    ("informatica_acessorios", "computers_accessories"),
+    ("moveis_decoracao", "furniture_decor"),
+    ("utilidades_domesticas", "housewares"),
+    ("relogios_presentes", "watches_gifts"),
+    ("telefonia", "telephony"),
+]
+FIRST_PURCHASE = datetime(2016, 9, 4)
+PURCHASE_DAYS = 730
+
+
+def _hex_id(rng: random.Random) -> str:
+    return f"{rng.getrandbits(128):032x}"
+
+
+def _ts(value: datetime | None) -> str:
+    return value.strftime("%Y-%m-%d %H:%M:%S") if value else ""
+
+
+def _write(path: Path, table: str, rows: Iterator[list[Any]]) -> None:
+    with path.open("w", newline="", encoding="utf-8") as handle:
+        writer = csv.writer(handle, quoting=csv.QUOTE_MINIMAL)
+        writer.writerow(STAGING_SCHEMAS[table].keys())
+        writer.writerows(rows)
+
+
+def generate_dataset(data_path: Path, scale: float, seed: int = 42) -> None:
+    """Write the nine DATASETS files with referentially consistent synthetic rows."""
+    rng = random.Random(seed)
+    data_path.mkdir(parents=True, exist_ok=True)
+    files = {table: data_path / file_name for file_name, table in DATASETS}
+
+    n_orders = max(1, int(OLIST_ORDERS * scale))
+    sellers = [_hex_id(rng) for _ in range(max(1, int(OLIST_SELLERS * scale)))]
+    products = [_hex_id(rng) for _ in range(max(1, int(OLIST_PRODUCTS * scale)))]
+
+    _write(
+        files["staging.product_category_name_translation"],
+        "staging.product_category_name_translation",
+        iter([list(category) for category in CATEGORIES]),
+    )
+    _write(
+        files["staging.sellers"],
+        "staging.sellers",
+        ([seller, f"{rng.randint(1000, 99990):05d}", rng.choice(CITIES), rng.choice(STATES)] for seller in sellers),
+    )
+    _write(
+        files["staging.products"],
+        "staging.products",
+        (
+            [
+                product,
+                rng.choice(CATEGORIES)[0] if rng.random() > 0.02 else "",
+                rng.randint(5, 76),
+                rng.randint(4, 3992),
+                rng.randint(1, 20),
+                rng.randint(50, 30000),
+                rng.randint(7, 105),
+                rng.randint(2, 105),
+                rng.randint(6, 118),
+            ]
+            for product in products
+        ),
+    )
+    _write(
+        files["staging.geolocations"],
+        "staging.geolocations",
+        (
+            [
+                f"{rng.randint(1000, 99990):05d}",
+                round(rng.uniform(-33.7, 5.2), 14),
+                round(rng.uniform(-73.9, -34.8), 14),
+                rng.choice(CITIES),
+                rng.choice(STATES),
+            ]
+            for _ in range(max(1, int(OLIST_GEOLOCATIONS * scale)))
+        ),
+    )
+
+    handles = {
+        table: files[table].open("w", newline="", encoding="utf-8")
+        for table in (
+            "staging.customers",
+            "staging.orders",
+            "staging.order_items",
+            "staging.order_payments",
+            "staging.order_reviews",
+        )
+    }
+    try:
+        writers = {table: csv.writer(handle) for table, handle in handles.items()}
+        for table, writer in writers.items():
+            writer.writerow(STAGING_SCHEMAS[table].keys())
+
+        for _ in range(n_orders):
+            customer_id, order_id = _hex_id(rng), _hex_id(rng)
+            status = rng.choice(ORDER_STATUSES)
+            purchased = FIRST_PURCHASE + timedelta(seconds=rng.randrange(PURCHASE_DAYS * 86400))
+            approved = purchased + timedelta(hours=rng.randint(0, 48)) if status != "canceled" else None
+            carrier = approved + timedelta(days=rng.randint(1, 5)) if approved and status in ("delivered", "shipped") else None
+            delivered = carrier + timedelta(days=rng.randint(1, 20)) if carrier and status == "delivered" else None
+            estimated = purchased.replace(hour=0, minute=0, second=0) + timedelta(days=rng.randint(10, 40))
+
+            writers["staging.customers"].writerow(
+                [customer_id, _hex_id(rng), f"{rng.randint(1000, 99990):05d}", rng.choice(CITIES), rng.choice(STATES)]
+            )
+            writers["staging.orders"].writerow(
+                [order_id, customer_id, status, _ts(purchased), _ts(approved), _ts(carrier), _ts(delivered), _ts(estimated)]
+            )
+
+            order_total = 0.0
+            for item_id in range(1, 1 + (1 if rng.random() < 0.9 else rng.randint(2, 6))):
+                price = round(rng.uniform(0.85, 1500), 2)
+                freight = round(rng.uniform(0, 120), 2)
+                order_total += price + freight
+                writers["staging.order_items"].writerow(
+                    [
+                        order_id,
+                        item_id,
+                        rng.choice(products),
+                        rng.choice(sellers),
+                        _ts(purchased + timedelta(days=rng.randint(2, 7))),
+                        f"{price:.2f}",
+                        f"{freight:.2f}",
+                    ]
+                )
+
+            payments = 1 if rng.random() < 0.97 else rng.randint(2, 4)
+            for sequential in range(1, payments + 1):
+                writers["staging.order_payments"].writerow(
+                    [order_id, sequential, rng.choice(PAYMENT_TYPES), rng.randint(1, 10), f"{order_total / payments:.2f}"]
+                )
+
+            if rng.random() < 0.99:
+                created = (delivered or estimated) + timedelta(days=rng.randint(0, 3))
+                writers["staging.order_reviews"].writerow(
+                    [
+                        _hex_id(rng),
+                        order_id,
+                        rng.randint(1, 5),
+                        "",
+                        "produto chegou no prazo,\nrecomendo" if rng.random() < 0.1 else "",
+                        _ts(created.replace(hour=0, minute=0, second=0)),
+                        _ts(created + timedelta(hours=rng.randint(1, 72))),
+                    ]
+                )
+    finally:
+        for handle in handles.values():
+            handle.close()
+
+
+def _peak_rss_kb() -> int:
+    """Peak RSS of this process so far; it never decreases between stages."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and kilobytes on Linux.
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def _db_active_seconds(block_name: str) -> float | None:
+    """Return pg_stat_database.active_time (PostgreSQL 14+) in seconds, if available."""
+    with pooled_connector(block_name) as connector:
+        try:
+            with connector.get_connection(begin=False) as connection:
+                connection.execute(text("SELECT pg_stat_clear_snapshot();"))
+                active_ms = connection.execute(
+                    text("SELECT active_time FROM pg_stat_database WHERE datname = current_database();")
+                ).scalar()
+        except Exception:
+            return None
+    return active_ms / 1000 if active_ms is not None else None
+
+
+def _count_rows(block_name: str, tables: list[str]) -> int:
+    with pooled_connector(block_name) as connector:
+        with connector.get_connection(begin=False) as connection:
+            return sum(connection.execute(text(f"SELECT COUNT(*) FROM {table};")).scalar() for table in tables)
+
+
+# Other backends publish their statistics roughly once per second while idle.
+STATS_FLUSH_DELAY = 1.1
+
+
+def _measure(
+    block_name: str,
+    scale: float,
+    stage: str,
+    run: Callable[[], int | None],
+    count_tables: list[str] | None = None,
+) -> dict[str, Any]:
+    """Time ``run``; stages that do not report their own row count are counted afterwards."""
+    db_before = _db_active_seconds(block_name)
+    started = time.perf_counter()
+    rows = run()
+    wall_seconds = time.perf_counter() - started
+    time.sleep(STATS_FLUSH_DELAY)
+    db_after = _db_active_seconds(block_name)
+    if rows is None and count_tables:
+        rows = _count_rows(block_name, count_tables)
+    return {
+        "scale": scale,
+        "stage": stage,
+        "rows": rows,
+        "wall_seconds": round(wall_seconds, 4),
+        "rows_per_sec": round(rows / wall_seconds, 1) if rows and wall_seconds > 0 else None,
+        "process_peak_rss_kb": _peak_rss_kb(),
+        "db_seconds": round(db_after - db_before, 4) if db_before is not None and db_after is not None else None,
+    }
+
+
+@flow
+def benchmark_dimensional_etl(
+    block_name: str = BLOCK_NAME,
+    data_dir: str = "data/benchmark",
+    scale: float = 1.0,
+    seed: int = 42,
+    load_method: str = "copy",
+) -> list[dict[str, Any]]:
+    data_path = Path(data_dir) / f"scale-{scale:g}"
+    started = time.perf_counter()
+    generate_dataset(data_path, scale, seed=seed)
+    results = [
+        {
+            "scale": scale,
+            "stage": "generate_dataset",
+            "rows": None,
+            "wall_seconds": round(time.perf_counter() - started, 4),
+            "rows_per_sec": None,
+            "process_peak_rss_kb": _peak_rss_kb(),
+            "db_seconds": None,
+        }
+    ]
+
+    create_staging_tables(block_name)
+    create_dw_tables(block_name)
+    for file_name, table in DATASETS:
+        results.append(
+            _measure(
+                block_name,
+                scale,
+                f"load_csv_to_table:{table}",
+                lambda: load_csv_to_table(
+                    block_name, data_path / file_name, table, method=load_method, skip_unchanged=False
+                ).rows,
+            )
+        )
+    staging_tables = [table for _, table in DATASETS]
+    dimension_tables = ["dw.dim_date"] + [dimension.table for dimension in DIMENSION_LOADS]
+    fact_tables = [fact.table for fact in FACT_LOADS]
+    results.append(
+        _measure(block_name, scale, "index_staging_tables", lambda: index_staging_tables(block_name), staging_tables)
+    )
+    results.append(
+        _measure(block_name, scale, "load_dimensions", lambda: load_dimensions(block_name), dimension_tables)
+    )
+    results.append(_measure(block_name, scale, "load_facts", lambda: load_facts(block_name), fact_tables))
+    return results
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--block-name", default=BLOCK_NAME)
+    parser.add_argument("--data-dir", default="data/benchmark")
+    parser.add_argument("--scale", type=float, action="append", help="Olist scale factor; repeatable (default: 1)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--load-method", choices=["copy", "insert"], default="copy")
+    parser.add_argument("--output", help="Append JSON lines here instead of printing them")
+    args = parser.parse_args(argv)
+
+    output = open(args.output, "a", encoding="utf-8") if args.output else sys.stdout
+    try:
+        for scale in args.scale or [1.0]:
+            for result in benchmark_dimensional_etl(
+                block_name=args.block_name,
+                data_dir=args.data_dir,
+                scale=scale,
+                seed=args.seed,
+                load_method=args.load_method,
+            ):
+                output.write(json.dumps(result) + "\n")
+                output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -10,38 +10,38 @@ CREATE TABLE IF NOT EXISTS staging.customers (
 
 CREATE TABLE IF NOT EXISTS staging.geolocations (
     geolocation_zip_code_prefix TEXT,
-    geolocation_lat TEXT,
-    geolocation_lng TEXT,
+    geolocation_lat DOUBLE PRECISION,
+    geolocation_lng DOUBLE PRECISION,
     geolocation_city TEXT,
     geolocation_state TEXT
 );
 
 CREATE TABLE IF NOT EXISTS staging.order_items (
     order_id            TEXT,
-    order_item_id       TEXT,
+    order_item_id       INTEGER,
     product_id          TEXT,
     seller_id           TEXT,
-    shipping_limit_date TEXT,
-    price               TEXT,
-    freight_value       TEXT
+    shipping_limit_date TIMESTAMP,
+    price               NUMERIC,
+    freight_value       NUMERIC
 );
 
 CREATE TABLE IF NOT EXISTS staging.order_payments (
     order_id TEXT,
-    payment_sequential TEXT,
+    payment_sequential INTEGER,
     payment_type TEXT,
-    payment_installments TEXT,
-    payment_value TEXT
+    payment_installments INTEGER,
+    payment_value NUMERIC
 );
 
 CREATE TABLE IF NOT EXISTS staging.order_reviews (
     review_id TEXT,
     order_id TEXT,
-    review_score TEXT,
+    review_score INTEGER,
     review_comment_title TEXT,
     review_comment_message TEXT,
-    review_creation_date TEXT,
-    review_answer_timestamp TEXT
+    review_creation_date TIMESTAMP,
+    review_answer_timestamp TIMESTAMP
 );
 
 
@@ -49,24 +49,24 @@ CREATE TABLE IF NOT EXISTS staging.orders (
     order_id TEXT,
     customer_id TEXT,
     order_status TEXT,
-    order_purchase_timestamp TEXT,
-    order_approved_at TEXT,
-    order_delivered_carrier_date TEXT,
-    order_delivered_customer_date TEXT,
-    order_estimated_delivery_date TEXT
+    order_purchase_timestamp TIMESTAMP,
+    order_approved_at TIMESTAMP,
+    order_delivered_carrier_date TIMESTAMP,
+    order_delivered_customer_date TIMESTAMP,
+    order_estimated_delivery_date TIMESTAMP
 );
 
 
 CREATE TABLE IF NOT EXISTS staging.products (
     product_id TEXT,
     product_category_name TEXT,
-    product_name_lenght TEXT,
-    product_description_lenght TEXT,
-    product_photos_qty TEXT,
-    product_weight_g TEXT,
-    product_length_cm TEXT,
-    product_height_cm TEXT,
-    product_width_cm TEXT
+    product_name_lenght INTEGER,
+    product_description_lenght INTEGER,
+    product_photos_qty INTEGER,
+    product_weight_g INTEGER,
+    product_length_cm INTEGER,
+    product_height_cm INTEGER,
+    product_width_cm INTEGER
 );
 
 CREATE TABLE IF NOT EXISTS staging.sellers (
@@ -22,6 +22,16 @@ declare -A TABLE_MAP=(
 
 )
 
+# 型付きカラムは quoted empty ("") も NULL として読み込む
+declare -A FORCE_NULL_MAP=(
+  ["geolocations"]="geolocation_lat, geolocation_lng"
+  ["order_items"]="order_item_id, shipping_limit_date, price, freight_value"
+  ["order_payments"]="payment_sequential, payment_installments, payment_value"
+  ["order_reviews"]="review_score, review_creation_date, review_answer_timestamp"
+  ["orders"]="order_purchase_timestamp, order_approved_at, order_delivered_carrier_date, order_delivered_customer_date, order_estimated_delivery_date"
+  ["products"]="product_name_lenght, product_description_lenght, product_photos_qty, product_weight_g, product_length_cm, product_height_cm, product_width_cm"
+)
+
 
 for csv in "${DATA_DIR}"/*.csv; do
   [ -e "$csv" ] || continue
@@ -29,12 +39,18 @@ for csv in "${DATA_DIR}"/*.csv; do
   file=$(basename "$csv")
   table="${TABLE_MAP[$file]:-}"
 
+  options="FORMAT CSV, HEADER"
+  force_null="${FORCE_NULL_MAP[$table]:-}"
+  if [ -n "$force_null" ]; then
+    options="${options}, FORCE_NULL (${force_null})"
+  fi
+
   echo "--- importing ${csv} -> ${table}"
 
   psql \
     --username "$POSTGRES_USER" \
     <<SQL
-\\copy staging.${table} FROM '${csv}' WITH (FORMAT CSV, HEADER);
+\\copy staging.${table} FROM '${csv}' WITH (${options});
 SQL
 
 done
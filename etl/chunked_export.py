@@ -0,0 +1,94 @@
+"""Write a COPY TO STDOUT stream into gzip-compressed CSV files that roll over by size."""
+
+from __future__ import annotations
+
+import gzip
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO
+
+# Rows are collected up to this many bytes before they are compressed, so gzip sees
+# large writes instead of one per row.
+_BUFFER_SIZE = 1024 * 1024
+
+
+@dataclass(frozen=True)
+class ChunkFile:
+    path: Path
+    rows: int
+    bytes: int
+
+
+class ChunkedGzipWriter:
+    """
+    File-like sink for ``cursor.copy_expert("COPY ... TO STDOUT", writer)``.
+
+    PostgreSQL sends every row of a COPY TO as its own message and psycopg2 passes
+    each one to ``write``, so files are only ever cut between rows. Each file starts
+    with ``header`` and is closed once its compressed size reaches ``max_bytes``.
+    Rows are compressed a buffer at a time, and a buffer holds at most
+    ``max_bytes`` uncompressed, so a file overshoots by less than that buffer's
+    compressed size. Memory use is one buffer plus gzip's window, whatever the
+    size of the table.
+    """
+
+    def __init__(self, directory: Path, prefix: str, header: bytes, max_bytes: int, compresslevel: int = 6):
+        self.directory = directory
+        self.prefix = prefix
+        self.header = header
+        self.max_bytes = max_bytes
+        self.compresslevel = compresslevel
+        self.buffer_size = min(_BUFFER_SIZE, max_bytes)
+        self.files: list[ChunkFile] = []
+        self._buffer: list[bytes] = []
+        self._buffered = 0
+        self._raw: BinaryIO | None = None
+        self._gzip: gzip.GzipFile | None = None
+        self._path: Path | None = None
+        self._file_rows = 0
+
+    def write(self, data: bytes) -> int:
+        self._buffer.append(data)
+        self._buffered += len(data)
+        if self._buffered >= self.buffer_size:
+            self._flush()
+        return len(data)
+
+    def _open(self) -> None:
+        self._path = self.directory / f"{self.prefix}-{len(self.files):05d}.csv.gz"
+        self._raw = self._path.open("wb")
+        self._gzip = gzip.GzipFile(fileobj=self._raw, mode="wb", compresslevel=self.compresslevel)
+        self._gzip.write(self.header)
+        self._file_rows = 0
+
+    def _close_file(self) -> None:
+        self._gzip.close()
+        self._raw.close()
+        self.files.append(ChunkFile(self._path, self._file_rows, self._path.stat().st_size))
+        self._raw = self._gzip = self._path = None
+
+    def _flush(self) -> None:
+        if self._gzip is None:
+            self._open()
+        self._gzip.write(b"".join(self._buffer))
+        self._file_rows += len(self._buffer)
+        self._buffer = []
+        self._buffered = 0
+        if self._raw.tell() >= self.max_bytes:
+            self._close_file()
+
+    def close(self) -> list[ChunkFile]:
+        """Write out the last rows and return every file written; an empty table gets a header-only file."""
+        if self._buffer or not self.files:
+            self._flush()
+        if self._gzip is not None:
+            self._close_file()
+        return self.files
+
+    def abort(self) -> None:
+        """Close and delete the file being written, e.g. after the COPY failed."""
+        if self._gzip is not None:
+            self._gzip.close()
+            self._raw.close()
+            self._path.unlink(missing_ok=True)
+            self._raw = self._gzip = self._path = None
@@ -0,0 +1,86 @@
+"""Split a CSV file into byte ranges that start and end on record boundaries."""
+
+from __future__ import annotations
+
+import mmap
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+# Bytes compared per step while counting quotes; keeps the slices copied out of
+# the mapping small.
+_SCAN_SIZE = 1024 * 1024
+
+
+def _count_quotes(data: mmap.mmap, start: int, end: int) -> int:
+    quotes = 0
+    for offset in range(start, end, _SCAN_SIZE):
+        quotes += data[offset:min(offset + _SCAN_SIZE, end)].count(b'"')
+    return quotes
+
+
+def _next_record_start(data: mmap.mmap, offset: int, quotes_before: int) -> tuple[int, int]:
+    """
+    First record boundary at or after ``offset``.
+
+    ``quotes_before`` is the number of ``"`` characters in ``data[:offset]``. A
+    newline only ends a record when an even number of quotes precede it, i.e. when
+    it is not inside a quoted field; escaped quotes (``""``) keep the parity intact.
+    Returns the boundary and the quote count up to it.
+    """
+    while True:
+        newline = data.find(b"\n", offset)
+        if newline == -1:
+            return len(data), quotes_before + _count_quotes(data, offset, len(data))
+        quotes_before += _count_quotes(data, offset, newline)
+        offset = newline + 1
+        if quotes_before % 2 == 0:
+            return offset, quotes_before
+
+
+def record_ranges(data: mmap.mmap, chunks: int) -> tuple[bytes, list[tuple[int, int]]]:
+    """
+    Return the header record and up to ``chunks`` ``(start, end)`` ranges covering the rest.
+
+    Ranges are about equal in size and never split a record, including quoted
+    fields that span several lines.
+    """
+    header_end, quotes = _next_record_start(data, 0, 0)
+    size = len(data)
+    step = max(1, (size - header_end) // max(1, chunks))
+
+    ranges = []
+    start = header_end
+    while start < size:
+        target = start + step
+        if target >= size or len(ranges) == chunks - 1:
+            ranges.append((start, size))
+            break
+        quotes += _count_quotes(data, start, target)
+        end, quotes = _next_record_start(data, target, quotes)
+        ranges.append((start, end))
+        start = end
+    return data[:header_end], ranges
+
+
+class RangeReader:
+    """File-like view of ``data[start:end]`` for ``cursor.copy_expert``."""
+
+    def __init__(self, data: mmap.mmap, start: int, end: int):
+        self.data = data
+        self.position = start
+        self.end = end
+
+    def read(self, size: int = -1) -> bytes:
+        if size < 0 or self.position + size > self.end:
+            size = self.end - self.position
+        chunk = self.data[self.position:self.position + size]
+        self.position += size
+        return chunk
+
+
+@contextmanager
+def mapped(path: Path) -> Iterator[mmap.mmap]:
+    """Map ``path`` read-only."""
+    with path.open("rb") as handle, mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        yield data
@@ -1,7 +1,72 @@
+import os
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Iterator
+
 from prefect import task, flow
 from pydantic import SecretStr
 from prefect_sqlalchemy import SqlAlchemyConnector, ConnectionComponents, SyncDriver
 
+BLOCK_NAME = "my-postgres-connection"
+
+
+@dataclass
+class PoolSettings:
+    """Engine pool options applied when a block's engine is first created in this process."""
+
+    pool_size: int = field(default_factory=lambda: int(os.environ.get("ETL_DB_POOL_SIZE", "5")))
+    max_overflow: int = field(default_factory=lambda: int(os.environ.get("ETL_DB_MAX_OVERFLOW", "10")))
+    pool_pre_ping: bool = field(
+        default_factory=lambda: os.environ.get("ETL_DB_POOL_PRE_PING", "true").lower() == "true"
+    )
+    pool_recycle: int = field(default_factory=lambda: int(os.environ.get("ETL_DB_POOL_RECYCLE", "1800")))
+
+
+pool_settings = PoolSettings()
+
+_blocks: dict[str, SqlAlchemyConnector] = {}
+_blocks_lock = threading.Lock()
+
+
+def _pooled_block(block_name: str) -> SqlAlchemyConnector:
+    """Load ``block_name`` once per process and give it a pooled engine."""
+    with _blocks_lock:
+        block = _blocks.get(block_name)
+        if block is None:
+            block = SqlAlchemyConnector.load(block_name)
+            block.get_engine(
+                pool_size=pool_settings.pool_size,
+                max_overflow=pool_settings.max_overflow,
+                pool_pre_ping=pool_settings.pool_pre_ping,
+                pool_recycle=pool_settings.pool_recycle,
+            )
+            _blocks[block_name] = block
+    return block
+
+
+@contextmanager
+def pooled_connector(block_name: str = BLOCK_NAME) -> Iterator[SqlAlchemyConnector]:
+    """
+    Yield a connector that borrows connections from the process-wide pool for ``block_name``.
+
+    Each caller gets its own connector, so cursor results are not shared between
+    concurrent tasks, but all of them draw from one engine. Leaving the context
+    returns the connections to the pool instead of disposing the engine.
+    """
+    block = _pooled_block(block_name)
+    connector = SqlAlchemyConnector(
+        connection_info=block.connection_info,
+        connect_args=block.connect_args,
+        fetch_size=block.fetch_size,
+    )
+    connector._engine = block.get_engine()
+    try:
+        yield connector
+    finally:
+        connector.reset_connections()
+
+
 @task
 def db_connection():
     connection_info = ConnectionComponents(
@@ -14,8 +79,8 @@ def db_connection():
     )
 
     connector = SqlAlchemyConnector(connection_info=connection_info)
-    connector.save("my-postgres-connection")
+    connector.save(BLOCK_NAME)
 
 
 if __name__ == "__main__":
-    db_connection()
\ No newline at end of file
+    db_connection()
@@ -1,95 +1,33 @@
 from __future__ import annotations
 
 import csv
+import functools
+import hashlib
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import date, datetime
+from decimal import Decimal
 from pathlib import Path
-from typing import Iterable
+from typing import Any, Callable, Iterable, Literal
+from uuid import uuid4
 
-from prefect import flow, task
+from prefect import flow, get_run_logger, task
+from prefect.artifacts import create_markdown_artifact, create_table_artifact
+from prefect.futures import wait
+from prefect.task_runners import ProcessPoolTaskRunner, ThreadPoolTaskRunner
 from prefect_sqlalchemy import SqlAlchemyConnector
+from sqlalchemy import text
 
+from etl.csv_chunks import RangeReader, mapped, record_ranges
+from etl.db_connection import BLOCK_NAME, pooled_connector
+from etl.lineage import LineageGraph
+from etl.profiling import EXACT_KEY_LIMIT, DataQualityError, ProfilingReader, TableProfile
+from etl.scheduler import SqlNode, run_sql_graph
+from etl.sources import SourceFile
+from etl.table_swap import swap_in
 
-RAW_TABLES_DDL = """
-CREATE SCHEMA IF NOT EXISTS staging;
-
-CREATE TABLE IF NOT EXISTS staging.customers (
-    customer_id TEXT,
-    customer_unique_id TEXT,
-    customer_zip_code_prefix TEXT,
-    customer_city TEXT,
-    customer_state TEXT
-);
-
-CREATE TABLE IF NOT EXISTS staging.geolocations (
-    geolocation_zip_code_prefix TEXT,
-    geolocation_lat TEXT,
-    geolocation_lng TEXT,
-    geolocation_city TEXT,
-    geolocation_state TEXT
-);
-
-CREATE TABLE IF NOT EXISTS staging.order_items (
-    order_id TEXT,
-    order_item_id TEXT,
-    product_id TEXT,
-    seller_id TEXT,
-    shipping_limit_date TEXT,
-    price TEXT,
-    freight_value TEXT
-);
-
-CREATE TABLE IF NOT EXISTS staging.order_payments (
-    order_id TEXT,
-    payment_sequential TEXT,
-    payment_type TEXT,
-    payment_installments TEXT,
-    payment_value TEXT
-);
-
-CREATE TABLE IF NOT EXISTS staging.order_reviews (
-    review_id TEXT,
-    order_id TEXT,
-    review_score TEXT,
-    review_comment_title TEXT,
-    review_comment_message TEXT,
-    review_creation_date TEXT,
-    review_answer_timestamp TEXT
-);
-
-CREATE TABLE IF NOT EXISTS staging.orders (
-    order_id TEXT,
-    customer_id TEXT,
-    order_status TEXT,
-    order_purchase_timestamp TEXT,
-    order_approved_at TEXT,
-    order_delivered_carrier_date TEXT,
-    order_delivered_customer_date TEXT,
-    order_estimated_delivery_date TEXT
-);
-
-CREATE TABLE IF NOT EXISTS staging.products (
-    product_id TEXT,
-    product_category_name TEXT,
-    product_name_lenght TEXT,
-    product_description_lenght TEXT,
-    product_photos_qty TEXT,
-    product_weight_g TEXT,
-    product_length_cm TEXT,
-    product_height_cm TEXT,
-    product_width_cm TEXT
-);
-
-CREATE TABLE IF NOT EXISTS staging.sellers (
-    seller_id TEXT,
-    seller_zip_code_prefix TEXT,
-    seller_city TEXT,
-    seller_state TEXT
-);
-
-CREATE TABLE IF NOT EXISTS staging.product_category_name_translation (
-    product_category_name TEXT,
-    product_category_name_english TEXT
-);
-"""
 
 DW_TABLES_DDL = """
 CREATE SCHEMA IF NOT EXISTS dw;
@@ -107,6 +45,14 @@ CREATE TABLE IF NOT EXISTS dw.dim_date (
     is_weekend BOOLEAN NOT NULL
 );
 
+CREATE INDEX IF NOT EXISTS dim_date_date_idx ON dw.dim_date (date);
+
+-- yyyymmdd key of a timestamp or date. A plain SQL function, so the planner inlines
+-- it and the facts compute their date keys instead of joining dw.dim_date.
+CREATE OR REPLACE FUNCTION dw.date_key(ts TIMESTAMP) RETURNS INTEGER
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE
+    RETURN (date_part('year', ts) * 10000 + date_part('month', ts) * 100 + date_part('day', ts))::int;
+
 CREATE TABLE IF NOT EXISTS dw.dim_customer (
     customer_sk BIGSERIAL PRIMARY KEY,
     customer_id TEXT UNIQUE,
@@ -148,8 +94,12 @@ CREATE TABLE IF NOT EXISTS dw.dim_payment_type (
     payment_type TEXT UNIQUE
 );
 
+-- The facts are range-partitioned by month on their date key (see FactLoad); monthly
+-- partitions are created by dw.ensure_month_partition as data arrives, rows without a
+-- date land in the DEFAULT partition. Unique keys on a partitioned table have to
+-- include the partition key, hence the natural keys below end with the date key.
 CREATE TABLE IF NOT EXISTS dw.fact_order_items (
-    order_item_sk BIGSERIAL PRIMARY KEY,
+    order_item_sk BIGSERIAL,
     order_id TEXT,
     order_item_id INTEGER,
     customer_sk BIGINT,
@@ -162,10 +112,10 @@ CREATE TABLE IF NOT EXISTS dw.fact_order_items (
     estimated_delivery_date_key INTEGER,
     price NUMERIC(12, 2),
     freight_value NUMERIC(12, 2)
-);
+) PARTITION BY RANGE (purchase_date_key);
 
 CREATE TABLE IF NOT EXISTS dw.fact_orders (
-    order_id TEXT PRIMARY KEY,
+    order_id TEXT,
     customer_sk BIGINT,
     order_status_sk SMALLINT,
     purchase_date_key INTEGER,
@@ -177,7 +127,7 @@ CREATE TABLE IF NOT EXISTS dw.fact_orders (
     order_item_total NUMERIC(14, 2),
     freight_total NUMERIC(14, 2),
     payment_total NUMERIC(14, 2)
-);
+) PARTITION BY RANGE (purchase_date_key);
 
 CREATE TABLE IF NOT EXISTS dw.fact_payments (
     order_id TEXT,
@@ -187,7 +137,7 @@ CREATE TABLE IF NOT EXISTS dw.fact_payments (
     payment_value NUMERIC(12, 2),
     purchase_date_key INTEGER,
     customer_sk BIGINT
-);
+) PARTITION BY RANGE (purchase_date_key);
 
 CREATE TABLE IF NOT EXISTS dw.fact_reviews (
     review_id TEXT,
@@ -196,10 +146,64 @@ CREATE TABLE IF NOT EXISTS dw.fact_reviews (
     review_score INTEGER,
     review_creation_date_key INTEGER,
     review_answer_date_key INTEGER
+) PARTITION BY RANGE (review_creation_date_key);
+
+CREATE TABLE IF NOT EXISTS dw.fact_order_items_default PARTITION OF dw.fact_order_items DEFAULT;
+CREATE TABLE IF NOT EXISTS dw.fact_orders_default PARTITION OF dw.fact_orders DEFAULT;
+CREATE TABLE IF NOT EXISTS dw.fact_payments_default PARTITION OF dw.fact_payments DEFAULT;
+CREATE TABLE IF NOT EXISTS dw.fact_reviews_default PARTITION OF dw.fact_reviews DEFAULT;
+
+-- Natural keys used by the incremental fact load's ON CONFLICT upserts. NULLS NOT DISTINCT,
+-- so rows without a date still conflict with each other instead of piling up.
+CREATE UNIQUE INDEX IF NOT EXISTS fact_order_items_natural_key
+    ON dw.fact_order_items (order_id, order_item_id, purchase_date_key) NULLS NOT DISTINCT;
+CREATE UNIQUE INDEX IF NOT EXISTS fact_orders_natural_key
+    ON dw.fact_orders (order_id, purchase_date_key) NULLS NOT DISTINCT;
+CREATE UNIQUE INDEX IF NOT EXISTS fact_payments_natural_key
+    ON dw.fact_payments (order_id, payment_sequential, purchase_date_key) NULLS NOT DISTINCT;
+CREATE UNIQUE INDEX IF NOT EXISTS fact_reviews_natural_key
+    ON dw.fact_reviews (review_id, order_id, review_creation_date_key) NULLS NOT DISTINCT;
+
+-- Creates the partition of ``parent`` holding the month that starts at ``month`` unless
+-- it exists, and returns its name.
+CREATE OR REPLACE FUNCTION dw.ensure_month_partition(parent TEXT, month DATE) RETURNS TEXT
+    LANGUAGE plpgsql AS $$
+DECLARE
+    partition_name TEXT := parent || '_p' || to_char(month, 'YYYYMM');
+BEGIN
+    IF to_regclass(partition_name) IS NULL THEN
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS %s PARTITION OF %s FOR VALUES FROM (%s) TO (%s)',
+            partition_name,
+            parent,
+            dw.date_key(month),
+            dw.date_key(month + interval '1 month')
+        );
+    END IF;
+    RETURN partition_name;
+END;
+$$;
+
+CREATE TABLE IF NOT EXISTS dw.etl_watermark (
+    table_name TEXT PRIMARY KEY,
+    high_water_mark TIMESTAMP,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- Parsed from the load SQL on every run (see record_lineage). Rows without columns
+-- are tables a target only joins or filters on.
+CREATE TABLE IF NOT EXISTS dw.column_lineage (
+    target_table TEXT NOT NULL,
+    target_column TEXT,
+    source_table TEXT NOT NULL,
+    source_column TEXT
 );
 """
 
 
+# Source file of each staging table, relative to the data directory. Entries, or the
+# data directory itself, may be gzip, bz2 or xz files or point into a zip archive,
+# e.g. "olist.zip/olist_orders_dataset.csv"; see etl.sources.SourceFile.
 DATASETS = [
     ("olist_customers_dataset.csv", "staging.customers"),
     ("olist_geolocation_dataset.csv", "staging.geolocations"),
@@ -212,6 +216,254 @@ DATASETS = [
     ("product_category_name_translation.csv", "staging.product_category_name_translation"),
 ]
 
+# Column layout of each staging table. Empty CSV fields are loaded as NULL and the
+# non-TEXT columns are parsed once at load time, so the dimension and fact SQL can
+# work on native timestamps and numbers instead of re-casting text on every query.
+STAGING_SCHEMAS: dict[str, dict[str, str]] = {
+    "staging.customers": {
+        "customer_id": "TEXT",
+        "customer_unique_id": "TEXT",
+        "customer_zip_code_prefix": "TEXT",
+        "customer_city": "TEXT",
+        "customer_state": "TEXT",
+    },
+    "staging.geolocations": {
+        "geolocation_zip_code_prefix": "TEXT",
+        "geolocation_lat": "DOUBLE PRECISION",
+        "geolocation_lng": "DOUBLE PRECISION",
+        "geolocation_city": "TEXT",
+        "geolocation_state": "TEXT",
+    },
+    "staging.order_items": {
+        "order_id": "TEXT",
+        "order_item_id": "INTEGER",
+        "product_id": "TEXT",
+        "seller_id": "TEXT",
+        "shipping_limit_date": "TIMESTAMP",
+        "price": "NUMERIC",
+        "freight_value": "NUMERIC",
+    },
+    "staging.order_payments": {
+        "order_id": "TEXT",
+        "payment_sequential": "INTEGER",
+        "payment_type": "TEXT",
+        "payment_installments": "INTEGER",
+        "payment_value": "NUMERIC",
+    },
+    "staging.order_reviews": {
+        "review_id": "TEXT",
+        "order_id": "TEXT",
+        "review_score": "INTEGER",
+        "review_comment_title": "TEXT",
+        "review_comment_message": "TEXT",
+        "review_creation_date": "TIMESTAMP",
+        "review_answer_timestamp": "TIMESTAMP",
+    },
+    "staging.orders": {
+        "order_id": "TEXT",
+        "customer_id": "TEXT",
+        "order_status": "TEXT",
+        "order_purchase_timestamp": "TIMESTAMP",
+        "order_approved_at": "TIMESTAMP",
+        "order_delivered_carrier_date": "TIMESTAMP",
+        "order_delivered_customer_date": "TIMESTAMP",
+        "order_estimated_delivery_date": "TIMESTAMP",
+    },
+    "staging.products": {
+        "product_id": "TEXT",
+        "product_category_name": "TEXT",
+        "product_name_lenght": "INTEGER",
+        "product_description_lenght": "INTEGER",
+        "product_photos_qty": "INTEGER",
+        "product_weight_g": "INTEGER",
+        "product_length_cm": "INTEGER",
+        "product_height_cm": "INTEGER",
+        "product_width_cm": "INTEGER",
+    },
+    "staging.sellers": {
+        "seller_id": "TEXT",
+        "seller_zip_code_prefix": "TEXT",
+        "seller_city": "TEXT",
+        "seller_state": "TEXT",
+    },
+    "staging.product_category_name_translation": {
+        "product_category_name": "TEXT",
+        "product_category_name_english": "TEXT",
+    },
+}
+
+RAW_TABLES_DDL = "CREATE SCHEMA IF NOT EXISTS staging;\n" + "".join(
+    f"\nCREATE TABLE IF NOT EXISTS {table} (\n"
+    + ",\n".join(f"    {column} {column_type}" for column, column_type in columns.items())
+    + "\n);\n"
+    for table, columns in STAGING_SCHEMAS.items()
+) + """
+-- Fingerprint of the file last loaded into each staging table; see load_csv_to_table.
+CREATE TABLE IF NOT EXISTS staging.load_manifest (
+    table_name TEXT PRIMARY KEY,
+    file_name TEXT NOT NULL,
+    file_size BIGINT NOT NULL,
+    file_mtime DOUBLE PRECISION NOT NULL,
+    content_hash TEXT NOT NULL,
+    row_count BIGINT NOT NULL,
+    loaded_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+"""
+
+# btree indexes on the staging join keys used by load_facts. load_csv_to_table drops
+# them before a bulk load and index_staging_tables rebuilds them afterwards.
+STAGING_INDEXES: dict[str, list[str]] = {
+    "staging.customers": ["customer_id"],
+    "staging.orders": ["order_id", "customer_id"],
+    "staging.order_items": ["order_id"],
+    "staging.order_payments": ["order_id"],
+    "staging.order_reviews": ["order_id"],
+}
+
+# Checked against each reloaded file's profile by check_staging_profiles: "required"
+# columns may not be empty and "unique" ones may not repeat, e.g. customer_id, which
+# dw.dim_customer declares UNIQUE.
+STAGING_CHECKS: dict[str, dict[str, list[str]]] = {
+    "staging.customers": {"required": ["customer_id"], "unique": ["customer_id"]},
+    "staging.orders": {"required": ["order_id", "customer_id"], "unique": ["order_id"]},
+    "staging.order_items": {"required": ["order_id", "order_item_id", "product_id", "seller_id"]},
+    "staging.order_payments": {"required": ["order_id", "payment_sequential"]},
+    "staging.order_reviews": {"required": ["review_id", "order_id"]},
+    "staging.products": {"required": ["product_id"], "unique": ["product_id"]},
+    "staging.sellers": {"required": ["seller_id"], "unique": ["seller_id"]},
+    "staging.product_category_name_translation": {
+        "required": ["product_category_name"],
+        "unique": ["product_category_name"],
+    },
+}
+
+# Python-side parsers for the INSERT load path and the load profiles; COPY leaves
+# the parsing to PostgreSQL.
+_COLUMN_PARSERS: dict[str, Callable[[str], Any]] = {
+    "TEXT": str,
+    "INTEGER": int,
+    "NUMERIC": Decimal,
+    "DOUBLE PRECISION": float,
+    "TIMESTAMP": datetime.fromisoformat,
+}
+
+
+LoadMethod = Literal["copy", "insert"]
+StagingRunner = Literal["thread", "process", "sequential"]
+FactLoadMode = Literal["full", "incremental", "partition"]
+DimensionLoadMode = Literal["rebuild", "merge"]
+
+# Chunk size used when streaming a CSV file to COPY FROM STDIN.
+COPY_BUFFER_SIZE = 1024 * 1024
+
+# Files at least this large are split into record-aligned byte ranges and COPYed
+# by several connections at once; see load_csv_to_table.
+SPLIT_LOAD_THRESHOLD = 64 * 1024 * 1024
+
+
+@dataclass
+class LoadResult:
+    table: str
+    rows: int
+    seconds: float
+    skipped: bool = False
+    profile: TableProfile | None = None
+    # What record_manifests stores once the warehouse is built from this load.
+    source: SourceFile | None = None
+    fingerprint: FileFingerprint | None = None
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+
+@dataclass(frozen=True)
+class FileFingerprint:
+    size: int
+    mtime: float
+    content_hash: str
+
+
+def _content_hash(source: SourceFile) -> str:
+    if source.member is not None:
+        # The archive stores a CRC-32 per member; reading it beats decompressing the member.
+        info = source.zip_info()
+        return f"crc32:{info.CRC:08x}"
+    digest = hashlib.sha256()
+    with source.path.open("rb") as handle:
+        while chunk := handle.read(COPY_BUFFER_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _fingerprint(source: SourceFile, previous: FileFingerprint | None) -> FileFingerprint:
+    """
+    Fingerprint ``source``, reusing ``previous`` when its size and mtime still match.
+
+    The file is only read and hashed when its stat changed, so a file that was
+    touched or copied without changing its content is still recognised. Compressed
+    files are hashed as stored; zip members by the CRC-32 in the archive.
+    """
+    size, mtime = source.stat()
+    if previous is not None and (previous.size, previous.mtime) == (size, mtime):
+        return previous
+    return FileFingerprint(size=size, mtime=mtime, content_hash=_content_hash(source))
+
+
+def _manifest_entry(connector: SqlAlchemyConnector, table: str) -> tuple[FileFingerprint, int] | None:
+    """The fingerprint of the file last loaded into ``table`` and the rows it loaded."""
+    rows = connector.fetch_all(
+        """
+        SELECT file_size, file_mtime, content_hash, row_count
+        FROM staging.load_manifest
+        WHERE table_name = :table_name;
+        """,
+        parameters={"table_name": table},
+    )
+    if not rows:
+        return None
+    *fingerprint, row_count = rows[0]
+    return FileFingerprint(*fingerprint), row_count
+
+
+def _record_manifest(
+    connector: SqlAlchemyConnector, table: str, source: SourceFile, fingerprint: FileFingerprint, rows: int
+) -> None:
+    connector.execute(
+        """
+        INSERT INTO staging.load_manifest
+            (table_name, file_name, file_size, file_mtime, content_hash, row_count)
+        VALUES (:table_name, :file_name, :file_size, :file_mtime, :content_hash, :row_count)
+        ON CONFLICT (table_name) DO UPDATE SET
+            file_name = EXCLUDED.file_name,
+            file_size = EXCLUDED.file_size,
+            file_mtime = EXCLUDED.file_mtime,
+            content_hash = EXCLUDED.content_hash,
+            row_count = EXCLUDED.row_count,
+            loaded_at = now();
+        """,
+        parameters={
+            "table_name": table,
+            "file_name": source.name,
+            "file_size": fingerprint.size,
+            "file_mtime": fingerprint.mtime,
+            "content_hash": fingerprint.content_hash,
+            "row_count": rows,
+        },
+    )
+
+
+def _touch_manifest(connector: SqlAlchemyConnector, table: str, fingerprint: FileFingerprint) -> None:
+    """Store the new stat of a file whose content did not change, so it is not hashed again."""
+    connector.execute(
+        """
+        UPDATE staging.load_manifest
+        SET file_size = :file_size, file_mtime = :file_mtime
+        WHERE table_name = :table_name;
+        """,
+        parameters={"table_name": table, "file_size": fingerprint.size, "file_mtime": fingerprint.mtime},
+    )
+
 
 def _batched(rows: Iterable[dict], batch_size: int) -> Iterable[list[dict]]:
     batch: list[dict] = []
@@ -224,74 +476,401 @@ def _batched(rows: Iterable[dict], batch_size: int) -> Iterable[list[dict]]:
         yield batch
 
 
+def _typed_column_migrations(connector: SqlAlchemyConnector, table: str) -> list[str]:
+    """Return ALTER clauses for columns that still hold raw TEXT but are typed in STAGING_SCHEMAS."""
+    schema_name, table_name = table.split(".")
+    existing = dict(
+        connector.fetch_all(
+            """
+            SELECT column_name, data_type
+            FROM information_schema.columns
+            WHERE table_schema = :schema_name AND table_name = :table_name;
+            """,
+            parameters={"schema_name": schema_name, "table_name": table_name},
+        )
+    )
+    return [
+        f"ALTER COLUMN {column} TYPE {column_type} USING NULLIF({column}, '')::{column_type}"
+        for column, column_type in STAGING_SCHEMAS.get(table, {}).items()
+        if column_type != "TEXT" and existing.get(column) == "text"
+    ]
+
+
 @task
 def create_staging_tables(block_name: str) -> None:
-    with SqlAlchemyConnector.load(block_name) as connector:
+    """Create the typed staging tables, converting TEXT columns left by older versions of the schema."""
+    with pooled_connector(block_name) as connector:
         connector.execute(RAW_TABLES_DDL)
+        for table in STAGING_SCHEMAS:
+            migrations = _typed_column_migrations(connector, table)
+            if migrations:
+                connector.execute(f"ALTER TABLE {table} {', '.join(migrations)};")
+
+
+def _staging_profile(table: str, header: list[str], parts: int = 1) -> TableProfile:
+    """
+    An empty profile of ``header`` that parses the typed columns of ``table``; with
+    ``parts`` it profiles one of that many ranges and gets its share of the exact key limit.
+    """
+    parsers = {
+        column: _COLUMN_PARSERS[column_type]
+        for column, column_type in STAGING_SCHEMAS.get(table, {}).items()
+        if column_type != "TEXT"
+    }
+    return TableProfile.for_header(
+        table,
+        header,
+        parsers,
+        keys=STAGING_CHECKS.get(table, {}).get("unique", []),
+        exact_key_limit=EXACT_KEY_LIMIT // parts,
+    )
+
+
+def _copy_statement(table: str, header: list[str]) -> str:
+    column_list = ", ".join(header)
+    options = "FORMAT CSV"
+    # Quoted empty strings ("") would otherwise reach the typed columns' parsers.
+    typed_columns = [column for column in header if STAGING_SCHEMAS.get(table, {}).get(column, "TEXT") != "TEXT"]
+    if typed_columns:
+        options += f", FORCE_NULL ({', '.join(typed_columns)})"
+    return f"COPY {table} ({column_list}) FROM STDIN WITH ({options})"
+
+
+def _copy_csv(
+    connector: SqlAlchemyConnector, source: SourceFile, table: str, profile: bool = False
+) -> tuple[int, TableProfile | None]:
+    """
+    Stream a CSV file into ``table`` with COPY FROM STDIN, like ``\\copy`` in db/02_initdb.sh.
+
+    Compressed files and zip members are decompressed on the way. With ``profile``
+    the records are also profiled on their way to COPY.
+    """
+    raw_connection = connector.get_engine().raw_connection()
+    try:
+        with raw_connection.cursor() as cursor, source.open_text() as handle:
+            # TRUNCATE and COPY share one transaction, so readers never see a half-loaded table.
+            cursor.execute(f"TRUNCATE TABLE {table};")
+            header = next(csv.reader([handle.readline()]), None)
+            if not header:
+                raw_connection.commit()
+                return 0, None
+            table_profile = _staging_profile(table, header) if profile else None
+            source = ProfilingReader(handle, table_profile) if table_profile else handle
+            cursor.copy_expert(_copy_statement(table, header), source, size=COPY_BUFFER_SIZE)
+            rows = cursor.rowcount
+        raw_connection.commit()
+    except Exception:
+        raw_connection.rollback()
+        raise
+    finally:
+        raw_connection.close()
+    return rows, table_profile
+
+
+def _copy_range(connector: SqlAlchemyConnector, statement: str, reader: RangeReader | ProfilingReader) -> int:
+    raw_connection = connector.get_engine().raw_connection()
+    try:
+        with raw_connection.cursor() as cursor:
+            cursor.copy_expert(statement, reader, size=COPY_BUFFER_SIZE)
+            rows = cursor.rowcount
+        raw_connection.commit()
+    except Exception:
+        raw_connection.rollback()
+        raise
+    finally:
+        raw_connection.close()
+    return rows
+
+
+def _copy_csv_split(
+    connector: SqlAlchemyConnector, csv_path: Path, table: str, workers: int, profile: bool = False
+) -> tuple[int, TableProfile | None]:
+    """
+    COPY ``csv_path`` into ``table`` as ``workers`` byte ranges on separate connections.
+
+    The file is memory-mapped and cut on record boundaries by ``record_ranges``, so
+    quoted fields spanning several lines stay in one range. The ranges commit on
+    their own connections, so they fill a ``<table>_load_<id>`` copy, unique to
+    this load, that ``swap_in`` puts in place of ``table`` once all of them
+    succeeded; as with ``_copy_csv`` readers see either the old rows or all of the
+    new ones, and views and grants on the table carry over. With ``profile`` each
+    range is profiled by its own thread and the profiles are merged at the end.
+    """
+    shadow = f"{table}_load_{uuid4().hex[:8]}"
+    with mapped(csv_path) as data:
+        header_bytes, ranges = record_ranges(data, workers)
+        header = next(csv.reader([header_bytes.decode("utf-8-sig")]), None)
+        if not header:
+            connector.execute(f"TRUNCATE TABLE {table};")
+            return 0, None
+        statement = _copy_statement(shadow, header)
+        readers: list[RangeReader | ProfilingReader] = [RangeReader(data, start, end) for start, end in ranges]
+        if profile:
+            readers = [ProfilingReader(reader, _staging_profile(table, header, len(readers))) for reader in readers]
+        connector.execute(f"CREATE TABLE {shadow} (LIKE {table} INCLUDING ALL);")
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(_copy_range, connector, statement, reader) for reader in readers]
+                rows = sum(future.result() for future in futures)
+            with connector.get_connection(begin=True) as connection:
+                swap_in(connection, table, shadow)
+        except Exception:
+            connector.execute(f"DROP TABLE IF EXISTS {shadow};")
+            raise
+    if not profile:
+        return rows, None
+    table_profile = _staging_profile(table, header)
+    while readers:
+        # Each range's key values are freed as soon as they are merged.
+        table_profile.merge(readers.pop().profile)
+    return rows, table_profile
+
+
+def _parse_rows(rows: Iterable[dict], table: str) -> Iterable[dict]:
+    """Turn empty CSV fields into None and parse typed columns with ``_COLUMN_PARSERS``."""
+    parsers = {
+        column: _COLUMN_PARSERS[column_type] for column, column_type in STAGING_SCHEMAS.get(table, {}).items()
+    }
+    for row in rows:
+        yield {
+            column: parsers.get(column, str)(value) if value != "" else None
+            for column, value in row.items()
+        }
+
+
+def _insert_csv(
+    connector: SqlAlchemyConnector, source: SourceFile, table: str, batch_size: int, profile: bool = False
+) -> tuple[int, TableProfile | None]:
+    """Load a CSV file into ``table`` with batched parameterized INSERTs, profiling each batch with ``profile``."""
+    rows = 0
+    connector.execute(f"TRUNCATE TABLE {table};")
+    with source.open_text() as handle:
+        reader = csv.DictReader(handle)
+        if not reader.fieldnames:
+            return rows, None
+        columns = reader.fieldnames
+        table_profile = _staging_profile(table, columns) if profile else None
+        column_list = ", ".join(columns)
+        values_list = ", ".join([f":{col}" for col in columns])
+        insert_sql = f'INSERT INTO {table} ({column_list}) VALUES ({values_list});'
+        for batch in _batched(reader, batch_size=batch_size):
+            if table_profile is not None:
+                table_profile.add_rows([list(row.values()) for row in batch])
+            connector.execute_many(insert_sql, list(_parse_rows(batch, table)))
+            rows += len(batch)
+    return rows, table_profile
+
+
+def _staging_index_name(table: str, column: str) -> str:
+    return f"{table.split('.')[-1]}_{column}_idx"
 
 
 @task
-def load_csv_to_table(block_name: str, csv_path: Path, table: str, batch_size: int = 5000) -> None:
-    with SqlAlchemyConnector.load(block_name) as connector:
-        connector.execute(f"TRUNCATE TABLE {table};")
-        with csv_path.open("r", encoding="utf-8-sig") as handle:
-            reader = csv.DictReader(handle)
-            if not reader.fieldnames:
-                return
-            columns = reader.fieldnames
-            column_list = ", ".join(columns)
-            values_list = ", ".join([f":{col}" for col in columns])
-            insert_sql = f'INSERT INTO {table} ({column_list}) VALUES ({values_list});'
-            for batch in _batched(reader, batch_size=batch_size):
-                connector.execute_many(insert_sql, batch)
+def load_csv_to_table(
+    block_name: str,
+    csv_path: Path,
+    table: str,
+    batch_size: int = 5000,
+    method: LoadMethod = "copy",
+    skip_unchanged: bool = True,
+    split_workers: int = 4,
+    split_threshold: int = SPLIT_LOAD_THRESHOLD,
+    profile: bool = True,
+) -> LoadResult:
+    """
+    TRUNCATE ``table`` and load ``csv_path`` into it.
+
+    ``csv_path`` may be gzip, bz2 or xz compressed (by suffix) or point at a member
+    of a zip archive, e.g. ``data/olist.zip/olist_orders_dataset.csv``; either way
+    it is decompressed while it streams into the load.
+
+    The file's size, mtime and SHA-256 are compared with the fingerprint stored in
+    ``staging.load_manifest`` for ``table``. With ``skip_unchanged`` the load is
+    skipped (``LoadResult.skipped``) when the file has not changed since and
+    ``table`` still holds the rows loaded from it, i.e. was not truncated or
+    recreated meanwhile. A reload removes the stored fingerprint and returns the
+    new one, which ``record_manifests`` stores once the warehouse has been built.
+    Indexes listed in ``STAGING_INDEXES`` are dropped first so the bulk load does
+    not maintain them row by row; ``index_staging_tables`` rebuilds them.
+    ``method="copy"`` streams the file through COPY FROM STDIN without building
+    per-row Python objects; ``method="insert"`` keeps the original batched INSERT path.
+    Uncompressed files of at least ``split_threshold`` bytes are split into
+    ``split_workers`` record-aligned ranges that are loaded in parallel.
+    With ``profile`` the rows are profiled in the same pass (see ``etl.profiling``).
+    Returns the row count, wall-clock time and profile of the load.
+    """
+    logger = get_run_logger()
+    started = time.perf_counter()
+    with pooled_connector(block_name) as connector:
+        source = SourceFile.at(csv_path)
+        entry = _manifest_entry(connector, table)
+        previous, loaded_rows = entry if entry is not None else (None, None)
+        fingerprint = _fingerprint(source, previous)
+        if skip_unchanged and previous is not None and fingerprint.content_hash == previous.content_hash:
+            # Not through fetch_all, whose transaction stays open and would block the DROP INDEX below.
+            with connector.get_connection(begin=False) as connection:
+                staged_rows = connection.execute(text(f"SELECT count(*) FROM {table};")).scalar_one()
+            if staged_rows == loaded_rows:
+                if fingerprint != previous:
+                    _touch_manifest(connector, table, fingerprint)
+                logger.info("Skipped %s: %s is unchanged since its last load", table, source.name)
+                return LoadResult(table=table, rows=0, seconds=time.perf_counter() - started, skipped=True)
+            logger.info(
+                "Reloading %s: it holds %s rows, but %s were loaded from %s",
+                table,
+                staged_rows,
+                loaded_rows,
+                source.name,
+            )
+
+        # Forget the old fingerprint first, so a load or warehouse build that fails is retried next run.
+        connector.execute("DELETE FROM staging.load_manifest WHERE table_name = :table_name;", {"table_name": table})
+        for column in STAGING_INDEXES.get(table, []):
+            schema_name = table.split(".")[0]
+            connector.execute(f"DROP INDEX IF EXISTS {schema_name}.{_staging_index_name(table, column)};")
+        # A compressed stream has no byte offsets to split at.
+        if method == "copy" and split_workers > 1 and fingerprint.size >= split_threshold and not source.compressed:
+            rows, table_profile = _copy_csv_split(connector, csv_path, table, split_workers, profile)
+        elif method == "copy":
+            rows, table_profile = _copy_csv(connector, source, table, profile)
+        else:
+            rows, table_profile = _insert_csv(connector, source, table, batch_size, profile)
+    result = LoadResult(
+        table=table,
+        rows=rows,
+        seconds=time.perf_counter() - started,
+        profile=table_profile,
+        source=source,
+        fingerprint=fingerprint,
+    )
+    logger.info(
+        "Loaded %s rows into %s in %.2fs (%.0f rows/sec, method=%s)",
+        result.rows,
+        result.table,
+        result.seconds,
+        result.rows_per_sec,
+        method,
+    )
+    return result
+
+
+FACT_TABLES = ("dw.fact_order_items", "dw.fact_orders", "dw.fact_payments", "dw.fact_reviews")
+
+
+def _outdated_fact_tables(connector: SqlAlchemyConnector) -> list[str]:
+    """Fact tables left unpartitioned, or with a natural key that lets NULL dates repeat, by older schemas."""
+    return [
+        row[0]
+        for row in connector.fetch_all(
+            """
+            SELECT table_name
+            FROM unnest(CAST(:tables AS TEXT[])) AS table_name
+            JOIN pg_class ON pg_class.oid = to_regclass(table_name)
+            LEFT JOIN pg_index ON pg_index.indexrelid = to_regclass(table_name || '_natural_key')
+            WHERE pg_class.relkind = 'r' OR NOT COALESCE(pg_index.indnullsnotdistinct, TRUE);
+            """,
+            parameters={"tables": list(FACT_TABLES)},
+        )
+    ]
 
 
 @task
 def create_dw_tables(block_name: str) -> None:
-    with SqlAlchemyConnector.load(block_name) as connector:
+    """
+    Create the ``dw`` schema.
+
+    Fact tables created by older versions of the schema cannot be converted in
+    place; this refuses to run until ``migrate_dw_tables`` has rebuilt them.
+    """
+    with pooled_connector(block_name) as connector:
+        outdated = _outdated_fact_tables(connector)
+        if outdated:
+            raise RuntimeError(
+                f"{', '.join(outdated)} predate the partitioned fact schema; "
+                "run the migrate_dw_tables flow, which drops and recreates them"
+            )
         connector.execute(DW_TABLES_DDL)
 
 
-@task
-def load_dimensions(block_name: str) -> None:
-    with SqlAlchemyConnector.load(block_name) as connector:
-        connector.execute(
-            """
-            TRUNCATE TABLE
-                dw.dim_date,
-                dw.dim_customer,
-                dw.dim_seller,
-                dw.dim_product,
-                dw.dim_order_status,
-                dw.dim_payment_type
-            RESTART IDENTITY;
+@flow
+def migrate_dw_tables(block_name: str = BLOCK_NAME) -> list[str]:
+    """
+    Drop fact tables left by older schemas and create them again, empty.
+
+    Their high-water marks, the ``AGGREGATES`` built from them and the load
+    manifests of the staging tables they are built from are removed too, so the
+    next run reloads those files and rebuilds the facts and aggregates in full.
+    The DROP fails, and nothing changes, while other views still depend on the
+    tables. Returns the tables that were recreated.
+    """
+    with pooled_connector(block_name) as connector:
+        outdated = _outdated_fact_tables(connector)
+        if outdated:
+            with connector.get_connection(begin=True) as connection:
+                # The aggregates are the flow's own; refresh_aggregates creates them again.
+                for aggregate in AGGREGATES:
+                    if set(aggregate.facts) & set(outdated):
+                        kind = "TABLE" if aggregate.date_key else "MATERIALIZED VIEW"
+                        connection.execute(text(f"DROP {kind} IF EXISTS {aggregate.name};"))
+                for table in outdated:
+                    connection.execute(text(f"DROP TABLE {table};"))
+                connection.execute(
+                    text("DELETE FROM dw.etl_watermark WHERE table_name = ANY(CAST(:tables AS TEXT[]));"),
+                    {"tables": outdated},
+                )
+                connection.execute(
+                    text("DELETE FROM staging.load_manifest WHERE table_name = ANY(CAST(:tables AS TEXT[]));"),
+                    {"tables": staging_sources(outdated)},
+                )
+    create_dw_tables(block_name)
+    get_run_logger().info("Recreated %s", ", ".join(outdated) or "nothing; the dw schema is up to date")
+    return outdated
+
+
+@dataclass(frozen=True)
+class DimensionLoad:
+    """
+    How one ``dw.dim_*`` table is built from staging.
+
+    ``select_sql`` must return at most one row per ``natural_key`` so that the
+    merge mode can upsert it with ``ON CONFLICT``.
+    """
+
+    table: str
+    natural_key: str
+    columns: tuple[str, ...]
+    select_sql: str
+
+    def insert_sql(self, mode: DimensionLoadMode) -> str:
+        column_list = ", ".join(self.columns)
+        if mode == "rebuild":
+            return f"INSERT INTO {self.table} ({column_list})\n{self.select_sql};"
+
+        attributes = [column for column in self.columns if column != self.natural_key]
+        if not attributes:
+            # ON CONFLICT DO NOTHING would still draw a value from the SMALLSERIAL
+            # sequence for every staging row, so only insert keys we have not seen.
+            return f"""
+            INSERT INTO {self.table} ({column_list})
+            SELECT src.{self.natural_key}
+            FROM ({self.select_sql}) src
+            WHERE NOT EXISTS (
+                SELECT 1 FROM {self.table} dim WHERE dim.{self.natural_key} = src.{self.natural_key}
+            );
             """
+
+        updates = ",\n    ".join(f"{column} = EXCLUDED.{column}" for column in attributes)
+        current = ", ".join(f"dim.{column}" for column in attributes)
+        excluded = ", ".join(f"EXCLUDED.{column}" for column in attributes)
+        return (
+            f"INSERT INTO {self.table} AS dim ({column_list})\n"
+            f"{self.select_sql}\n"
+            f"ON CONFLICT ({self.natural_key}) DO UPDATE SET\n    {updates}\n"
+            f"WHERE ({current}) IS DISTINCT FROM ({excluded});"
         )
 
-        connector.execute(
-            """
-            WITH date_bounds AS (
-                SELECT MIN(date_val) AS min_date, MAX(date_val) AS max_date
-                FROM (
-                    SELECT NULLIF(order_purchase_timestamp, '')::timestamp::date AS date_val FROM staging.orders
-                    UNION ALL
-                    SELECT NULLIF(order_approved_at, '')::timestamp::date FROM staging.orders
-                    UNION ALL
-                    SELECT NULLIF(order_delivered_carrier_date, '')::timestamp::date FROM staging.orders
-                    UNION ALL
-                    SELECT NULLIF(order_delivered_customer_date, '')::timestamp::date FROM staging.orders
-                    UNION ALL
-                    SELECT NULLIF(order_estimated_delivery_date, '')::timestamp::date FROM staging.orders
-                    UNION ALL
-                    SELECT NULLIF(shipping_limit_date, '')::timestamp::date FROM staging.order_items
-                    UNION ALL
-                    SELECT NULLIF(review_creation_date, '')::timestamp::date FROM staging.order_reviews
-                    UNION ALL
-                    SELECT NULLIF(review_answer_timestamp, '')::timestamp::date FROM staging.order_reviews
-                ) dates
-                WHERE date_val IS NOT NULL
-            )
-            INSERT INTO dw.dim_date (
+
+DIM_DATE_COLUMNS = """
                 date_key,
                 date,
                 year,
@@ -301,12 +880,10 @@ def load_dimensions(block_name: str) -> None:
                 day,
                 day_of_week,
                 day_name,
-                is_weekend
-            )
-            SELECT
-                (EXTRACT(YEAR FROM d)::int * 10000)
-                + (EXTRACT(MONTH FROM d)::int * 100)
-                + EXTRACT(DAY FROM d)::int AS date_key,
+                is_weekend"""
+
+DIM_DATE_SELECT = """
+                dw.date_key(d) AS date_key,
                 d::date AS date,
                 EXTRACT(YEAR FROM d)::int AS year,
                 EXTRACT(QUARTER FROM d)::int AS quarter,
@@ -315,181 +892,411 @@ def load_dimensions(block_name: str) -> None:
                 EXTRACT(DAY FROM d)::int AS day,
                 EXTRACT(ISODOW FROM d)::int AS day_of_week,
                 TO_CHAR(d, 'FMDay') AS day_name,
-                CASE WHEN EXTRACT(ISODOW FROM d) IN (6, 7) THEN TRUE ELSE FALSE END AS is_weekend
-            FROM date_bounds, generate_series(min_date, max_date, interval '1 day') AS d;
-            """
-        )
+                CASE WHEN EXTRACT(ISODOW FROM d) IN (6, 7) THEN TRUE ELSE FALSE END AS is_weekend"""
 
-        connector.execute(
-            """
-            INSERT INTO dw.dim_customer (
-                customer_id,
-                customer_unique_id,
-                zip_code_prefix,
-                city,
-                state
+# dw.dim_date is a calendar covering at least this range; it is extended past either
+# end when staging holds dates outside it.
+CALENDAR_START = date.fromisoformat(os.environ.get("ETL_CALENDAR_START", "2016-01-01"))
+CALENDAR_END = date.fromisoformat(os.environ.get("ETL_CALENDAR_END", "2020-12-31"))
+
+# One aggregate pass per staging table finds the date range it needs; only the days
+# outside the calendar already in dw.dim_date are generated, so a run whose dates fall
+# inside it inserts nothing and existing date keys are never rewritten.
+DIM_DATE_SQL = f"""
+            WITH date_bounds AS (
+                SELECT
+                    LEAST(DATE '{CALENDAR_START.isoformat()}', MIN(min_date)) AS min_date,
+                    GREATEST(DATE '{CALENDAR_END.isoformat()}', MAX(max_date)) AS max_date
+                FROM (
+                    SELECT
+                        MIN(LEAST(
+                            order_purchase_timestamp,
+                            order_approved_at,
+                            order_delivered_carrier_date,
+                            order_delivered_customer_date,
+                            order_estimated_delivery_date
+                        ))::date AS min_date,
+                        MAX(GREATEST(
+                            order_purchase_timestamp,
+                            order_approved_at,
+                            order_delivered_carrier_date,
+                            order_delivered_customer_date,
+                            order_estimated_delivery_date
+                        ))::date AS max_date
+                    FROM staging.orders
+                    UNION ALL
+                    SELECT MIN(shipping_limit_date)::date, MAX(shipping_limit_date)::date
+                    FROM staging.order_items
+                    UNION ALL
+                    SELECT
+                        MIN(LEAST(review_creation_date, review_answer_timestamp))::date,
+                        MAX(GREATEST(review_creation_date, review_answer_timestamp))::date
+                    FROM staging.order_reviews
+                ) staging_bounds
+            ),
+            existing AS (
+                SELECT MIN(date) AS min_date, MAX(date) AS max_date FROM dw.dim_date
+            )
+            INSERT INTO dw.dim_date ({DIM_DATE_COLUMNS}
             )
-            SELECT DISTINCT
+            SELECT{DIM_DATE_SELECT}
+            FROM date_bounds, existing, generate_series(
+                LEAST(date_bounds.min_date, existing.min_date)::timestamp,
+                GREATEST(date_bounds.max_date, existing.max_date)::timestamp,
+                interval '1 day'
+            ) AS d
+            WHERE existing.max_date IS NULL
+                OR d < existing.min_date
+                OR d > existing.max_date
+            ON CONFLICT (date_key) DO NOTHING;
+            """
+
+DIMENSION_LOADS = [
+    DimensionLoad(
+        table="dw.dim_customer",
+        natural_key="customer_id",
+        columns=("customer_id", "customer_unique_id", "zip_code_prefix", "city", "state"),
+        select_sql="""
+            SELECT DISTINCT ON (customer_id)
                 customer_id,
                 customer_unique_id,
                 customer_zip_code_prefix,
                 customer_city,
                 customer_state
             FROM staging.customers
-            WHERE customer_id IS NOT NULL;
-            """
-        )
-
-        connector.execute(
-            """
-            INSERT INTO dw.dim_seller (
-                seller_id,
-                zip_code_prefix,
-                city,
-                state
-            )
-            SELECT DISTINCT
+            WHERE customer_id IS NOT NULL
+            ORDER BY customer_id""",
+    ),
+    DimensionLoad(
+        table="dw.dim_seller",
+        natural_key="seller_id",
+        columns=("seller_id", "zip_code_prefix", "city", "state"),
+        select_sql="""
+            SELECT DISTINCT ON (seller_id)
                 seller_id,
                 seller_zip_code_prefix,
                 seller_city,
                 seller_state
             FROM staging.sellers
-            WHERE seller_id IS NOT NULL;
-            """
-        )
-
-        connector.execute(
-            """
-            INSERT INTO dw.dim_product (
-                product_id,
-                category_name,
-                category_name_english,
-                name_length,
-                description_length,
-                photos_qty,
-                weight_g,
-                length_cm,
-                height_cm,
-                width_cm
-            )
-            SELECT DISTINCT
+            WHERE seller_id IS NOT NULL
+            ORDER BY seller_id""",
+    ),
+    DimensionLoad(
+        table="dw.dim_product",
+        natural_key="product_id",
+        columns=(
+            "product_id",
+            "category_name",
+            "category_name_english",
+            "name_length",
+            "description_length",
+            "photos_qty",
+            "weight_g",
+            "length_cm",
+            "height_cm",
+            "width_cm",
+        ),
+        select_sql="""
+            SELECT DISTINCT ON (p.product_id)
                 p.product_id,
                 p.product_category_name,
                 t.product_category_name_english,
-                NULLIF(p.product_name_lenght, '')::int,
-                NULLIF(p.product_description_lenght, '')::int,
-                NULLIF(p.product_photos_qty, '')::int,
-                NULLIF(p.product_weight_g, '')::int,
-                NULLIF(p.product_length_cm, '')::int,
-                NULLIF(p.product_height_cm, '')::int,
-                NULLIF(p.product_width_cm, '')::int
+                p.product_name_lenght,
+                p.product_description_lenght,
+                p.product_photos_qty,
+                p.product_weight_g,
+                p.product_length_cm,
+                p.product_height_cm,
+                p.product_width_cm
             FROM staging.products p
             LEFT JOIN staging.product_category_name_translation t
                 ON t.product_category_name = p.product_category_name
-            WHERE p.product_id IS NOT NULL;
-            """
-        )
-
-        connector.execute(
-            """
-            INSERT INTO dw.dim_order_status (order_status)
+            WHERE p.product_id IS NOT NULL
+            ORDER BY p.product_id""",
+    ),
+    DimensionLoad(
+        table="dw.dim_order_status",
+        natural_key="order_status",
+        columns=("order_status",),
+        select_sql="""
             SELECT DISTINCT order_status
             FROM staging.orders
-            WHERE order_status IS NOT NULL;
-            """
-        )
-
-        connector.execute(
-            """
-            INSERT INTO dw.dim_payment_type (payment_type)
+            WHERE order_status IS NOT NULL""",
+    ),
+    DimensionLoad(
+        table="dw.dim_payment_type",
+        natural_key="payment_type",
+        columns=("payment_type",),
+        select_sql="""
             SELECT DISTINCT payment_type
             FROM staging.order_payments
-            WHERE payment_type IS NOT NULL;
+            WHERE payment_type IS NOT NULL""",
+    ),
+]
+
+
+TRUNCATE_DIMENSIONS_SQL = """
+            TRUNCATE TABLE
+                dw.dim_customer,
+                dw.dim_seller,
+                dw.dim_product,
+                dw.dim_order_status,
+                dw.dim_payment_type
+            RESTART IDENTITY;
             """
+
+
+def warehouse_sql() -> list[str]:
+    """The statements that build the ``dw`` tables, as a full rebuild runs them."""
+    return [
+        DIM_DATE_SQL,
+        *(dimension.insert_sql("rebuild") for dimension in DIMENSION_LOADS),
+        *(fact.insert_sql("full") for fact in FACT_LOADS),
+        *(aggregate.create_sql() for aggregate in AGGREGATES),
+    ]
+
+
+@functools.cache
+def warehouse_lineage() -> LineageGraph:
+    """Lineage of ``warehouse_sql``, parsed once per process."""
+    return LineageGraph.from_sql(warehouse_sql())
+
+
+def staging_sources(tables: Iterable[str]) -> list[str]:
+    """The staging tables ``tables`` are computed from, directly or through other ``dw`` tables."""
+    lineage = warehouse_lineage()
+    return sorted({source for table in tables for source in lineage.upstream(table) if source.startswith("staging.")})
+
+
+def _reads_changed(table: str, changed_tables: set[str] | None) -> bool:
+    """
+    Whether ``table`` is computed, directly or through other ``dw`` tables, from
+    ``changed_tables``. ``None`` means the set of changed staging tables is unknown,
+    so everything counts as changed.
+    """
+    return changed_tables is None or table in warehouse_lineage().downstream(changed_tables)
+
+
+def dimension_nodes(mode: DimensionLoadMode, changed_tables: set[str] | None = None) -> list[SqlNode]:
+    """
+    The dimension builds as graph nodes; they only depend on the rebuild TRUNCATE,
+    which leaves the ``dw.dim_date`` calendar in place.
+
+    Given ``changed_tables``, merge mode leaves out dimensions that the lineage of
+    their SQL does not trace back to one of them, and rebuild mode returns no
+    nodes when nothing changed.
+    """
+    if changed_tables is not None and not changed_tables:
+        return []
+    nodes = []
+    setup: tuple[str, ...] = ()
+    if mode == "rebuild":
+        changed_tables = None
+        nodes.append(SqlNode("truncate dimensions", (("truncate dimensions", TRUNCATE_DIMENSIONS_SQL),)))
+        setup = ("truncate dimensions",)
+
+    if _reads_changed("dw.dim_date", changed_tables):
+        nodes.append(
+            SqlNode("dw.dim_date", (("dw.dim_date", DIM_DATE_SQL), ("analyze dw.dim_date", "ANALYZE dw.dim_date;")))
+        )
+    for dimension in DIMENSION_LOADS:
+        if not _reads_changed(dimension.table, changed_tables):
+            continue
+        nodes.append(
+            SqlNode(
+                dimension.table,
+                (
+                    (dimension.table, dimension.insert_sql(mode)),
+                    (f"analyze {dimension.table}", f"ANALYZE {dimension.table};"),
+                ),
+                depends_on=setup,
+            )
         )
+    return nodes
 
 
 @task
-def load_facts(block_name: str) -> None:
-    with SqlAlchemyConnector.load(block_name) as connector:
-        connector.execute(
+def load_dimensions(
+    block_name: str,
+    mode: DimensionLoadMode = "rebuild",
+    explain: bool = False,
+    max_parallel: int = 1,
+) -> None:
+    """
+    Build the ``dw.dim_*`` tables from staging.
+
+    ``mode="rebuild"`` truncates every dimension and regenerates its surrogate keys.
+    ``mode="merge"`` upserts on the natural keys instead, so existing ``*_sk`` values
+    stay stable between runs. In both modes ``dw.dim_date`` keeps its calendar and
+    is only extended with days outside its current range. The dimensions are
+    independent, so up to ``max_parallel`` of them are built at once. Every
+    statement is timed and published as an artifact; with ``explain=True`` their
+    EXPLAIN (ANALYZE, BUFFERS) plans are published too.
+    """
+    run_sql_graph(block_name, dimension_nodes(mode), "load_dimensions", max_parallel, explain)
+
+
+@dataclass(frozen=True)
+class FactLoad:
+    """
+    How one ``dw.fact_*`` table is built from staging.
+
+    ``select_sql`` contains a ``{where}`` placeholder that the incremental mode fills
+    with a high-water-mark filter on ``changed_at``. ``watermark_from`` is the FROM
+    clause that ``changed_at`` is evaluated against when the mark is advanced.
+    ``dimensions`` lists the dimension tables the build joins against. The table is
+    partitioned by month of ``partitioned_by``, a timestamp that is also evaluated
+    against ``watermark_from``.
+    """
+
+    table: str
+    columns: tuple[str, ...]
+    select_sql: str
+    conflict_columns: tuple[str, ...]
+    changed_at: str
+    watermark_from: str
+    dimensions: tuple[str, ...]
+    partitioned_by: str
+
+    def _changed_since_watermark(self) -> str:
+        return f"""WHERE {self.changed_at} > COALESCE(
+                (SELECT high_water_mark FROM dw.etl_watermark WHERE table_name = '{self.table}'),
+                '-infinity'::timestamp
+            )"""
+
+    def insert_sql(self, mode: FactLoadMode) -> str:
+        column_list = ", ".join(self.columns)
+        if mode == "full":
+            return f"INSERT INTO {self.table} ({column_list})\n{self.select_sql.format(where='')};"
+
+        where = self._changed_since_watermark()
+        updates = ",\n    ".join(
+            f"{column} = EXCLUDED.{column}"
+            for column in self.columns
+            if column not in self.conflict_columns
+        )
+        return (
+            f"INSERT INTO {self.table} ({column_list})\n"
+            f"{self.select_sql.format(where=where)}\n"
+            f"ON CONFLICT ({', '.join(self.conflict_columns)}) DO UPDATE SET\n    {updates};"
+        )
+
+    def partitions_sql(self) -> str:
+        """Create the monthly partitions for every month present in staging."""
+        return f"""
+            SELECT dw.ensure_month_partition('{self.table}', month)
+            FROM (
+                SELECT DISTINCT date_trunc('month', {self.partitioned_by})::date AS month
+                {self.watermark_from}
+                WHERE {self.partitioned_by} IS NOT NULL
+            ) months;
             """
-            TRUNCATE TABLE
-                dw.fact_order_items,
-                dw.fact_orders,
-                dw.fact_payments,
-                dw.fact_reviews
-            RESTART IDENTITY;
+
+    def changed_months_sql(self) -> str:
+        """Months holding rows that changed since the high-water mark; NULL stands for the DEFAULT partition."""
+        return f"""
+            SELECT DISTINCT date_trunc('month', {self.partitioned_by})::date
+            {self.watermark_from}
+            {self._changed_since_watermark()};
             """
+
+    def partition_rebuild_statements(self, month: date | None) -> tuple[tuple[str, str], ...]:
+        """
+        Labelled statements that replace the partition holding ``month`` (the DEFAULT
+        partition for None); their node runs them in one transaction.
+        """
+        if month is None:
+            partition = f"{self.table}_default"
+            where = f"WHERE {self.partitioned_by} IS NULL"
+        else:
+            next_month = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+            partition = f"{self.table}_p{month:%Y%m}"
+            where = (
+                f"WHERE {self.partitioned_by} >= DATE '{month.isoformat()}'\n"
+                f"                AND {self.partitioned_by} < DATE '{next_month.isoformat()}'"
+            )
+        return (
+            (f"truncate {partition}", f"TRUNCATE TABLE {partition};"),
+            (
+                f"{self.table} {partition.removeprefix(f'{self.table}_')}",
+                f"INSERT INTO {self.table} ({', '.join(self.columns)})\n{self.select_sql.format(where=where)};",
+            ),
         )
 
-        connector.execute(
+    def watermark_sql(self) -> str:
+        return f"""
+            INSERT INTO dw.etl_watermark AS wm (table_name, high_water_mark, updated_at)
+            SELECT '{self.table}', MAX({self.changed_at}), now()
+            {self.watermark_from}
+            ON CONFLICT (table_name) DO UPDATE SET
+                high_water_mark = GREATEST(wm.high_water_mark, EXCLUDED.high_water_mark),
+                updated_at = EXCLUDED.updated_at;
             """
-            INSERT INTO dw.fact_order_items (
-                order_id,
-                order_item_id,
-                customer_sk,
-                seller_sk,
-                product_sk,
-                order_status_sk,
-                purchase_date_key,
-                shipping_limit_date_key,
-                delivered_customer_date_key,
-                estimated_delivery_date_key,
-                price,
-                freight_value
-            )
+
+
+# An order counts as changed when any of its lifecycle timestamps moves past the mark,
+# so status updates on old orders are picked up as well as new purchases. Items and
+# payments have no timestamps of their own and use their order's, so one added to or
+# changed on an order whose timestamps stay below the mark is not picked up by the
+# incremental and partition modes; see load_facts.
+ORDER_CHANGED_AT = """GREATEST(
+                o.order_purchase_timestamp,
+                o.order_approved_at,
+                o.order_delivered_carrier_date,
+                o.order_delivered_customer_date
+            )"""
+
+REVIEW_CHANGED_AT = """GREATEST(
+                r.review_creation_date,
+                r.review_answer_timestamp
+            )"""
+
+# fact_orders sums items and payments per order. Joining both detail tables onto
+# orders before the GROUP BY produces items x payments rows per order and counts each
+# price/payment once per row on the other side, so each side is aggregated per
+# order_id first and joined once.
+FACT_ORDERS_SELECT = """
             SELECT
-                oi.order_id,
-                NULLIF(oi.order_item_id, '')::int,
+                o.order_id,
                 dc.customer_sk,
-                ds.seller_sk,
-                dp.product_sk,
                 dos.order_status_sk,
-                dd_purchase.date_key,
-                dd_shipping.date_key,
-                dd_delivered.date_key,
-                dd_estimated.date_key,
-                NULLIF(oi.price, '')::numeric,
-                NULLIF(oi.freight_value, '')::numeric
-            FROM staging.order_items oi
-            JOIN staging.orders o
-                ON o.order_id = oi.order_id
+                dw.date_key(o.order_purchase_timestamp),
+                dw.date_key(o.order_approved_at),
+                dw.date_key(o.order_delivered_carrier_date),
+                dw.date_key(o.order_delivered_customer_date),
+                dw.date_key(o.order_estimated_delivery_date),
+                COALESCE(items.items_count, 0),
+                COALESCE(items.order_item_total, 0),
+                COALESCE(items.freight_total, 0),
+                COALESCE(payments.payment_total, 0)
+            FROM staging.orders o
+            LEFT JOIN (
+                SELECT
+                    order_id,
+                    COUNT(order_item_id) AS items_count,
+                    SUM(price) AS order_item_total,
+                    SUM(freight_value) AS freight_total
+                FROM staging.order_items
+                GROUP BY order_id
+            ) items
+                ON items.order_id = o.order_id
+            LEFT JOIN (
+                SELECT
+                    order_id,
+                    SUM(payment_value) AS payment_total
+                FROM staging.order_payments
+                GROUP BY order_id
+            ) payments
+                ON payments.order_id = o.order_id
             LEFT JOIN dw.dim_customer dc
                 ON dc.customer_id = o.customer_id
-            LEFT JOIN dw.dim_seller ds
-                ON ds.seller_id = oi.seller_id
-            LEFT JOIN dw.dim_product dp
-                ON dp.product_id = oi.product_id
             LEFT JOIN dw.dim_order_status dos
                 ON dos.order_status = o.order_status
-            LEFT JOIN dw.dim_date dd_purchase
-                ON dd_purchase.date = NULLIF(o.order_purchase_timestamp, '')::timestamp::date
-            LEFT JOIN dw.dim_date dd_shipping
-                ON dd_shipping.date = NULLIF(oi.shipping_limit_date, '')::timestamp::date
-            LEFT JOIN dw.dim_date dd_delivered
-                ON dd_delivered.date = NULLIF(o.order_delivered_customer_date, '')::timestamp::date
-            LEFT JOIN dw.dim_date dd_estimated
-                ON dd_estimated.date = NULLIF(o.order_estimated_delivery_date, '')::timestamp::date;
-            """
-        )
+            {where}"""
 
-        connector.execute(
-            """
-            INSERT INTO dw.fact_orders (
-                order_id,
-                customer_sk,
-                order_status_sk,
-                purchase_date_key,
-                approved_date_key,
-                delivered_carrier_date_key,
-                delivered_customer_date_key,
-                estimated_delivery_date_key,
-                items_count,
-                order_item_total,
-                freight_total,
-                payment_total
-            )
+# The original single-join build, kept only so compare_fact_orders_plans can show
+# the difference between the two plans.
+FACT_ORDERS_FANOUT_SELECT = """
             SELECT
                 o.order_id,
                 dc.customer_sk,
@@ -500,9 +1307,9 @@ def load_facts(block_name: str) -> None:
                 dd_delivered.date_key,
                 dd_estimated.date_key,
                 COUNT(oi.order_item_id),
-                COALESCE(SUM(NULLIF(oi.price, '')::numeric), 0),
-                COALESCE(SUM(NULLIF(oi.freight_value, '')::numeric), 0),
-                COALESCE(SUM(NULLIF(op.payment_value, '')::numeric), 0)
+                COALESCE(SUM(oi.price), 0),
+                COALESCE(SUM(oi.freight_value), 0),
+                COALESCE(SUM(op.payment_value), 0)
             FROM staging.orders o
             LEFT JOIN staging.order_items oi
                 ON oi.order_id = o.order_id
@@ -513,15 +1320,16 @@ def load_facts(block_name: str) -> None:
             LEFT JOIN dw.dim_order_status dos
                 ON dos.order_status = o.order_status
             LEFT JOIN dw.dim_date dd_purchase
-                ON dd_purchase.date = NULLIF(o.order_purchase_timestamp, '')::timestamp::date
+                ON dd_purchase.date = o.order_purchase_timestamp::date
             LEFT JOIN dw.dim_date dd_approved
-                ON dd_approved.date = NULLIF(o.order_approved_at, '')::timestamp::date
+                ON dd_approved.date = o.order_approved_at::date
             LEFT JOIN dw.dim_date dd_carrier
-                ON dd_carrier.date = NULLIF(o.order_delivered_carrier_date, '')::timestamp::date
+                ON dd_carrier.date = o.order_delivered_carrier_date::date
             LEFT JOIN dw.dim_date dd_delivered
-                ON dd_delivered.date = NULLIF(o.order_delivered_customer_date, '')::timestamp::date
+                ON dd_delivered.date = o.order_delivered_customer_date::date
             LEFT JOIN dw.dim_date dd_estimated
-                ON dd_estimated.date = NULLIF(o.order_estimated_delivery_date, '')::timestamp::date
+                ON dd_estimated.date = o.order_estimated_delivery_date::date
+            {where}
             GROUP BY
                 o.order_id,
                 dc.customer_sk,
@@ -530,28 +1338,104 @@ def load_facts(block_name: str) -> None:
                 dd_approved.date_key,
                 dd_carrier.date_key,
                 dd_delivered.date_key,
-                dd_estimated.date_key;
-            """
-        )
+                dd_estimated.date_key"""
 
-        connector.execute(
-            """
-            INSERT INTO dw.fact_payments (
-                order_id,
-                payment_sequential,
-                payment_type_sk,
-                payment_installments,
-                payment_value,
-                purchase_date_key,
-                customer_sk
-            )
+FACT_LOADS = [
+    FactLoad(
+        table="dw.fact_order_items",
+        columns=(
+            "order_id",
+            "order_item_id",
+            "customer_sk",
+            "seller_sk",
+            "product_sk",
+            "order_status_sk",
+            "purchase_date_key",
+            "shipping_limit_date_key",
+            "delivered_customer_date_key",
+            "estimated_delivery_date_key",
+            "price",
+            "freight_value",
+        ),
+        select_sql="""
+            SELECT
+                oi.order_id,
+                oi.order_item_id,
+                dc.customer_sk,
+                ds.seller_sk,
+                dp.product_sk,
+                dos.order_status_sk,
+                dw.date_key(o.order_purchase_timestamp),
+                dw.date_key(oi.shipping_limit_date),
+                dw.date_key(o.order_delivered_customer_date),
+                dw.date_key(o.order_estimated_delivery_date),
+                oi.price,
+                oi.freight_value
+            FROM staging.order_items oi
+            JOIN staging.orders o
+                ON o.order_id = oi.order_id
+            LEFT JOIN dw.dim_customer dc
+                ON dc.customer_id = o.customer_id
+            LEFT JOIN dw.dim_seller ds
+                ON ds.seller_id = oi.seller_id
+            LEFT JOIN dw.dim_product dp
+                ON dp.product_id = oi.product_id
+            LEFT JOIN dw.dim_order_status dos
+                ON dos.order_status = o.order_status
+            {where}""",
+        conflict_columns=("order_id", "order_item_id", "purchase_date_key"),
+        changed_at=ORDER_CHANGED_AT,
+        watermark_from="FROM staging.orders o",
+        partitioned_by="o.order_purchase_timestamp",
+        dimensions=(
+            "dw.dim_customer",
+            "dw.dim_seller",
+            "dw.dim_product",
+            "dw.dim_order_status",
+        ),
+    ),
+    FactLoad(
+        table="dw.fact_orders",
+        columns=(
+            "order_id",
+            "customer_sk",
+            "order_status_sk",
+            "purchase_date_key",
+            "approved_date_key",
+            "delivered_carrier_date_key",
+            "delivered_customer_date_key",
+            "estimated_delivery_date_key",
+            "items_count",
+            "order_item_total",
+            "freight_total",
+            "payment_total",
+        ),
+        select_sql=FACT_ORDERS_SELECT,
+        conflict_columns=("order_id", "purchase_date_key"),
+        changed_at=ORDER_CHANGED_AT,
+        watermark_from="FROM staging.orders o",
+        partitioned_by="o.order_purchase_timestamp",
+        dimensions=("dw.dim_customer", "dw.dim_order_status"),
+    ),
+    FactLoad(
+        table="dw.fact_payments",
+        columns=(
+            "order_id",
+            "payment_sequential",
+            "payment_type_sk",
+            "payment_installments",
+            "payment_value",
+            "purchase_date_key",
+            "customer_sk",
+        ),
+        select_sql="""
             SELECT
                 op.order_id,
-                NULLIF(op.payment_sequential, '')::int,
+                op.payment_sequential,
                 dpt.payment_type_sk,
-                NULLIF(op.payment_installments, '')::int,
-                NULLIF(op.payment_value, '')::numeric,
-                dd_purchase.date_key,
+                op.payment_installments,
+                op.payment_value,
+                dw.date_key(o.order_purchase_timestamp),
                 dc.customer_sk
             FROM staging.order_payments op
             LEFT JOIN staging.orders o
@@ -560,55 +1444,669 @@ def load_facts(block_name: str) -> None:
                 ON dpt.payment_type = op.payment_type
             LEFT JOIN dw.dim_customer dc
                 ON dc.customer_id = o.customer_id
-            LEFT JOIN dw.dim_date dd_purchase
-                ON dd_purchase.date = NULLIF(o.order_purchase_timestamp, '')::timestamp::date;
-            """
-        )
-
-        connector.execute(
-            """
-            INSERT INTO dw.fact_reviews (
-                review_id,
-                order_id,
-                customer_sk,
-                review_score,
-                review_creation_date_key,
-                review_answer_date_key
-            )
+            {where}""",
+        conflict_columns=("order_id", "payment_sequential", "purchase_date_key"),
+        changed_at=ORDER_CHANGED_AT,
+        watermark_from="FROM staging.orders o",
+        partitioned_by="o.order_purchase_timestamp",
+        dimensions=("dw.dim_payment_type", "dw.dim_customer"),
+    ),
+    FactLoad(
+        table="dw.fact_reviews",
+        columns=(
+            "review_id",
+            "order_id",
+            "customer_sk",
+            "review_score",
+            "review_creation_date_key",
+            "review_answer_date_key",
+        ),
+        select_sql="""
             SELECT
                 r.review_id,
                 r.order_id,
                 dc.customer_sk,
-                NULLIF(r.review_score, '')::int,
-                dd_creation.date_key,
-                dd_answer.date_key
+                r.review_score,
+                dw.date_key(r.review_creation_date),
+                dw.date_key(r.review_answer_timestamp)
             FROM staging.order_reviews r
             LEFT JOIN staging.orders o
                 ON o.order_id = r.order_id
             LEFT JOIN dw.dim_customer dc
                 ON dc.customer_id = o.customer_id
-            LEFT JOIN dw.dim_date dd_creation
-                ON dd_creation.date = NULLIF(r.review_creation_date, '')::timestamp::date
-            LEFT JOIN dw.dim_date dd_answer
-                ON dd_answer.date = NULLIF(r.review_answer_timestamp, '')::timestamp::date;
+            {where}""",
+        conflict_columns=("review_id", "order_id", "review_creation_date_key"),
+        changed_at=REVIEW_CHANGED_AT,
+        watermark_from="FROM staging.order_reviews r",
+        partitioned_by="r.review_creation_date",
+        dimensions=("dw.dim_customer",),
+    ),
+]
+
+
+TRUNCATE_FACTS_SQL = """
+            TRUNCATE TABLE
+                dw.fact_order_items,
+                dw.fact_orders,
+                dw.fact_payments,
+                dw.fact_reviews
+            RESTART IDENTITY;
             """
+
+
+def changed_months(block_name: str) -> dict[str, list[date | None]]:
+    """The months each fact table has to rebuild in ``mode="partition"``."""
+    with pooled_connector(block_name) as connector:
+        return {fact.table: [row[0] for row in connector.fetch_all(fact.changed_months_sql())] for fact in FACT_LOADS}
+
+
+def fact_nodes(
+    mode: FactLoadMode,
+    changed_tables: set[str] | None = None,
+    months: dict[str, list[date | None]] | None = None,
+) -> list[SqlNode]:
+    """
+    The fact builds as graph nodes, each depending on the dimensions it joins.
+
+    Given ``changed_tables``, incremental and partition modes leave out facts that
+    ``warehouse_lineage`` does not trace back to one of them, through the dimensions
+    they join or directly, and full mode returns no nodes when nothing changed.
+    Partition mode rebuilds the partitions listed in ``months`` (see
+    ``changed_months``).
+    """
+    if changed_tables is not None and not changed_tables:
+        return []
+    nodes = []
+    setup: tuple[str, ...] = ()
+    if mode == "full":
+        changed_tables = None
+        nodes.append(SqlNode("truncate facts", (("truncate facts", TRUNCATE_FACTS_SQL),)))
+        setup = ("truncate facts",)
+
+    for fact in FACT_LOADS:
+        if not _reads_changed(fact.table, changed_tables):
+            continue
+        if mode == "partition":
+            fact_months = (months or {}).get(fact.table, [])
+            if not fact_months:
+                continue
+            builds = tuple(
+                statement for month in fact_months for statement in fact.partition_rebuild_statements(month)
+            )
+        else:
+            builds = ((fact.table, fact.insert_sql(mode)),)
+        nodes.append(
+            SqlNode(
+                fact.table,
+                (
+                    (f"{fact.table} partitions", fact.partitions_sql()),
+                    *builds,
+                    (f"{fact.table} watermark", fact.watermark_sql()),
+                ),
+                depends_on=setup + fact.dimensions,
+            )
         )
+    return nodes
+
+
+@task
+def load_facts(
+    block_name: str,
+    mode: FactLoadMode = "full",
+    explain: bool = False,
+    max_parallel: int = 1,
+) -> None:
+    """
+    Build the ``dw.fact_*`` tables from staging.
+
+    ``mode="full"`` truncates and rebuilds every fact table. ``mode="incremental"``
+    only upserts orders, items, payments and reviews whose timestamps moved past the
+    high-water mark stored in ``dw.etl_watermark``, using ``ON CONFLICT`` on their
+    natural keys. ``mode="partition"`` instead truncates and refills each monthly
+    partition holding such rows, so the cost follows the number of months touched
+    and rows that disappeared from staging are dropped too. All modes advance the
+    mark, so a full refresh can be followed by incremental or partition runs, which
+    rely on dimension surrogate keys staying stable between runs, i.e. on
+    ``load_dimensions(mode="merge")``. Monthly partitions are created as new months
+    show up. Up to ``max_parallel`` fact tables are built at once, instrumented as in
+    ``load_dimensions``.
+
+    Order items and payments have no timestamps of their own, so both incremental
+    modes judge them by their order's lifecycle timestamps: an item or payment
+    added to, or changed on, an order none of whose timestamps moved past the mark
+    is missed until the next ``mode="full"`` run.
+    """
+    months = changed_months(block_name) if mode == "partition" else None
+    run_sql_graph(block_name, fact_nodes(mode, months=months), "load_facts", max_parallel, explain)
+
+
+@task
+def build_warehouse(
+    block_name: str,
+    dimension_mode: DimensionLoadMode = "rebuild",
+    fact_mode: FactLoadMode = "full",
+    explain: bool = False,
+    max_parallel: int = 4,
+    changed_tables: list[str] | None = None,
+) -> dict[str, list[date | None] | None] | None:
+    """
+    Build dimensions and facts as one dependency graph.
+
+    Unlike ``load_dimensions`` followed by ``load_facts``, each fact table starts as
+    soon as the dimensions it joins are ready. ``changed_tables`` names the staging
+    tables reloaded by this run (see ``load_staging``); builds that only read
+    unchanged tables are left out, and nothing runs when none changed.
+
+    Returns what changed for ``refresh_aggregates``: the months written per fact
+    table, facts that got no new rows left out, and None for every dimension that
+    was built, since any of its rows may have changed. Returns None when the facts
+    were rebuilt in full.
+    """
+    changed = set(changed_tables) if changed_tables is not None else None
+    months = changed_months(block_name) if fact_mode != "full" else None
+    dimensions = dimension_nodes(dimension_mode, changed)
+    facts = fact_nodes(fact_mode, changed, months)
+    nodes = dimensions + facts
+    if not nodes:
+        get_run_logger().info("No staging table changed; the warehouse is up to date")
+        return {}
+    run_sql_graph(block_name, nodes, "build_warehouse", max_parallel, explain)
+
+    built = {node.name for node in facts}
+    if fact_mode == "full" and built:
+        return None
+    written: dict[str, list[date | None] | None] = {
+        node.name: None for node in dimensions if node.name in warehouse_lineage().tables
+    }
+    written.update(
+        (table, table_months) for table, table_months in (months or {}).items() if table in built and table_months
+    )
+    return written
+
+
+@dataclass(frozen=True)
+class Aggregate:
+    """
+    A summary of the facts for Superset dashboards.
+
+    ``select_sql`` contains a ``{where}`` placeholder and returns one row per
+    ``unique_key``. With ``date_key`` (the fact date key the summary is grouped
+    by month on, exposed as ``month_key``) the summary is a table whose months are
+    replaced individually; otherwise it is a materialized view, which PostgreSQL
+    can only refresh as a whole, refreshed ``CONCURRENTLY`` so dashboards keep
+    reading the previous contents meanwhile. ``facts`` lists the fact tables read.
+    """
+
+    name: str
+    select_sql: str
+    unique_key: tuple[str, ...]
+    facts: tuple[str, ...]
+    date_key: str | None = None
+
+    def create_sql(self) -> str:
+        """Create the summary; a materialized view is populated right away, a table is left empty."""
+        kind, data = ("TABLE", " WITH NO DATA") if self.date_key else ("MATERIALIZED VIEW", "")
+        return (
+            f"CREATE {kind} IF NOT EXISTS {self.name} AS\n{self.select_sql.format(where='')}{data};\n"
+            f"CREATE UNIQUE INDEX IF NOT EXISTS {self.name.split('.')[-1]}_key\n"
+            f"    ON {self.name} ({', '.join(self.unique_key)});"
+        )
+
+    def refresh_statements(self, months: list[date | None] | None) -> tuple[tuple[str, str], ...]:
+        """Labelled statements refreshing everything, or with ``months`` only those (None is rows without a date)."""
+        if not self.date_key:
+            return ((self.name, f"REFRESH MATERIALIZED VIEW CONCURRENTLY {self.name};"),)
+        if months is not None and not months:
+            raise ValueError(f"No months to refresh in {self.name}")
+        if months is None:
+            delete, where = f"DELETE FROM {self.name};", ""
+        else:
+            month_keys = [month.year * 100 + month.month for month in months if month is not None]
+            # Month ranges on the date key itself, so the planner prunes fact partitions.
+            ranges = [
+                f"{self.date_key} >= {key * 100} AND {self.date_key} < {(key + 1) * 100}" for key in month_keys
+            ]
+            deleted = [f"month_key IN ({', '.join(map(str, month_keys))})"] if month_keys else []
+            if None in months:
+                ranges.append(f"{self.date_key} IS NULL")
+                deleted.append("month_key IS NULL")
+            delete = f"DELETE FROM {self.name} WHERE {' OR '.join(deleted)};"
+            where = f"WHERE {' OR '.join(f'({condition})' for condition in ranges)}"
+        # Their node runs them in one transaction, so dashboards see either the old or the new months.
+        return (
+            (f"delete {self.name}", delete),
+            (self.name, f"INSERT INTO {self.name}\n{self.select_sql.format(where=where)};"),
+        )
+
+
+AGGREGATES = [
+    Aggregate(
+        name="dw.agg_revenue_by_month_state",
+        select_sql="""
+            SELECT
+                f.purchase_date_key / 100 AS month_key,
+                COALESCE(dc.state, 'unknown') AS state,
+                COUNT(*) AS orders,
+                SUM(f.items_count) AS items,
+                SUM(f.order_item_total) AS revenue,
+                SUM(f.freight_total) AS freight,
+                SUM(f.payment_total) AS payments
+            FROM dw.fact_orders f
+            LEFT JOIN dw.dim_customer dc
+                ON dc.customer_sk = f.customer_sk
+            {where}
+            GROUP BY 1, 2""",
+        unique_key=("month_key", "state"),
+        facts=("dw.fact_orders",),
+        date_key="f.purchase_date_key",
+    ),
+    Aggregate(
+        name="dw.agg_sales_by_month_category",
+        select_sql="""
+            SELECT
+                f.purchase_date_key / 100 AS month_key,
+                COALESCE(dp.category_name_english, dp.category_name, 'unknown') AS category,
+                COUNT(*) AS items,
+                COUNT(DISTINCT f.order_id) AS orders,
+                SUM(f.price) AS revenue,
+                SUM(f.freight_value) AS freight
+            FROM dw.fact_order_items f
+            LEFT JOIN dw.dim_product dp
+                ON dp.product_sk = f.product_sk
+            {where}
+            GROUP BY 1, 2""",
+        unique_key=("month_key", "category"),
+        facts=("dw.fact_order_items",),
+        date_key="f.purchase_date_key",
+    ),
+    Aggregate(
+        name="dw.agg_review_score_by_category",
+        # A review counts once for every category in its order.
+        select_sql="""
+            SELECT
+                oc.category,
+                COUNT(*) AS reviews,
+                ROUND(AVG(r.review_score), 2) AS avg_review_score,
+                COUNT(*) FILTER (WHERE r.review_score <= 2) AS low_score_reviews
+            FROM dw.fact_reviews r
+            JOIN (
+                SELECT DISTINCT
+                    f.order_id,
+                    COALESCE(dp.category_name_english, dp.category_name, 'unknown') AS category
+                FROM dw.fact_order_items f
+                LEFT JOIN dw.dim_product dp
+                    ON dp.product_sk = f.product_sk
+            ) oc
+                ON oc.order_id = r.order_id
+            {where}
+            GROUP BY 1""",
+        unique_key=("category",),
+        facts=("dw.fact_reviews", "dw.fact_order_items"),
+    ),
+]
+
+
+def aggregate_nodes(
+    months: dict[str, list[date | None] | None] | None,
+    created: set[str] = frozenset(),
+) -> list[SqlNode]:
+    """
+    Refresh nodes for the aggregates whose facts or dimensions changed.
+
+    ``months`` is what ``build_warehouse`` returned: None refreshes everything,
+    otherwise monthly summaries only replace the months written to their facts,
+    and a summary that joins a changed dimension directly (per
+    ``warehouse_lineage``) is refreshed in full. Aggregates in ``created`` were
+    just created: their tables are filled in full, their materialized views were
+    populated by CREATE already.
+    """
+    nodes = []
+    for aggregate in AGGREGATES:
+        if aggregate.name in created and not aggregate.date_key:
+            continue
+        if months is None or aggregate.name in created:
+            aggregate_months = None
+        else:
+            changed = [table for table in warehouse_lineage().reads(aggregate.name) if table in months]
+            if not changed:
+                continue
+            if any(months[table] is None for table in changed):
+                aggregate_months = None
+            else:
+                aggregate_months = sorted(
+                    {month for table in changed for month in months[table]},
+                    key=lambda month: (month is None, month),
+                )
+                if not aggregate_months:
+                    continue
+        nodes.append(
+            SqlNode(
+                aggregate.name,
+                (
+                    *aggregate.refresh_statements(aggregate_months),
+                    (f"analyze {aggregate.name}", f"ANALYZE {aggregate.name};"),
+                ),
+            )
+        )
+    return nodes
+
+
+@task
+def refresh_aggregates(
+    block_name: str,
+    months: dict[str, list[date | None] | None] | None = None,
+    explain: bool = False,
+    max_parallel: int = 4,
+) -> None:
+    """
+    Refresh the ``AGGREGATES`` Superset reads instead of the raw facts.
+
+    Creates missing aggregates first. ``months`` limits the refresh to what the
+    warehouse build changed, see ``aggregate_nodes``.
+    """
+    with pooled_connector(block_name) as connector:
+        created = set()
+        for aggregate in AGGREGATES:
+            if connector.fetch_all("SELECT to_regclass(:name);", parameters={"name": aggregate.name})[0][0] is None:
+                connector.execute(aggregate.create_sql())
+                created.add(aggregate.name)
+    nodes = aggregate_nodes(months, created)
+    if not nodes:
+        get_run_logger().info("No table they read changed; the aggregates are up to date")
+        return
+    run_sql_graph(block_name, nodes, "refresh_aggregates", max_parallel, explain)
+
+
+# The hand-written sandbox build (etl/sql/sandbox_dw), indexed next to the flow's own SQL.
+SANDBOX_SQL_DIR = Path(__file__).resolve().parents[1] / "sql" / "sandbox_dw"
+
+
+@task
+def record_lineage(block_name: str) -> int:
+    """
+    Replace ``dw.column_lineage`` with the lineage of ``warehouse_sql`` and the
+    sandbox scripts; returns the number of rows written.
+    """
+    scripts = [path.read_text() for path in sorted(SANDBOX_SQL_DIR.glob("*.sql"))]
+    rows = LineageGraph.from_sql(warehouse_sql() + scripts).rows()
+    with pooled_connector(block_name) as connector:
+        # One transaction, so readers never see the table empty.
+        with connector.get_connection(begin=True) as connection:
+            connection.execute(text("DELETE FROM dw.column_lineage;"))
+            connection.execute(
+                text(
+                    "INSERT INTO dw.column_lineage (target_table, target_column, source_table, source_column) "
+                    "VALUES (:target_table, :target_column, :source_table, :source_column);"
+                ),
+                rows,
+            )
+    return len(rows)
+
+
+@task
+def explain_fact_orders(block_name: str) -> dict[str, str]:
+    """Run EXPLAIN ANALYZE on the fan-out and pre-aggregated fact_orders builds."""
+    logger = get_run_logger()
+    plans = {}
+    with pooled_connector(block_name) as connector:
+        for name, select_sql in (
+            ("fanout", FACT_ORDERS_FANOUT_SELECT),
+            ("pre_aggregated", FACT_ORDERS_SELECT),
+        ):
+            rows = connector.fetch_all(f"EXPLAIN (ANALYZE, BUFFERS) {select_sql.format(where='')}")
+            plans[name] = "\n".join(row[0] for row in rows)
+            logger.info("fact_orders %s plan:\n%s", name, plans[name])
+    return plans
+
+
+@task
+def index_staging_tables(block_name: str, tables: list[str] | None = None) -> None:
+    """
+    Build the staging join indexes and refresh planner statistics after a bulk load.
+
+    ``tables`` limits the work to the staging tables that were reloaded; by default
+    every table in ``DATASETS`` is covered.
+    """
+    tables = [table for _, table in DATASETS] if tables is None else tables
+    with pooled_connector(block_name) as connector:
+        for table in tables:
+            for column in STAGING_INDEXES.get(table, []):
+                connector.execute(
+                    f"CREATE INDEX IF NOT EXISTS {_staging_index_name(table, column)} ON {table} ({column});"
+                )
+            # Statistics are empty right after TRUNCATE + load, which leaves the planner guessing.
+            connector.execute(f"ANALYZE {table};")
+
+
+def _staging_task_runner(runner: StagingRunner, max_workers: int):
+    if runner == "process":
+        return ProcessPoolTaskRunner(max_workers=max_workers)
+    return ThreadPoolTaskRunner(max_workers=max_workers)
+
+
+def select_datasets(datasets: list[str] | None) -> list[tuple[str, str]]:
+    """The ``DATASETS`` entries named by staging table or file name; all of them for None."""
+    if datasets is None:
+        return list(DATASETS)
+    unknown = set(datasets) - {name for entry in DATASETS for name in entry}
+    if unknown:
+        raise ValueError(f"Unknown datasets: {', '.join(sorted(unknown))}")
+    return [(file_name, table) for file_name, table in DATASETS if file_name in datasets or table in datasets]
+
+
+def load_staging(
+    block_name: str,
+    data_path: Path,
+    load_method: LoadMethod = "copy",
+    runner: StagingRunner = "thread",
+    max_workers: int = 4,
+    skip_unchanged: bool = True,
+    split_workers: int = 4,
+    datasets: list[str] | None = None,
+    profile: bool = True,
+) -> list[LoadResult]:
+    """
+    Load every file in ``DATASETS`` into its staging table.
+
+    ``datasets`` restricts the load to the given staging tables or file names.
+
+    The staging tables do not depend on each other, so unless ``runner`` is
+    ``"sequential"`` the loads are submitted as parallel task runs on a thread or
+    process pool of ``max_workers``. Each load opens its own connection. Returns
+    once every load has finished; files unchanged since their last load are
+    skipped unless ``skip_unchanged`` is False. Files above ``SPLIT_LOAD_THRESHOLD``
+    are additionally split across ``split_workers`` connections. With ``profile``
+    each reloaded file is profiled while it loads.
+    """
+    logger = get_run_logger()
+    started = time.perf_counter()
+    selected = select_datasets(datasets)
+    if runner == "sequential":
+        results = [
+            load_csv_to_table(
+                block_name,
+                data_path / file_name,
+                table,
+                method=load_method,
+                skip_unchanged=skip_unchanged,
+                split_workers=split_workers,
+                profile=profile,
+            )
+            for file_name, table in selected
+        ]
+    else:
+        with _staging_task_runner(runner, max_workers) as task_runner:
+            futures = [
+                task_runner.submit(
+                    load_csv_to_table,
+                    parameters={
+                        "block_name": block_name,
+                        "csv_path": data_path / file_name,
+                        "table": table,
+                        "method": load_method,
+                        "skip_unchanged": skip_unchanged,
+                        "split_workers": split_workers,
+                        "profile": profile,
+                    },
+                )
+                for file_name, table in selected
+            ]
+            wait(futures)
+            results = [future.result() for future in futures]
+
+    for result in results:
+        if result.skipped:
+            logger.info("%s: unchanged, skipped", result.table)
+        else:
+            logger.info("%s: %s rows in %.2fs", result.table, result.rows, result.seconds)
+    logger.info(
+        "Staging load finished: %s of %s tables reloaded, %s rows in %.2fs wall-clock (runner=%s)",
+        len(changed_tables(results)),
+        len(results),
+        sum(result.rows for result in results),
+        time.perf_counter() - started,
+        runner,
+    )
+    return results
+
+
+def changed_tables(results: Iterable[LoadResult]) -> list[str]:
+    """Staging tables that were actually reloaded."""
+    return [result.table for result in results if not result.skipped]
+
+
+@task
+def empty_warehouse_sources(block_name: str) -> list[str]:
+    """
+    Staging tables feeding the ``dw`` dimensions and facts that are empty.
+
+    An empty table was truncated, recreated or never built, so it has to be built
+    even when none of its files changed; ``build_warehouse`` treats these staging
+    tables as reloaded. The watermarks of empty facts are cleared, so incremental
+    and partition modes fill them completely instead of only past the mark.
+    """
+    targets = ["dw.dim_date", *(dimension.table for dimension in DIMENSION_LOADS), *(fact.table for fact in FACT_LOADS)]
+    with pooled_connector(block_name) as connector:
+        empty = [table for table in targets if not connector.fetch_all(f"SELECT EXISTS (SELECT 1 FROM {table});")[0][0]]
+        empty_facts = [table for table in empty if table.startswith("dw.fact_")]
+        if empty_facts:
+            connector.execute(
+                "DELETE FROM dw.etl_watermark WHERE table_name = ANY(CAST(:tables AS TEXT[]));", {"tables": empty_facts}
+            )
+    if empty:
+        get_run_logger().info("Empty warehouse tables will be built: %s", ", ".join(empty))
+    return staging_sources(empty)
+
+
+@task
+def record_manifests(block_name: str, results: list[LoadResult]) -> None:
+    """
+    Store the fingerprints of the files reloaded by this run in ``staging.load_manifest``.
+
+    Runs once the warehouse and its aggregates are built: until then a reloaded
+    table has no manifest entry, so a run that fails on the way loads the file,
+    and rebuilds everything depending on it, again.
+    """
+    with pooled_connector(block_name) as connector:
+        for result in results:
+            if result.fingerprint is not None:
+                _record_manifest(connector, result.table, result.source, result.fingerprint, result.rows)
+
+
+@task
+def check_staging_profiles(results: list[LoadResult], fail: bool = False) -> dict[str, list[str]]:
+    """
+    Publish the load profiles of the reloaded staging tables and check them against ``STAGING_CHECKS``.
+
+    Returns the issues per table. With ``fail`` any issue raises ``DataQualityError``
+    before the warehouse is built. ``record_manifests`` then never runs, so the next
+    run loads every file reloaded by this one again, even if it did not change.
+    """
+    logger = get_run_logger()
+    profiles = [result.profile for result in results if result.profile is not None]
+    if not profiles:
+        return {}
+    create_table_artifact(
+        key="staging-profile",
+        table=[row for profile in profiles for row in profile.summary()],
+        description="Column profiles of the staging tables reloaded by this run",
+    )
+    issues = {
+        profile.table: table_issues
+        for profile in profiles
+        if (table_issues := profile.issues(**STAGING_CHECKS.get(profile.table, {})))
+    }
+    if not issues:
+        return issues
+    create_markdown_artifact(
+        key="staging-quality-issues",
+        markdown="\n\n".join(
+            f"### {table}\n\n" + "\n".join(f"- {issue}" for issue in table_issues)
+            for table, table_issues in issues.items()
+        ),
+        description="Data quality issues found while loading staging",
+    )
+    for table, table_issues in issues.items():
+        logger.warning("%s: %s", table, "; ".join(table_issues))
+    if fail:
+        raise DataQualityError(f"Data quality issues in {', '.join(issues)}; see the staging-quality-issues artifact")
+    return issues
 
 
 @flow
 def brazilian_ecommerce_dimensional_etl(
-    block_name: str = "my-postgres-connection",
+    block_name: str = BLOCK_NAME,
     data_dir: str = "data/brazilian-e-commerce",
+    load_method: LoadMethod = "copy",
+    staging_runner: StagingRunner = "thread",
+    max_workers: int = 4,
+    dimension_mode: DimensionLoadMode = "rebuild",
+    fact_mode: FactLoadMode = "full",
+    explain_statements: bool = False,
+    dw_parallelism: int = 4,
+    force_reload: bool = False,
+    split_workers: int = 4,
+    datasets: list[str] | None = None,
+    profile_staging: bool = True,
+    fail_on_data_issues: bool = False,
 ) -> None:
-    # create_staging_tables(block_name)
+    create_staging_tables(block_name)
     create_dw_tables(block_name)
+    record_lineage(block_name)
+
+    results = load_staging(
+        block_name,
+        Path(data_dir),
+        load_method=load_method,
+        runner=staging_runner,
+        max_workers=max_workers,
+        skip_unchanged=not force_reload,
+        split_workers=split_workers,
+        datasets=datasets,
+        profile=profile_staging,
+    )
+    check_staging_profiles(results, fail=fail_on_data_issues)
+    changed = None if force_reload and datasets is None else changed_tables(results)
+    if changed != []:
+        index_staging_tables(block_name, changed)
+    if changed is not None:
+        changed = sorted(set(changed) | set(empty_warehouse_sources(block_name)))
 
-    data_path = Path(data_dir)
-    for file_name, table in DATASETS:
-        load_csv_to_table(block_name, data_path / file_name, table)
+    months = build_warehouse(
+        block_name,
+        dimension_mode=dimension_mode,
+        fact_mode=fact_mode,
+        explain=explain_statements,
+        max_parallel=dw_parallelism,
+        changed_tables=changed,
+    )
+    refresh_aggregates(block_name, months, explain=explain_statements, max_parallel=dw_parallelism)
+    record_manifests(block_name, results)
 
-    load_dimensions(block_name)
-    load_facts(block_name)
+
+@flow
+def compare_fact_orders_plans(block_name: str = BLOCK_NAME) -> dict[str, str]:
+    return explain_fact_orders(block_name)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,288 @@
+"""Export the ``dw`` tables as gzip-compressed CSV chunks streamed with COPY ... TO STDOUT."""
+
+from __future__ import annotations
+
+import csv
+import io
+import json
+import os
+import shutil
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Literal
+
+from prefect import flow, get_run_logger, task
+from prefect.artifacts import create_table_artifact
+from prefect.futures import wait
+from prefect.task_runners import ThreadPoolTaskRunner
+from prefect_sqlalchemy import SqlAlchemyConnector
+
+from etl.chunked_export import ChunkedGzipWriter, ChunkFile
+from etl.db_connection import BLOCK_NAME, pooled_connector
+from etl.flows.prefect_brazilian_ecommerce_dimensional import COPY_BUFFER_SIZE, DIMENSION_LOADS, FACT_TABLES
+
+EXPORT_TABLES = ["dw.dim_date", *(dimension.table for dimension in DIMENSION_LOADS), *FACT_TABLES]
+
+# Compressed size at which an export file is closed and the next one started.
+MAX_FILE_BYTES = 128 * 1024 * 1024
+
+ExportParallelism = Literal["table", "range"]
+
+
+@dataclass(frozen=True)
+class ExportPart:
+    """One COPY of an export: a whole table, or one monthly partition of a fact table."""
+
+    table: str
+    relation: str
+    partitioned: bool
+
+    @property
+    def name(self) -> str:
+        return self.relation.split(".")[-1]
+
+    def copy_statement(self) -> str:
+        # COPY cannot read a partitioned table directly, only through a query.
+        source = f"(SELECT * FROM {self.relation})" if self.partitioned else self.relation
+        return f"COPY {source} TO STDOUT WITH (FORMAT CSV)"
+
+
+@dataclass
+class ExportResult:
+    part: ExportPart
+    files: list[ChunkFile]
+    seconds: float
+
+    @property
+    def rows(self) -> int:
+        return sum(chunk.rows for chunk in self.files)
+
+
+def export_parts(connector: SqlAlchemyConnector, tables: list[str], parallel_by: ExportParallelism) -> list[ExportPart]:
+    """
+    The COPYs that export ``tables``, largest first so long ones do not start last.
+
+    With ``parallel_by="range"`` a partitioned fact table is exported one
+    ``purchase_date_key`` (for reviews ``review_creation_date_key``) month at a
+    time, i.e. one part per partition, including the DEFAULT one.
+    """
+    rows = connector.fetch_all(
+        """
+        SELECT tables.table_name,
+               relation.relkind = 'p',
+               format('%I.%I', namespace.nspname, relation.relname),
+               CASE relation.relkind
+                   WHEN 'p' THEN (
+                       SELECT COALESCE(sum(pg_relation_size(inhrelid)), 0) FROM pg_inherits
+                       WHERE inhparent = relation.oid
+                   )
+                   ELSE pg_relation_size(relation.oid)
+               END AS size
+        FROM unnest(CAST(:tables AS TEXT[])) AS tables (table_name)
+        JOIN pg_class parent ON parent.oid = to_regclass(tables.table_name)
+        LEFT JOIN pg_inherits ON :by_range AND pg_inherits.inhparent = parent.oid
+        JOIN pg_class relation ON relation.oid = COALESCE(pg_inherits.inhrelid, parent.oid)
+        JOIN pg_namespace namespace ON namespace.oid = relation.relnamespace
+        ORDER BY size DESC, 3;
+        """,
+        parameters={"tables": tables, "by_range": parallel_by == "range"},
+    )
+    missing = set(tables) - {row[0] for row in rows}
+    if missing:
+        raise ValueError(f"Unknown tables: {', '.join(sorted(missing))}")
+    return [
+        ExportPart(table=table, relation=relation, partitioned=partitioned)
+        for table, partitioned, relation, _ in rows
+    ]
+
+
+def _header(cursor, relation: str) -> bytes:
+    cursor.execute(f"SELECT * FROM {relation} LIMIT 0;")
+    line = io.StringIO()
+    csv.writer(line).writerow([column.name for column in cursor.description])
+    return line.getvalue().encode()
+
+
+@task
+def export_part(
+    block_name: str,
+    part: ExportPart,
+    output_dir: Path,
+    version: str,
+    snapshot: str | None = None,
+    max_file_bytes: int = MAX_FILE_BYTES,
+    compresslevel: int = 6,
+) -> ExportResult:
+    """
+    Stream ``part`` with COPY TO STDOUT into ``output_dir/<table>/<version>/<part>-NNNNN.csv.gz``.
+
+    Given the ``snapshot`` exported by ``export_dw``, the COPY reads exactly the data
+    the other parts see, however long the export runs.
+    """
+    started = time.perf_counter()
+    directory = output_dir / part.table / version
+    directory.mkdir(parents=True, exist_ok=True)
+    with pooled_connector(block_name) as connector:
+        raw_connection = connector.get_engine().raw_connection()
+        try:
+            # End whatever the pool's pre-ping started; SET TRANSACTION has to come first.
+            raw_connection.rollback()
+            with raw_connection.cursor() as cursor:
+                cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY;")
+                if snapshot:
+                    cursor.execute("SET TRANSACTION SNAPSHOT %s;", (snapshot,))
+                writer = ChunkedGzipWriter(
+                    directory, part.name, _header(cursor, part.relation), max_file_bytes, compresslevel
+                )
+                try:
+                    cursor.copy_expert(part.copy_statement(), writer, size=COPY_BUFFER_SIZE)
+                    files = writer.close()
+                except Exception:
+                    writer.abort()
+                    raise
+            raw_connection.rollback()
+        finally:
+            raw_connection.close()
+    result = ExportResult(part=part, files=files, seconds=time.perf_counter() - started)
+    get_run_logger().info(
+        "Exported %s rows of %s into %s files in %.2fs", result.rows, part.relation, len(files), result.seconds
+    )
+    return result
+
+
+def write_manifest(output_dir: Path, results: list[ExportResult], exported_at: datetime) -> Path:
+    """
+    Write ``manifest.json``: per table its export time, row count and files, paths relative to ``output_dir``.
+
+    Tables exported by ``results`` replace their entries in an existing manifest;
+    the other entries are kept. The manifest is replaced atomically, so readers
+    never see a partial one.
+    """
+    path = output_dir / "manifest.json"
+    tables: dict[str, dict] = {}
+    if path.exists():
+        tables = {entry["table"]: entry for entry in json.loads(path.read_text())["tables"]}
+    exported: dict[str, dict] = {}
+    for result in sorted(results, key=lambda result: result.part.relation):
+        entry = exported.setdefault(
+            result.part.table,
+            {"table": result.part.table, "exported_at": exported_at.isoformat(), "rows": 0, "files": []},
+        )
+        entry["rows"] += result.rows
+        entry["files"].extend(
+            {"path": str(chunk.path.relative_to(output_dir)), "rows": chunk.rows, "bytes": chunk.bytes}
+            for chunk in result.files
+        )
+    tables.update(exported)
+    manifest = {
+        "exported_at": exported_at.isoformat(),
+        "format": "csv+gzip",
+        "tables": [tables[table] for table in sorted(tables)],
+    }
+    staged = path.with_suffix(".json.tmp")
+    staged.write_text(json.dumps(manifest, indent=2))
+    os.replace(staged, path)
+    return path
+
+
+@flow
+def export_dw(
+    block_name: str = BLOCK_NAME,
+    output_dir: str = "export/dw",
+    tables: list[str] | None = None,
+    parallel_by: ExportParallelism = "range",
+    max_workers: int = 4,
+    max_file_bytes: int = MAX_FILE_BYTES,
+    compresslevel: int = 6,
+) -> str:
+    """
+    Export ``tables`` (by default every dimension and fact) to ``output_dir``.
+
+    Up to ``max_workers`` COPYs run at once, one per table or, with
+    ``parallel_by="range"``, one per monthly partition of the facts. All of them
+    read one snapshot, taken when the export starts. Each table is written to a
+    new ``<table>/<version>`` directory and ``manifest.json`` is switched to it in
+    one step, so a failed export leaves the previous files and manifest as they
+    were; the previous files are removed once the manifest lists the new ones.
+    Returns the manifest path.
+    """
+    logger = get_run_logger()
+    started = time.perf_counter()
+    output = Path(output_dir)
+    tables = tables or EXPORT_TABLES
+    with pooled_connector(block_name) as connector:
+        raw_connection = connector.get_engine().raw_connection()
+        try:
+            # The exporting transaction has to stay open until every part has imported its snapshot.
+            raw_connection.rollback()
+            with raw_connection.cursor() as cursor:
+                cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY;")
+                cursor.execute("SELECT pg_export_snapshot(), now();")
+                snapshot, exported_at = cursor.fetchone()
+            parts = export_parts(connector, tables, parallel_by)
+            exported_at = exported_at.astimezone(timezone.utc)
+            version = exported_at.strftime("%Y%m%dT%H%M%S%fZ")
+            try:
+                with ThreadPoolTaskRunner(max_workers=max_workers) as task_runner:
+                    futures = [
+                        task_runner.submit(
+                            export_part,
+                            parameters={
+                                "block_name": block_name,
+                                "part": part,
+                                "output_dir": output,
+                                "version": version,
+                                "snapshot": snapshot,
+                                "max_file_bytes": max_file_bytes,
+                                "compresslevel": compresslevel,
+                            },
+                        )
+                        for part in parts
+                    ]
+                    wait(futures)
+                    results = [future.result() for future in futures]
+            except Exception:
+                for table in tables:
+                    shutil.rmtree(output / table / version, ignore_errors=True)
+                raise
+            raw_connection.rollback()
+        finally:
+            raw_connection.close()
+
+    manifest = write_manifest(output, results, exported_at)
+    for table in tables:
+        for previous in (output / table).iterdir():
+            if previous.is_dir() and previous.name != version:
+                shutil.rmtree(previous)
+            elif previous.is_file():
+                # Files written directly into the table directory by earlier versions of the export.
+                previous.unlink()
+    create_table_artifact(
+        key="dw-export",
+        table=[
+            {
+                "table": result.part.relation,
+                "rows": result.rows,
+                "files": len(result.files),
+                "bytes": sum(chunk.bytes for chunk in result.files),
+                "seconds": round(result.seconds, 2),
+            }
+            for result in sorted(results, key=lambda result: result.part.relation)
+        ],
+        description=f"Files written by export_dw to {output}",
+    )
+    logger.info(
+        "Exported %s rows of %s tables in %s parts in %.2fs; manifest at %s",
+        sum(result.rows for result in results),
+        len(tables),
+        len(parts),
+        time.perf_counter() - started,
+        manifest,
+    )
+    return str(manifest)
+
+
+if __name__ == "__main__":
+    export_dw()
@@ -1,9 +1,20 @@
+import csv
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Iterator, Literal, Optional
+
 from prefect import flow, task
 from prefect_sqlalchemy import SqlAlchemyConnector
+from sqlalchemy import text
 
-def update_table_data(connector, table_name: str):
-    delete_query = f"DELETE FROM {table_name};"
-    insert_query = f"""
+from etl.db_connection import pooled_connector
+from etl.table_swap import swap_in
+
+# A sink receives the column names and one batch of rows at a time.
+Sink = Callable[[list[str], list[tuple]], None]
+
+def _insert_posts_users_query(table_name: str) -> str:
+    return f"""
     INSERT INTO {table_name} (
     post_id,
     title,
@@ -16,8 +27,48 @@ def update_table_data(connector, table_name: str):
     SELECT posts.id as post_id,title, content, user_id, username, password, email FROM posts
     LEFT JOIN users ON users.id = posts.user_id;
     """
+
+
+def update_table_data(connector, table_name: str):
+    delete_query = f"DELETE FROM {table_name};"
     connector.execute(delete_query)
-    connector.execute(insert_query)
+    connector.execute(_insert_posts_users_query(table_name))
+
+
+def swap_table_data(connector, table_name: str, unlogged: bool = False):
+    """
+    Rebuild ``table_name`` in a shadow table and swap it in with renames.
+
+    The shadow copies the live table's columns, defaults and indexes. With
+    ``unlogged`` it is built UNLOGGED and switched to LOGGED before the swap. That
+    switch rewrites the table, and unless the server runs with ``wal_level=minimal``
+    it writes the whole table to WAL too, so it only pays off with a minimal WAL level.
+    Readers keep using the old table until the rename transaction commits, and the
+    old table is dropped as a whole instead of being emptied row by row. Views,
+    grants and the comment on the table carry over, see ``swap_in``.
+    """
+    shadow = f"{table_name}_shadow"
+    connector.execute(f"DROP TABLE IF EXISTS {shadow};")
+    connector.execute(
+        f"CREATE {'UNLOGGED ' if unlogged else ''}TABLE {shadow} (LIKE {table_name} INCLUDING ALL);"
+    )
+    connector.execute(_insert_posts_users_query(shadow))
+    if unlogged:
+        connector.execute(f"ALTER TABLE {shadow} SET LOGGED;")
+    connector.execute(f"ANALYZE {shadow};")
+
+    with connector.get_connection(begin=True) as connection:
+        # Give up instead of queueing every new reader behind a long-running query.
+        connection.execute(text("SET LOCAL lock_timeout = '5s';"))
+        # The copied post_id default still uses the live table's sequence; keep it
+        # from being dropped together with the retired table.
+        sequence = connection.execute(
+            text("SELECT pg_get_serial_sequence(:table_name, 'post_id');"),
+            {"table_name": table_name},
+        ).scalar()
+        if sequence:
+            connection.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY {shadow}.post_id;"))
+        swap_in(connection, table_name, shadow)
 
 
 def create_table(connector, table_name: str):
@@ -35,23 +86,118 @@ def create_table(connector, table_name: str):
         connector.execute(create_query)
 
 @flow
-def update_posts_users_table(block_name: str, table_name: str = "posts_users"):
-    with SqlAlchemyConnector.load(block_name) as connector:
+def update_posts_users_table(
+    block_name: str,
+    table_name: str = "posts_users",
+    mode: Literal["swap", "delete"] = "swap",
+):
+    with pooled_connector(block_name) as connector:
         create_table(connector, table_name)
-        update_table_data(connector, table_name)
+        if mode == "swap":
+            swap_table_data(connector, table_name)
+        else:
+            update_table_data(connector, table_name)
+
+
+def stream_query(
+    connector: SqlAlchemyConnector, query: str, fetch_size: int = 1000
+) -> Iterator[tuple[list[str], list[tuple]]]:
+    """
+    Yield ``(columns, rows)`` batches of at most ``fetch_size`` rows.
+
+    Uses a server-side (named) cursor, so PostgreSQL keeps the result set and only
+    one batch is held in memory at a time. An empty result yields one batch without
+    rows, so sinks still learn the columns.
+    """
+    raw_connection = connector.get_engine().raw_connection()
+    try:
+        with raw_connection.cursor(name="stream_query") as cursor:
+            cursor.itersize = fetch_size
+            cursor.execute(query)
+            columns: list[str] = []
+            empty = True
+            while True:
+                rows = cursor.fetchmany(fetch_size)
+                if not columns and cursor.description:
+                    columns = [column.name for column in cursor.description]
+                if not rows:
+                    if empty:
+                        yield columns, []
+                    break
+                empty = False
+                yield columns, rows
+        raw_connection.commit()
+    finally:
+        raw_connection.close()
+
+
+@contextmanager
+def csv_sink(path: Path) -> Iterator[Sink]:
+    """Write batches to a CSV file, with a header row taken from the first batch."""
+    with path.open("w", newline="", encoding="utf-8") as handle:
+        writer = csv.writer(handle)
+        header_written = False
+
+        def write(columns: list[str], rows: list[tuple]) -> None:
+            nonlocal header_written
+            if not header_written:
+                writer.writerow(columns)
+                header_written = True
+            writer.writerows(rows)
+
+        yield write
+
+
+def table_sink(connector: SqlAlchemyConnector, table_name: str) -> Sink:
+    """Insert batches into an existing table with matching column names."""
+
+    def write(columns: list[str], rows: list[tuple]) -> None:
+        if not rows:
+            return
+        column_list = ", ".join(columns)
+        values_list = ", ".join(f":{column}" for column in columns)
+        connector.execute_many(
+            f"INSERT INTO {table_name} ({column_list}) VALUES ({values_list});",
+            [dict(zip(columns, row)) for row in rows],
+        )
+
+    return write
+
+
+def print_sink(columns: list[str], rows: list[tuple]) -> None:
+    print(rows)
+
+
+def drain(batches: Iterator[tuple[list[str], list[tuple]]], sink: Sink) -> int:
+    """Feed every batch to ``sink`` and return the number of rows written."""
+    total = 0
+    for columns, rows in batches:
+        sink(columns, rows)
+        total += len(rows)
+    return total
 
 
 @flow
-def fetch_data(block_name: str) -> list:
-    all_rows = []
-    with SqlAlchemyConnector.load(block_name) as connector:
-        while True:
-            new_rows = connector.fetch_many("SELECT * FROM users;", size=2)
-            if len(new_rows) == 0:
-                break
-            all_rows.append(new_rows)
-    print(all_rows)
-    return all_rows
+def fetch_data(
+    block_name: str,
+    query: str = "SELECT * FROM users;",
+    fetch_size: int = 1000,
+    output_path: Optional[str] = None,
+    target_table: Optional[str] = None,
+) -> int:
+    """
+    Stream the result of ``query`` to a CSV file, another table, or stdout.
+
+    Returns the number of rows streamed; the rows themselves are never collected.
+    """
+    with pooled_connector(block_name) as connector:
+        batches = stream_query(connector, query, fetch_size=fetch_size)
+        if output_path:
+            with csv_sink(Path(output_path)) as sink:
+                return drain(batches, sink)
+        if target_table:
+            return drain(batches, table_sink(connector, target_table))
+        return drain(batches, print_sink)
 
 if __name__ == "__main__":
     # fetch_data("my-postgres-connection")
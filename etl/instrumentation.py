@@ -0,0 +1,140 @@
+"""Per-statement timing for the SQL run inside ETL tasks."""
+
+from __future__ import annotations
+
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from opentelemetry import metrics
+from prefect.artifacts import create_markdown_artifact, create_table_artifact
+from sqlalchemy import Connection, text
+
+# Instruments are created on the global meter provider; until configure_metrics()
+# installs one they are no-ops.
+_meter = metrics.get_meter("etl")
+statement_duration = _meter.create_histogram(
+    "etl_statement_duration",
+    unit="s",
+    description="Wall-clock time of one SQL statement in an ETL task",
+)
+statement_rows = _meter.create_counter(
+    "etl_statement_rows",
+    description="Rows affected by SQL statements in ETL tasks",
+)
+
+_metrics_configured = False
+# Scheduler threads build connectors concurrently; only one of them may start the server.
+_metrics_lock = threading.Lock()
+
+# Only these statements can be wrapped in EXPLAIN, and only one at a time.
+_EXPLAINABLE = re.compile(r"^\s*(SELECT|INSERT|UPDATE|DELETE|MERGE|WITH)\b", re.IGNORECASE)
+
+
+def _explainable(operation: str) -> bool:
+    return bool(_EXPLAINABLE.match(operation)) and ";" not in operation.strip().rstrip(";")
+
+
+def configure_metrics(port: Optional[int] = None) -> None:
+    """
+    Export the ETL metrics through a Prometheus endpoint on ``port``.
+
+    Falls back to ``ETL_METRICS_PORT``; does nothing when neither is set. Safe to
+    call from every task and thread, the provider is only installed once per process.
+    """
+    global _metrics_configured
+    port = port or int(os.environ.get("ETL_METRICS_PORT", "0"))
+    if _metrics_configured or not port:
+        return
+
+    from opentelemetry.exporter.prometheus import PrometheusMetricReader
+    from opentelemetry.sdk.metrics import MeterProvider
+    from prometheus_client import start_http_server
+
+    with _metrics_lock:
+        if _metrics_configured:
+            return
+        start_http_server(port)
+        metrics.set_meter_provider(MeterProvider(metric_readers=[PrometheusMetricReader()]))
+        _metrics_configured = True
+
+
+@dataclass
+class StatementTiming:
+    label: str
+    seconds: float
+    rows: Optional[int]
+    plan: Optional[str] = None
+
+
+class InstrumentedConnection:
+    """
+    Wrap a connection so every ``execute`` is labelled, timed and counted.
+
+    All statements run on the wrapped connection, so they share its session and,
+    when it was opened with ``begin=True``, its transaction. With ``explain=True``
+    single DML statements are run as ``EXPLAIN (ANALYZE, BUFFERS)`` instead, which
+    executes them once and keeps the plan; their row count is then read from the
+    plan rather than the cursor.
+    """
+
+    def __init__(self, connection: Connection, task_name: str, explain: bool = False):
+        self.connection = connection
+        self.task_name = task_name
+        self.explain = explain
+        self.timings: list[StatementTiming] = []
+        configure_metrics()
+
+    def execute(self, label: str, operation: str, parameters: Optional[dict[str, Any]] = None):
+        plan = None
+        started = time.perf_counter()
+        if self.explain and _explainable(operation):
+            result = self.connection.execute(
+                text(f"EXPLAIN (ANALYZE, BUFFERS) {operation.strip().rstrip(';')}"), parameters
+            )
+            plan = "\n".join(row[0] for row in result)
+            rows = _plan_rows(plan)
+        else:
+            result = self.connection.execute(text(operation), parameters)
+            rows = result.rowcount if result.rowcount >= 0 else None
+        seconds = time.perf_counter() - started
+
+        self.timings.append(StatementTiming(label=label, seconds=seconds, rows=rows, plan=plan))
+        attributes = {"task": self.task_name, "statement": label}
+        statement_duration.record(seconds, attributes)
+        if rows:
+            statement_rows.add(rows, attributes)
+        return result
+
+
+def publish_timings(task_name: str, timings: list[StatementTiming]) -> None:
+    """Publish statement timings (and any plans) as Prefect artifacts."""
+    key = re.sub(r"[^a-z0-9-]+", "-", task_name.lower()).strip("-")
+    create_table_artifact(
+        key=f"{key}-statements",
+        table=[
+            {"statement": timing.label, "seconds": round(timing.seconds, 3), "rows": timing.rows}
+            for timing in timings
+        ],
+        description=f"Per-statement timings of {task_name}",
+    )
+    plans = [timing for timing in timings if timing.plan]
+    if plans:
+        create_markdown_artifact(
+            key=f"{key}-plans",
+            markdown="\n\n".join(f"### {timing.label}\n\n```\n{timing.plan}\n```" for timing in plans),
+            description=f"EXPLAIN (ANALYZE, BUFFERS) output of {task_name}",
+        )
+
+
+def _plan_rows(plan: str) -> Optional[int]:
+    """Rows produced under the top ModifyTable node, or by the top node of a SELECT."""
+    actual_rows = re.findall(r"actual time=\S+ rows=(\d+)", plan)
+    if not actual_rows:
+        return None
+    if re.match(r"\s*(Insert|Update|Delete|Merge) on ", plan):
+        return int(actual_rows[1]) if len(actual_rows) > 1 else int(actual_rows[0])
+    return int(actual_rows[0])
@@ -0,0 +1,77 @@
+"""Table and column lineage of the warehouse SQL, as parsed by ``parse_sql.script_lineage``."""
+
+from __future__ import annotations
+
+from typing import Iterable
+
+import networkx as nx
+
+from parse_sql import ColumnRef, StatementLineage, script_lineage
+
+
+class LineageGraph:
+    """
+    Which tables and columns each target is computed from.
+
+    ``tables`` is a graph with an edge from every table a statement reads to the
+    table it writes; ``columns`` maps ``(table, column)`` to the columns its value
+    is computed from, one statement deep.
+    """
+
+    def __init__(self, statements: Iterable[StatementLineage] = ()):
+        self.tables = nx.DiGraph()
+        self.columns: dict[ColumnRef, set[ColumnRef]] = {}
+        for statement in statements:
+            self.add(statement)
+
+    @classmethod
+    def from_sql(cls, scripts: Iterable[str]) -> LineageGraph:
+        """Lineage of every statement in ``scripts``; each may hold several statements."""
+        return cls(lineage for script in scripts for lineage in script_lineage(script))
+
+    def add(self, statement: StatementLineage) -> None:
+        self.tables.add_node(statement.target)
+        for source in statement.sources:
+            self.tables.add_edge(source, statement.target)
+        for column, sources in statement.columns.items():
+            self.columns.setdefault((statement.target, column), set()).update(sources)
+
+    def downstream(self, tables: Iterable[str]) -> set[str]:
+        """Every table computed, directly or through other targets, from ``tables``."""
+        affected: set[str] = set()
+        for table in tables:
+            if table in self.tables:
+                affected |= nx.descendants(self.tables, table)
+        return affected
+
+    def reads(self, table: str) -> set[str]:
+        """The tables ``table`` is computed from directly, without going through other targets."""
+        return set(self.tables.predecessors(table)) if table in self.tables else set()
+
+    def upstream(self, table: str) -> set[str]:
+        return nx.ancestors(self.tables, table) if table in self.tables else set()
+
+    def rows(self) -> list[dict[str, str | None]]:
+        """
+        One row per column edge, plus a row without columns for tables a target only
+        joins or filters on, for ``dw.column_lineage``.
+        """
+        rows: list[dict[str, str | None]] = []
+        feeding: set[tuple[str, str]] = set()
+        for (target, column), sources in sorted(self.columns.items()):
+            for source_table, source_column in sorted(sources):
+                rows.append(
+                    {
+                        "target_table": target,
+                        "target_column": column,
+                        "source_table": source_table,
+                        "source_column": source_column,
+                    }
+                )
+                feeding.add((source_table, target))
+        for source, target in sorted(self.tables.edges):
+            if (source, target) not in feeding:
+                rows.append(
+                    {"target_table": target, "target_column": None, "source_table": source, "source_column": None}
+                )
+        return rows
@@ -0,0 +1,288 @@
+"""Single-pass column profiles of CSV files, computed while they stream into staging."""
+
+from __future__ import annotations
+
+import codecs
+import csv
+import io
+import math
+import os
+from collections import Counter
+from hashlib import blake2b
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable, Protocol
+
+
+# Key columns keep their values, for an exact duplicate check, up to this many distinct
+# ones per table (around 10 MB for Olist-sized keys); past that only the sketch is
+# left. Every Olist key file stays below it.
+EXACT_KEY_LIMIT = int(os.environ.get("ETL_EXACT_KEY_LIMIT", "100000"))
+
+
+class DataQualityError(Exception):
+    """Raised when a staging profile breaks the checks configured for its table."""
+
+
+class HyperLogLog:
+    """
+    Approximate distinct count in ``2 ** precision`` one-byte registers.
+
+    Values are hashed with a 64-bit BLAKE2b rather than Python's ``hash``, which is
+    salted per process, so sketches built by different worker processes can be
+    merged.
+    """
+
+    def __init__(self, precision: int = 14):
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    @property
+    def relative_error(self) -> float:
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def update(self, values: Iterable[str]) -> None:
+        registers = self.registers
+        shift = 64 - self.precision
+        low_bits = (1 << shift) - 1
+        for value in values:
+            hashed = int.from_bytes(blake2b(value.encode(), digest_size=8).digest(), "little")
+            index = hashed >> shift
+            rank = shift - (hashed & low_bits).bit_length() + 1
+            if rank > registers[index]:
+                registers[index] = rank
+
+    def merge(self, other: HyperLogLog) -> None:
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def estimate(self) -> int:
+        size = len(self.registers)
+        harmonic = sum(count * 2.0 ** -rank for rank, count in Counter(self.registers).items())
+        estimate = 0.7213 / (1 + 1.079 / size) * size * size / harmonic
+        empty = self.registers.count(0)
+        if estimate <= 2.5 * size and empty:
+            # Linear counting is far more accurate while most registers are still empty.
+            estimate = size * math.log(size / empty)
+        return round(estimate)
+
+
+@dataclass
+class ColumnProfile:
+    name: str
+    parser: Callable[[str], Any] = str
+    nulls: int = 0
+    parse_failures: int = 0
+    minimum: Any = None
+    maximum: Any = None
+    distinct: HyperLogLog = field(default_factory=HyperLogLog)
+    # The distinct values themselves, for key columns until there are more than value_limit.
+    values: set[str] | None = None
+    value_limit: int = 0
+
+    def distinct_count(self) -> int:
+        return len(self.values) if self.values is not None else self.distinct.estimate()
+
+    def add(self, values: tuple[str, ...]) -> None:
+        """Profile one batch of raw CSV fields of this column; empty fields count as NULL."""
+        present = list(filter(None, values))
+        self.nulls += len(values) - len(present)
+        if not present:
+            return
+        self.distinct.update(set(present))
+        if self.values is not None:
+            self.values.update(present)
+            if len(self.values) > self.value_limit:
+                self.values = None
+        if self.parser is str:
+            parsed = present
+        else:
+            try:
+                parsed = list(map(self.parser, present))
+            except (TypeError, ValueError, ArithmeticError):
+                parsed = []
+                for value in present:
+                    try:
+                        parsed.append(self.parser(value))
+                    except (TypeError, ValueError, ArithmeticError):
+                        self.parse_failures += 1
+            if not parsed:
+                return
+        low, high = min(parsed), max(parsed)
+        if self.minimum is None or low < self.minimum:
+            self.minimum = low
+        if self.maximum is None or high > self.maximum:
+            self.maximum = high
+
+    def merge(self, other: ColumnProfile) -> None:
+        self.nulls += other.nulls
+        self.parse_failures += other.parse_failures
+        self.distinct.merge(other.distinct)
+        if self.values is not None and other.values is not None:
+            self.values |= other.values
+            if len(self.values) > self.value_limit:
+                self.values = None
+        else:
+            self.values = None
+        for value in (other.minimum, other.maximum):
+            if value is not None:
+                self.minimum = value if self.minimum is None else min(self.minimum, value)
+                self.maximum = value if self.maximum is None else max(self.maximum, value)
+
+
+@dataclass
+class TableProfile:
+    """
+    Per-column NULL counts, approximate distinct counts, min/max and parse failures.
+
+    Memory stays bounded by the number of columns: rows are folded in batch by
+    batch and never kept. ``parsers`` maps typed columns to the function that
+    parses them; values it rejects are counted instead of compared. ``keys`` get a
+    larger sketch (256 KiB instead of 16 KiB), precise enough to notice a few
+    duplicates per thousand rows, and keep their distinct values, so a single
+    duplicate is found, up to ``exact_key_limit`` (``EXACT_KEY_LIMIT`` by default)
+    split evenly between them. Profiles of parts of one file that are merged later
+    should divide the limit between them too.
+    """
+
+    table: str
+    columns: dict[str, ColumnProfile]
+    rows: int = 0
+    malformed_rows: int = 0
+
+    @classmethod
+    def for_header(
+        cls,
+        table: str,
+        header: list[str],
+        parsers: dict[str, Callable[[str], Any]] | None = None,
+        keys: Iterable[str] = (),
+        exact_key_limit: int | None = None,
+    ) -> TableProfile:
+        parsers = parsers or {}
+        keys = set(keys)
+        exact_key_limit = EXACT_KEY_LIMIT if exact_key_limit is None else exact_key_limit
+        value_limit = exact_key_limit // max(1, len(keys))
+        return cls(
+            table,
+            {
+                column: ColumnProfile(
+                    column,
+                    parsers.get(column, str),
+                    distinct=HyperLogLog(18 if column in keys else 14),
+                    values=set() if column in keys else None,
+                    value_limit=value_limit,
+                )
+                for column in header
+            },
+        )
+
+    def add_rows(self, rows: list[list[str]]) -> None:
+        width = len(self.columns)
+        complete = [row for row in rows if len(row) == width]
+        self.rows += len(rows)
+        self.malformed_rows += len(rows) - len(complete)
+        if complete:
+            for profile, values in zip(self.columns.values(), zip(*complete)):
+                profile.add(values)
+
+    def merge(self, other: TableProfile) -> None:
+        self.rows += other.rows
+        self.malformed_rows += other.malformed_rows
+        for name, profile in other.columns.items():
+            self.columns[name].merge(profile)
+
+    def issues(self, required: Iterable[str] = (), unique: Iterable[str] = ()) -> list[str]:
+        """
+        Problems found in the profile, as messages.
+
+        Every parse failure and malformed row is an issue; so are NULLs in a
+        ``required`` column, and duplicates in a ``unique`` column: counted exactly
+        while it keeps its values, otherwise flagged once the distinct estimate
+        falls more than three standard errors below the non-NULL count.
+        """
+        issues = []
+        if self.malformed_rows:
+            issues.append(f"{self.malformed_rows} rows do not have {len(self.columns)} fields")
+        for column in required:
+            if self.columns[column].nulls:
+                issues.append(f"{self.columns[column].nulls} rows have an empty {column}")
+        for column in unique:
+            profile = self.columns[column]
+            present = self.rows - self.malformed_rows - profile.nulls
+            if profile.values is not None:
+                if len(profile.values) < present:
+                    issues.append(f"{column} has {present - len(profile.values)} duplicates in {present} rows")
+                continue
+            distinct = profile.distinct.estimate()
+            if distinct < present * (1 - 3 * profile.distinct.relative_error):
+                issues.append(f"{column} looks duplicated: about {distinct} distinct values in {present} rows")
+        for profile in self.columns.values():
+            if profile.parse_failures:
+                issues.append(f"{profile.parse_failures} values of {profile.name} could not be parsed")
+        return issues
+
+    def summary(self) -> list[dict[str, Any]]:
+        """One row per column, for a Prefect table artifact."""
+        return [
+            {
+                "table": self.table,
+                "column": profile.name,
+                "rows": self.rows,
+                "nulls": profile.nulls,
+                "distinct (approx.)": profile.distinct_count(),
+                "min": None if profile.minimum is None else str(profile.minimum),
+                "max": None if profile.maximum is None else str(profile.maximum),
+                "parse failures": profile.parse_failures,
+            }
+            for profile in self.columns.values()
+        ]
+
+
+class _Readable(Protocol):
+    def read(self, size: int = -1) -> str | bytes: ...
+
+
+class ProfilingReader:
+    """
+    File-like wrapper that profiles the CSV records read through it.
+
+    Meant for ``cursor.copy_expert``: each chunk COPY pulls is cut after its last
+    complete record, and the records are parsed with ``csv`` and added to
+    ``profile``; the rest waits for the next chunk. The wrapped reader must be
+    positioned after the header. Bytes are decoded as UTF-8.
+    """
+
+    def __init__(self, reader: _Readable, profile: TableProfile):
+        self.reader = reader
+        self.profile = profile
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._pending = ""
+
+    def read(self, size: int = -1) -> str | bytes:
+        chunk = self.reader.read(size)
+        text = self._decoder.decode(chunk) if isinstance(chunk, bytes) else chunk
+        if not chunk:
+            # End of input: whatever is left is the last record, with or without a newline.
+            self._profile(self._pending + self._decoder.decode(b"", final=True))
+            self._pending = ""
+        else:
+            self._pending += text
+            end = self._record_end(self._pending)
+            self._profile(self._pending[:end])
+            self._pending = self._pending[end:]
+        return chunk
+
+    @staticmethod
+    def _record_end(text: str) -> int:
+        """Offset after the last newline in ``text`` that is outside a quoted field."""
+        end = text.rfind("\n") + 1
+        quotes = text.count('"', 0, end)
+        while end and quotes % 2:
+            previous = text.rfind("\n", 0, end - 1) + 1
+            quotes -= text.count('"', previous, end)
+            end = previous
+        return end
+
+    def _profile(self, text: str) -> None:
+        if text:
+            # COPY skips blank lines too.
+            self.profile.add_rows(list(filter(None, csv.reader(io.StringIO(text)))))
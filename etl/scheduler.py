@@ -0,0 +1,106 @@
+"""Run SQL statements declared as a dependency graph on parallel connections."""
+
+from __future__ import annotations
+
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Iterable
+
+import networkx as nx
+
+from etl.db_connection import pooled_connector
+from etl.instrumentation import InstrumentedConnection, StatementTiming, publish_timings
+
+
+@dataclass(frozen=True)
+class SqlNode:
+    """
+    A group of statements that must run in order in one transaction.
+
+    ``depends_on`` names nodes that have to finish first. Names that are not part
+    of the graph being run are treated as already satisfied, so a graph can be
+    split across tasks that run one after another.
+    """
+
+    name: str
+    statements: tuple[tuple[str, str], ...]
+    depends_on: tuple[str, ...] = ()
+
+
+def build_graph(nodes: Iterable[SqlNode]) -> nx.DiGraph:
+    graph = nx.DiGraph()
+    nodes = list(nodes)
+    for node in nodes:
+        if node.name in graph:
+            raise ValueError(f"Duplicate SQL node: {node.name}")
+        graph.add_node(node.name, node=node)
+    for node in nodes:
+        for dependency in node.depends_on:
+            if dependency in graph:
+                graph.add_edge(dependency, node.name)
+    if not nx.is_directed_acyclic_graph(graph):
+        raise ValueError(f"SQL graph has a cycle: {nx.find_cycle(graph)}")
+    return graph
+
+
+def _run_node(
+    block_name: str, node: SqlNode, task_name: str, explain: bool, timings: list[StatementTiming]
+) -> None:
+    """Run ``node`` on one pooled connection; ``timings`` gets the statements that finished, even on failure."""
+    with pooled_connector(block_name) as connector, connector.get_connection(begin=True) as connection:
+        db = InstrumentedConnection(connection, task_name, explain=explain)
+        try:
+            for label, statement in node.statements:
+                db.execute(label, statement)
+        finally:
+            timings.extend(db.timings)
+
+
+def run_sql_graph(
+    block_name: str,
+    nodes: Iterable[SqlNode],
+    task_name: str,
+    max_parallel: int = 1,
+    explain: bool = False,
+) -> list[StatementTiming]:
+    """
+    Run ``nodes`` in dependency order, up to ``max_parallel`` at a time.
+
+    Each running node holds its own pooled connection and commits once all its
+    statements succeeded. A node is started as soon as everything it depends on
+    has finished; if one fails, no further nodes are started, nodes already
+    running are allowed to finish and the first error is raised. Timings of every
+    statement that finished are published under ``task_name`` either way.
+    """
+    graph = build_graph(nodes)
+    waiting_on = {name: graph.in_degree(name) for name in graph}
+    ready = [name for name, count in waiting_on.items() if count == 0]
+    timings: list[StatementTiming] = []
+    error: BaseException | None = None
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, max_parallel)) as executor:
+            running: dict[Future, tuple[str, list[StatementTiming]]] = {}
+            while (ready and error is None) or running:
+                while ready and error is None and len(running) < max(1, max_parallel):
+                    name = ready.pop(0)
+                    node_timings: list[StatementTiming] = []
+                    node = graph.nodes[name]["node"]
+                    future = executor.submit(_run_node, block_name, node, task_name, explain, node_timings)
+                    running[future] = name, node_timings
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name, node_timings = running.pop(future)
+                    timings.extend(node_timings)
+                    if future.exception() is not None:
+                        error = error or future.exception()
+                        continue
+                    for successor in graph.successors(name):
+                        waiting_on[successor] -= 1
+                        if waiting_on[successor] == 0:
+                            ready.append(successor)
+        if error is not None:
+            raise error
+    finally:
+        publish_timings(task_name, timings)
+    return timings
@@ -0,0 +1,88 @@
+"""Open staging source files that may be gzip, bz2 or xz compressed, or members of a zip archive."""
+
+from __future__ import annotations
+
+import bz2
+import gzip
+import io
+import lzma
+import time
+import zipfile
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Callable, Iterator, TextIO
+
+# Decompressing readers by file suffix; each wraps an open binary file.
+DECOMPRESSORS: dict[str, Callable[[BinaryIO], BinaryIO]] = {
+    ".gz": lambda raw: gzip.GzipFile(fileobj=raw, mode="rb"),
+    ".bz2": lambda raw: bz2.BZ2File(raw, mode="rb"),
+    ".xz": lambda raw: lzma.LZMAFile(raw, mode="rb"),
+}
+
+# Compressed input is read from disk, and decompressed, in chunks of this size.
+READ_BUFFER_SIZE = 1024 * 1024
+
+
+@dataclass(frozen=True)
+class SourceFile:
+    """
+    A CSV file on disk, compressed or not, or ``member`` of the zip archive at ``path``.
+
+    ``SourceFile.at(data_dir / "olist.zip" / "olist_orders_dataset.csv")`` names a
+    member, so a ``DATASETS`` entry or the data directory itself can point into an
+    archive.
+    """
+
+    path: Path
+    member: str | None = None
+
+    @classmethod
+    def at(cls, location: Path) -> SourceFile:
+        for archive in (location, *location.parents):
+            if archive.suffix.lower() == ".zip" and archive.is_file():
+                if archive == location:
+                    raise ValueError(f"{location} is an archive; name the member to load, e.g. {location}/data.csv")
+                return cls(archive, location.relative_to(archive).as_posix())
+        return cls(location)
+
+    @property
+    def name(self) -> str:
+        return f"{self.path.name}/{self.member}" if self.member else self.path.name
+
+    @property
+    def compressed(self) -> bool:
+        """True unless the bytes on disk are the CSV itself, which ``mmap`` and byte ranges rely on."""
+        return self.member is not None or self.path.suffix.lower() in DECOMPRESSORS
+
+    def zip_info(self) -> zipfile.ZipInfo:
+        with zipfile.ZipFile(self.path) as archive:
+            return archive.getinfo(self.member)
+
+    def stat(self) -> tuple[int, float]:
+        """Size and mtime: of the member for an archive, of the file otherwise."""
+        if self.member is None:
+            stat = self.path.stat()
+            return stat.st_size, stat.st_mtime
+        info = self.zip_info()
+        return info.file_size, time.mktime(info.date_time + (0, 0, -1))
+
+    @contextmanager
+    def open_binary(self) -> Iterator[BinaryIO]:
+        """The decompressed bytes, streamed; nothing is unpacked to disk."""
+        with self.path.open("rb", buffering=READ_BUFFER_SIZE) as raw:
+            if self.member is not None:
+                with zipfile.ZipFile(raw) as archive, archive.open(self.member) as member:
+                    yield io.BufferedReader(member, buffer_size=READ_BUFFER_SIZE)
+            elif self.path.suffix.lower() in DECOMPRESSORS:
+                with DECOMPRESSORS[self.path.suffix.lower()](raw) as decompressed:
+                    # The readers above only decompress as much as each read asks for.
+                    yield io.BufferedReader(decompressed, buffer_size=READ_BUFFER_SIZE)
+            else:
+                yield raw
+
+    @contextmanager
+    def open_text(self) -> Iterator[TextIO]:
+        """The decompressed CSV as text, without a byte order mark, like ``path.open("r", encoding="utf-8-sig")``."""
+        with self.open_binary() as binary, io.TextIOWrapper(binary, encoding="utf-8-sig") as handle:
+            yield handle
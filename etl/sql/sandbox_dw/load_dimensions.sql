@@ -12,13 +12,13 @@ RESTART IDENTITY;
 WITH date_bounds AS (
     SELECT MIN (date_val) AS min_date, MAX(date_val) AS max_date
     FROM (
-        SELECT NULLIF(order_purchase_timestamp, '')::timestamp::date AS date_val FROM staging.orders
+        SELECT order_purchase_timestamp::date AS date_val FROM staging.orders
          UNION ALL
-        SELECT NULLIF(shipping_limit_date, '')::timestamp::date AS date_val FROM staging.order_items
+        SELECT shipping_limit_date::date AS date_val FROM staging.order_items
         UNION ALL
-        SELECT NULLIF(order_delivered_customer_date, '')::timestamp::date AS date_val FROM staging.orders
+        SELECT order_delivered_customer_date::date AS date_val FROM staging.orders
         UNION ALL
-        SELECT NULLIF(order_estimated_delivery_date, '')::timestamp::date AS date_val FROM staging.orders
+        SELECT order_estimated_delivery_date::date AS date_val FROM staging.orders
      ) AS dates
     WHERE date_val IS NOT NULL
 )
@@ -73,10 +73,10 @@ SELECT
     p.product_id,
     p.product_category_name,
     t.product_category_name_english,
-    NULLIF(p.product_weight_g, '')::INTEGER AS weight,
-    NULLIF(p.product_height_cm, '')::INTEGER AS height,
-    NULLIF(p.product_length_cm, '') ::INTEGER AS length,
-    NULLIF(p.product_width_cm, '')::INTEGER AS width
+    p.product_weight_g AS weight,
+    p.product_height_cm AS height,
+    p.product_length_cm AS length,
+    p.product_width_cm AS width
 FROM staging.products AS p
 LEFT JOIN staging.product_category_name_translation AS t
     ON t.product_category_name = p.product_category_name
@@ -25,7 +25,7 @@ INSERT INTO sdw.fact_order_items (
 )
 SELECT
     oi.order_id,
-    NULLIF(oi.order_item_id, ''),
+    oi.order_item_id,
     dc.customer_sk,
     ds.seller_sk,
     dp.product_sk,
@@ -34,18 +34,18 @@ SELECT
     dd_shipping_limit.date_key,
     dd_delivered.date_key,
     dd_estimated.date_key,
-    NULLIF(oi.price, '')::numeric,
-    NULLIF(oi.freight_value, '')::numeric
+    oi.price,
+    oi.freight_value
 FROM staging.order_items oi
 JOIN staging.orders o ON oi.order_id = o.order_id
 LEFT JOIN sdw.dim_customer dc ON o.customer_id = dc.customer_id
 LEFT JOIN sdw.dim_seller ds ON oi.seller_id = ds.seller_id
 LEFT JOIN sdw.dim_product dp ON oi.product_id = dp.product_id
 LEFT JOIN sdw.dim_order_status dos ON o.order_status = dos.order_status
-LEFT JOIN sdw.dim_date dd_purchase ON dd_purchase.date = NULLIF(o.order_purchase_timestamp, '')::timestamp::date
-LEFT JOIN sdw.dim_date dd_shipping_limit ON dd_shipping_limit.date = NULLIF(oi.shipping_limit_date, '')::timestamp::date
-LEFT JOIN sdw.dim_date dd_delivered ON dd_delivered.date = NULLIF(o.order_delivered_customer_date, '')::timestamp::date
-LEFT JOIN sdw.dim_date dd_estimated ON dd_estimated.date = NULLIF(o.order_estimated_delivery_date, '')::timestamp::date
+LEFT JOIN sdw.dim_date dd_purchase ON dd_purchase.date = o.order_purchase_timestamp::date
+LEFT JOIN sdw.dim_date dd_shipping_limit ON dd_shipping_limit.date = oi.shipping_limit_date::date
+LEFT JOIN sdw.dim_date dd_delivered ON dd_delivered.date = o.order_delivered_customer_date::date
+LEFT JOIN sdw.dim_date dd_estimated ON dd_estimated.date = o.order_estimated_delivery_date::date
 ;
 
 
@@ -78,9 +78,9 @@ LEFT JOIN staging.order_items oi ON oi.order_id = o.order_id
 LEFT JOIN staging.order_payments op ON op.order_id = o.order_id
 LEFT JOIN sdw.dim_customer dc ON dc.customer_id = o.customer_id
 LEFT JOIN sdw.dim_order_status dos ON dos.order_status = o.order_status
-LEFT JOIN sdw.dim_date dd_purchase ON dd_purchase.date = NULLIF(o.order_purchase_timestamp, '')::timestamp::date
-LEFT JOIN sdw.dim_date dd_delivered ON dd_delivered.date = NULLIF(o.order_delivered_customer_date, '')::timestamp::date
-LEFT JOIN sdw.dim_date dd_estimated ON dd_estimated.date = NULLIF(o.order_estimated_delivery_date, '')::timestamp::date
+LEFT JOIN sdw.dim_date dd_purchase ON dd_purchase.date = o.order_purchase_timestamp::date
+LEFT JOIN sdw.dim_date dd_delivered ON dd_delivered.date = o.order_delivered_customer_date::date
+LEFT JOIN sdw.dim_date dd_estimated ON dd_estimated.date = o.order_estimated_delivery_date::date
 GROUP BY
     o.order_id,
     dc.customer_sk,
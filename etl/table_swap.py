@@ -0,0 +1,86 @@
+"""Swap a freshly built shadow table in for a live one."""
+
+from __future__ import annotations
+
+from sqlalchemy import Connection, text
+
+# Views reading the table, read before the rename while their definitions still name it.
+_DEPENDENT_VIEWS_SQL = """
+    SELECT DISTINCT format('%I.%I', view_namespace.nspname, view_class.relname),
+           pg_get_viewdef(view_class.oid)
+    FROM pg_depend
+    JOIN pg_rewrite ON pg_rewrite.oid = pg_depend.objid
+    JOIN pg_class view_class ON view_class.oid = pg_rewrite.ev_class
+    JOIN pg_namespace view_namespace ON view_namespace.oid = view_class.relnamespace
+    WHERE pg_depend.classid = CAST('pg_rewrite' AS regclass)
+      AND pg_depend.refobjid = CAST(:table_name AS regclass)
+      AND view_class.relkind = 'v';
+    """
+
+# Grants and the table comment, which CREATE TABLE ... (LIKE ... INCLUDING ALL) does not copy.
+_CARRY_OVER_SQL = """
+    SELECT format(
+        'GRANT %s ON TABLE %s TO %s%s',
+        acl.privilege_type,
+        :table_name,
+        CASE WHEN acl.grantee = 0 THEN 'PUBLIC' ELSE quote_ident(pg_get_userbyid(acl.grantee)) END,
+        CASE WHEN acl.is_grantable THEN ' WITH GRANT OPTION' ELSE '' END
+    )
+    FROM pg_class, aclexplode(pg_class.relacl) AS acl
+    WHERE pg_class.oid = CAST(:table_name AS regclass)
+    UNION ALL
+    SELECT format('COMMENT ON TABLE %s IS %L', :table_name, description)
+    FROM pg_description
+    WHERE objoid = CAST(:table_name AS regclass)
+      AND classoid = CAST('pg_class' AS regclass)
+      AND objsubid = 0;
+    """
+
+
+def _escaped(statement: str) -> str:
+    """Keep colons in generated SQL from being taken for bind parameters."""
+    return statement.replace(":", "\\:")
+
+
+def swap_in(connection: Connection, table_name: str, shadow: str) -> None:
+    """
+    Replace ``table_name`` with ``shadow``, a table in the same schema, by renaming it.
+
+    Runs in the caller's transaction, so readers see either table as a whole. Views
+    on the table would otherwise follow it under its retired name; they are
+    redefined on the new table, keeping their own grants and the views built on
+    them. The table's grants and comment are copied, indexes copied with
+    ``LIKE ... INCLUDING ALL`` get the table's name back, and the old table is
+    dropped. Materialized views and foreign keys referencing the table make the
+    swap fail.
+    """
+    schema, _, name = table_name.rpartition(".")
+    prefix = f"{schema}." if schema else ""
+    shadow_name = shadow.rpartition(".")[2]
+    retired = f"{name}_retired"
+
+    views = connection.execute(text(_DEPENDENT_VIEWS_SQL), {"table_name": table_name}).all()
+    carry_over = connection.execute(text(_CARRY_OVER_SQL), {"table_name": table_name}).scalars().all()
+    connection.execute(text(f"ALTER TABLE {table_name} RENAME TO {retired};"))
+    connection.execute(text(f"ALTER TABLE {shadow} RENAME TO {name};"))
+    for statement in carry_over:
+        connection.execute(text(_escaped(statement)))
+    for view_name, definition in views:
+        connection.execute(text(f"CREATE OR REPLACE VIEW {view_name} AS {_escaped(definition)}"))
+    connection.execute(text(f"DROP TABLE {prefix}{retired};"))
+
+    index_names = connection.execute(
+        text(
+            """
+            SELECT index_class.relname
+            FROM pg_index
+            JOIN pg_class index_class ON index_class.oid = pg_index.indexrelid
+            WHERE pg_index.indrelid = CAST(:table_name AS regclass);
+            """
+        ),
+        {"table_name": table_name},
+    ).scalars().all()
+    for index_name in index_names:
+        if index_name.startswith(shadow_name):
+            renamed = name + index_name[len(shadow_name):]
+            connection.execute(text(f"ALTER INDEX {prefix}{index_name} RENAME TO {renamed};"))
@@ -1,8 +1,46 @@
-from typing import Iterable, List
+import re
+import threading
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple, Union
 
 import sqlparse
+from cachetools import LRUCache
+from sqlparse import lexer
+from sqlparse.engine import StatementSplitter
 from sqlparse.sql import Function, Identifier, IdentifierList, Token
-from sqlparse.tokens import DML, Keyword, Wildcard
+from sqlparse.tokens import (
+    DML,
+    Comment,
+    Keyword,
+    Literal,
+    Name,
+    Operator,
+    Punctuation,
+    Whitespace,
+    Wildcard,
+    _TokenType,
+)
+
+# Statements whose columns are kept, least recently used ones are dropped first.
+PARSE_CACHE_SIZE = 1024
+
+# Whitespace runs, skipping string literals (E'...' with backslash escapes and
+# $tag$...$tag$ dollar quotes included), quoted identifiers and comments so
+# collapsing them cannot change what the SQL means.
+_WHITESPACE = re.compile(
+    r"""(
+        (?<![\w$])[eE]'(?:[^'\\]|\\.|'')*'
+        | (?<![\w$])(\$(?:[A-Za-z_][A-Za-z0-9_]*)?\$).*?\2
+        | '(?:[^']|'')*'
+        | "(?:[^"]|"")*"
+        | --[^\n]*\n?
+        | /\*.*?\*/
+    )|\s+""",
+    re.DOTALL | re.VERBOSE,
+)
+
+_cache: LRUCache = LRUCache(maxsize=PARSE_CACHE_SIZE)
+_cache_lock = threading.Lock()
 
 
 def _identifier_name(identifier: Identifier | Function | Token) -> str:
@@ -38,6 +76,75 @@ def _extract_identifier_tokens(token: Token) -> Iterable[str]:
             yield from _extract_identifier_tokens(sub)
 
 
+def _collapse_whitespace(sql: str) -> str:
+    return _WHITESPACE.sub(lambda match: match.group(1) or " ", sql)
+
+
+def normalize_sql(sql: str) -> str:
+    """Cache key for ``sql``: whitespace collapsed outside literals and comments, trailing ``;`` dropped."""
+    return _collapse_whitespace(sql).strip().rstrip(";").rstrip()
+
+
+def _select_list(tokens: Iterable[Tuple[_TokenType, str]]) -> Optional[str]:
+    """
+    Text from the statement's top-level SELECT up to its FROM, from unparsed lexer tokens.
+
+    Only parentheses are tracked, so subqueries, CTE bodies and ``EXTRACT(... FROM ...)``
+    are skipped without grouping the whole statement. Returns None without a SELECT.
+    """
+    depth = 0
+    select_list: Optional[List[str]] = None
+    for ttype, value in tokens:
+        if ttype is Punctuation:
+            if value == "(":
+                depth += 1
+            elif value == ")":
+                depth -= 1
+            elif value == ";" and depth == 0:
+                break
+        if depth != 0:
+            if select_list is not None:
+                select_list.append(value)
+            continue
+        if select_list is None:
+            if ttype is DML and value.upper() == "SELECT":
+                select_list = [value]
+            continue
+        if ttype is Keyword and value.upper() == "FROM":
+            break
+        select_list.append(value)
+    return "".join(select_list) if select_list is not None else None
+
+
+def _parse_select_list(select_list: Optional[str]) -> Tuple[str, ...]:
+    if select_list is None:
+        return ()
+    statement = sqlparse.parse(select_list)[0]
+    columns: List[str] = []
+    for token in statement.tokens:
+        if token.is_whitespace or (token.ttype is DML and token.normalized == "SELECT"):
+            continue
+        columns.extend(_extract_identifier_tokens(token))
+    return tuple(columns)
+
+
+def _cached_columns(sql: str, tokens: Optional[Iterable[Tuple[_TokenType, str]]] = None) -> List[str]:
+    """Columns of one statement; ``tokens`` are its lexer tokens when the caller already has them."""
+    key = normalize_sql(sql)
+    with _cache_lock:
+        columns = _cache.get(key)
+    if columns is None:
+        columns = _parse_select_list(_select_list(lexer.tokenize(key) if tokens is None else tokens))
+        with _cache_lock:
+            _cache[key] = columns
+    return list(columns)
+
+
+def clear_parse_cache() -> None:
+    with _cache_lock:
+        _cache.clear()
+
+
 def extract_columns(sql: str) -> List[str]:
     """
     Extract column-like names from the SELECT clause of a SQL statement.
@@ -46,29 +153,466 @@ def extract_columns(sql: str) -> List[str]:
     - Returns aliases when available, otherwise the real column name.
     - Supports nested expressions (functions, CASE, subqueries) by drilling into groups.
     - Stops parsing at the first FROM keyword.
+    - Only the SELECT list is run through sqlparse's grouping, and results are
+      cached by ``normalize_sql(sql)``; repeated statements are not parsed again.
     """
-    parsed = sqlparse.parse(sql)
-    if not parsed:
-        return []
+    return _cached_columns(sql)
 
-    statement = parsed[0]
-    select_seen = False
-    collected_tokens: List[Token] = []
 
-    for token in statement.tokens:
-        if token.is_whitespace:
+def extract_columns_from_script(script: str) -> List[List[str]]:
+    """
+    Columns of every statement in ``script``, in order.
+
+    The script is tokenized once; statements without a SELECT (DDL, TRUNCATE, ...)
+    give an empty list.
+    """
+    results = []
+    for statement in StatementSplitter().process(lexer.tokenize(_collapse_whitespace(script))):
+        if all(token.is_whitespace or token.ttype in Comment for token in statement.tokens):
             continue
-        if token.ttype is DML and token.normalized == "SELECT":
-            select_seen = True
+        sql = str(statement)
+        results.append(_cached_columns(sql, ((token.ttype, token.value) for token in statement.tokens)))
+    return results
+
+
+# Column lineage. The analysis runs on sqlparse's lexer tokens nested by
+# parentheses rather than on its grouped parse tree, which does not group
+# INSERT targets, CTEs and joins consistently enough to follow column references.
+
+ColumnRef = Tuple[str, str]
+# A lexer token, or a parenthesised group of items without its parentheses.
+_Item = Union[Tuple[_TokenType, str], list]
+
+# Keywords ending the FROM clause of a SELECT.
+_CLAUSE_ENDS = {"WHERE", "GROUP BY", "HAVING", "ORDER BY", "LIMIT", "OFFSET", "WINDOW", "FETCH", "FOR"}
+_CREATE_MODIFIERS = {"TEMP", "TEMPORARY", "UNLOGGED", "MATERIALIZED", "VIEW", "TABLE", "IF NOT EXISTS"}
+_SET_OPERATIONS = {"UNION", "UNION ALL", "INTERSECT", "INTERSECT ALL", "EXCEPT", "EXCEPT ALL"}
+
+
+@dataclass(frozen=True)
+class StatementLineage:
+    """
+    What one INSERT ... SELECT or CREATE TABLE/MATERIALIZED VIEW ... AS writes.
+
+    ``columns`` maps every target column to the ``(table, column)`` pairs its value
+    is computed from, followed through CTEs and subqueries down to real tables;
+    ``sources`` lists every table the statement reads, including the ones that are
+    only joined or filtered on.
+    """
+
+    target: str
+    columns: Dict[str, FrozenSet[ColumnRef]]
+    sources: FrozenSet[str]
+
+
+@dataclass
+class _Query:
+    # Output columns in order; unnamed expressions have no name.
+    columns: List[Tuple[Optional[str], FrozenSet[ColumnRef]]]
+    tables: Set[str]
+
+    def named(self) -> Dict[str, FrozenSet[ColumnRef]]:
+        return {name: refs for name, refs in self.columns if name}
+
+
+# A FROM source: a real table name, or the columns of a subquery, CTE or function.
+_Source = Union[str, Dict[str, FrozenSet[ColumnRef]]]
+
+
+def _nest(tokens: Iterable[Tuple[_TokenType, str]]) -> list:
+    """The first statement's tokens without whitespace and comments, nested by parentheses."""
+    stack: List[list] = [[]]
+    for ttype, value in tokens:
+        if ttype in Whitespace or ttype in Comment:
             continue
-        if not select_seen:
+        if ttype is Punctuation and value == "(":
+            stack.append([])
+        elif ttype is Punctuation and value == ")" and len(stack) > 1:
+            group = stack.pop()
+            stack[-1].append(group)
+        elif ttype is Punctuation and value == ";" and len(stack) == 1:
+            break
+        else:
+            stack[-1].append((ttype, value))
+    return stack[0]
+
+
+def _keyword(item: _Item) -> Optional[str]:
+    if isinstance(item, tuple) and item[0] in Keyword:
+        return " ".join(item[1].upper().split())
+    return None
+
+
+def _is_punctuation(item: _Item, value: str) -> bool:
+    return isinstance(item, tuple) and item[0] is Punctuation and item[1] == value
+
+
+def _is_name(item: _Item) -> bool:
+    return isinstance(item, tuple) and (item[0] in Name or item[0] in Literal.String.Symbol)
+
+
+def _name(item: _Item) -> str:
+    return item[1].strip('"')
+
+
+def _split(items: list, separator: str = ",") -> List[list]:
+    parts: List[list] = [[]]
+    for item in items:
+        if _is_punctuation(item, separator):
+            parts.append([])
+        else:
+            parts[-1].append(item)
+    return [part for part in parts if part]
+
+
+def _dotted_name(items: list, start: int) -> Tuple[str, int]:
+    """``schema.table`` or ``alias.column`` starting at ``items[start]``, and the index after it."""
+    parts = [_name(items[start])]
+    position = start + 1
+    while (
+        position + 1 < len(items)
+        and _is_punctuation(items[position], ".")
+        and isinstance(items[position + 1], tuple)
+        and (_is_name(items[position + 1]) or items[position + 1][0] in Wildcard or _keyword(items[position + 1]))
+    ):
+        parts.append(_name(items[position + 1]))
+        position += 2
+    return ".".join(parts), position
+
+
+def _is_query(items: list) -> bool:
+    return bool(items) and _keyword(items[0]) in ("SELECT", "WITH", "VALUES")
+
+
+class _Scope:
+    """The FROM sources visible to an expression, falling back to an enclosing query's."""
+
+    def __init__(self, outer: Optional["_Scope"] = None):
+        self.sources: Dict[str, _Source] = {}
+        self.outer = outer
+
+    def add(self, alias: str, source: _Source, *names: str) -> None:
+        for name in (alias, *names):
+            self.sources.setdefault(name, source)
+
+    def resolve(self, qualifier: str, column: str) -> FrozenSet[ColumnRef]:
+        if qualifier:
+            source = self.sources.get(qualifier)
+            if source is None:
+                return self.outer.resolve(qualifier, column) if self.outer else frozenset()
+            if isinstance(source, str):
+                return frozenset({(source, column)})
+            return source.get(column, source.get("", frozenset()))
+
+        distinct = list({id(source): source for source in self.sources.values()}.values())
+        for source in distinct:
+            if isinstance(source, dict) and column in source:
+                return source[column]
+        tables = [source for source in distinct if isinstance(source, str)]
+        if len(tables) == 1:
+            return frozenset({(tables[0], column)})
+        # Unknown or ambiguous without the table definitions.
+        return self.outer.resolve("", column) if self.outer else frozenset()
+
+    def star(self, qualifier: str) -> List[Tuple[Optional[str], FrozenSet[ColumnRef]]]:
+        if qualifier:
+            sources = [self.sources[qualifier]] if qualifier in self.sources else []
+        else:
+            sources = list({id(source): source for source in self.sources.values()}.values())
+        columns: List[Tuple[Optional[str], FrozenSet[ColumnRef]]] = []
+        for source in sources:
+            if isinstance(source, str):
+                columns.append(("*", frozenset({(source, "*")})))
+            else:
+                columns.extend((name, refs) for name, refs in source.items() if name)
+        return columns
+
+
+def _expression_refs(items: list, scope: _Scope, ctes: dict, tables: Set[str]) -> Set[ColumnRef]:
+    """Columns referenced by an expression; tables read by its subqueries are added to ``tables``."""
+    refs: Set[ColumnRef] = set()
+    position = 0
+    while position < len(items):
+        item = items[position]
+        if isinstance(item, list):
+            if _is_query(item):
+                query = _query(item, ctes, scope)
+                tables |= query.tables
+                for _, column_refs in query.columns:
+                    refs |= column_refs
+            else:
+                refs |= _expression_refs(item, scope, ctes, tables)
+            position += 1
+        elif _is_punctuation(item, "::"):
+            # Skip the type name, including modifiers such as numeric(12, 2).
+            position += 2
+            if position < len(items) and isinstance(items[position], list):
+                position += 1
+        elif _keyword(item) == "AS":
+            # CAST(x AS date): the type is not a column.
+            position += 2
+        elif _is_name(item):
+            name, position = _dotted_name(items, position)
+            if position < len(items) and isinstance(items[position], list):
+                continue  # A function call; its arguments are the next item.
+            qualifier, _, column = name.rpartition(".")
+            refs |= scope.resolve(qualifier, column)
+        else:
+            position += 1
+    return refs
+
+
+def _output_name(items: list) -> Tuple[Optional[str], list]:
+    """The alias of a select-list expression, or the name extract_columns would give it."""
+    if len(items) >= 2 and _keyword(items[-2]) == "AS":
+        return _name(items[-1]), items[:-2]
+    if len(items) >= 2 and _is_name(items[-1]):
+        previous = items[-2]
+        # "expression alias", unless the name ends a.b, x::type or a + b.
+        if not (isinstance(previous, tuple) and (previous[0] is Punctuation or previous[0] in Operator)):
+            return _name(items[-1]), items[:-1]
+    if _is_name(items[0]):
+        name, position = _dotted_name(items, 0)
+        if position == len(items) or position == len(items) - 1 and isinstance(items[-1], list):
+            return name.rpartition(".")[2], items
+    return None, items
+
+
+def _from_clause(items: list, scope: _Scope, ctes: dict, tables: Set[str]) -> None:
+    """Register the sources of a FROM clause in ``scope``; join conditions only contribute tables."""
+    chunks: List[list] = [[]]
+    in_condition = False
+    for item in items:
+        keyword = _keyword(item)
+        if _is_punctuation(item, ",") and not in_condition or keyword is not None and keyword.endswith("JOIN"):
+            chunks.append([])
+            in_condition = False
+        elif keyword in ("ON", "USING"):
+            in_condition = True
+        elif in_condition:
+            if isinstance(item, list):
+                _expression_refs([item], scope, ctes, tables)
+        else:
+            chunks[-1].append(item)
+
+    for chunk in chunks:
+        chunk = [item for item in chunk if _keyword(item) not in ("LATERAL", "ONLY")]
+        if not chunk:
             continue
-        if token.ttype is Keyword and token.normalized == "FROM":
+        rest: list
+        if isinstance(chunk[0], list):
+            query = _query(chunk[0], ctes, scope) if _is_query(chunk[0]) else _Query([], set())
+            tables |= query.tables
+            source: _Source = query.named()
+            name, rest = "", chunk[1:]
+        elif _is_name(chunk[0]) or _keyword(chunk[0]):
+            name, position = _dotted_name(chunk, 0)
+            rest = chunk[position:]
+            if rest and isinstance(rest[0], list):
+                # A set-returning function such as generate_series(...).
+                arguments = frozenset(_expression_refs([rest[0]], scope, ctes, tables))
+                source = {"": arguments}
+                rest = rest[1:]
+            elif name in ctes:
+                source = ctes[name]
+            else:
+                source = name
+                tables.add(name)
+        else:
+            continue
+        if rest and _keyword(rest[0]) == "AS":
+            rest = rest[1:]
+        alias = _name(rest[0]) if rest and not isinstance(rest[0], list) else name.rpartition(".")[2]
+        if isinstance(source, dict) and rest[1:] and isinstance(rest[1], list):
+            # Column aliases, e.g. generate_series(...) AS gs(n).
+            names = [_name(part[0]) for part in _split(rest[1]) if part]
+            if len(source) == len(names):
+                values = list(source.values())
+            else:
+                values = [frozenset().union(*source.values())] * len(names)
+            source = dict(zip(names, values))
+        if isinstance(source, dict) and "" in source:
+            source = {**source, alias: source[""]}
+        scope.add(alias, source, name)
+
+
+def _select(items: list, ctes: dict, outer: Optional[_Scope]) -> _Query:
+    tables: Set[str] = set()
+    scope = _Scope(outer)
+    position = 0
+    while position < len(items) and _keyword(items[position]) != "SELECT":
+        position += 1
+    position += 1
+    while position < len(items) and _keyword(items[position]) in ("DISTINCT", "ALL", "ON"):
+        position += 1
+        if position < len(items) and isinstance(items[position], list):
+            position += 1
+
+    end = position
+    while end < len(items) and _keyword(items[end]) != "FROM":
+        end += 1
+    select_list = items[position:end]
+    if end < len(items):
+        clause_end = end + 1
+        while clause_end < len(items) and _keyword(items[clause_end]) not in _CLAUSE_ENDS:
+            clause_end += 1
+        _from_clause(items[end + 1:clause_end], scope, ctes, tables)
+        # Subqueries in WHERE, HAVING, ... only add the tables they read.
+        _expression_refs(items[clause_end:], scope, ctes, tables)
+
+    columns: List[Tuple[Optional[str], FrozenSet[ColumnRef]]] = []
+    for expression in _split(select_list):
+        last = expression[-1]
+        if isinstance(last, tuple) and last[0] in Wildcard:
+            qualifier = _dotted_name(expression, 0)[0].rpartition(".")[0] if len(expression) > 1 else ""
+            columns.extend(scope.star(qualifier))
+            continue
+        name, body = _output_name(expression)
+        columns.append((name, frozenset(_expression_refs(body, scope, ctes, tables))))
+    return _Query(columns, tables)
+
+
+def _with_clause(items: list, ctes: dict, outer: Optional[_Scope], tables: Set[str]) -> Tuple[dict, int]:
+    """
+    Parse ``WITH name AS (...), ...``; returns the CTEs and the index of the statement
+    after them, ``len(items)`` when the clause is cut short.
+    """
+    ctes = dict(ctes)
+    position = 1
+    if position < len(items) and _keyword(items[position]) == "RECURSIVE":
+        position += 1
+    while position < len(items):
+        name = _name(items[position])
+        position += 1
+        names = None
+        if position < len(items) and isinstance(items[position], list):
+            names = [_name(part[0]) for part in _split(items[position]) if part]
+            position += 1
+        while position < len(items) and not isinstance(items[position], list):  # AS [NOT] MATERIALIZED
+            position += 1
+        if position >= len(items):
+            return ctes, len(items)
+        query = _query(items[position], ctes, outer)
+        tables |= query.tables
+        if names:
+            ctes[name] = {column: refs for column, (_, refs) in zip(names, query.columns)}
+        else:
+            ctes[name] = query.named()
+        position += 1
+        if position < len(items) and _is_punctuation(items[position], ","):
+            position += 1
+        else:
             break
-        collected_tokens.append(token)
+    return ctes, position
+
+
+def _query(items: list, ctes: dict, outer: Optional[_Scope] = None) -> _Query:
+    tables: Set[str] = set()
+    if items and _keyword(items[0]) == "WITH":
+        ctes, position = _with_clause(items, ctes, outer, tables)
+        items = items[position:]
+
+    branches: List[list] = [[]]
+    for item in items:
+        if _keyword(item) in _SET_OPERATIONS:
+            branches.append([])
+        else:
+            branches[-1].append(item)
+
+    result: Optional[_Query] = None
+    for branch in branches:
+        if len(branch) == 1 and isinstance(branch[0], list):
+            query = _query(branch[0], ctes, outer)
+        elif branch and _keyword(branch[0]) == "SELECT":
+            query = _select(branch, ctes, outer)
+        else:
+            query = _Query([], set())
+        if result is None:
+            result = query
+        else:
+            # Later branches add sources to the columns at the same position.
+            result.columns = [
+                (name, refs | other)
+                for (name, refs), (_, other) in zip(result.columns, query.columns)
+            ] + result.columns[len(query.columns):]
+            result.tables |= query.tables
+    result = result or _Query([], set())
+    result.tables |= tables
+    return result
+
+
+def _statement_lineage(items: list) -> Optional[StatementLineage]:
+    ctes: dict = {}
+    tables: Set[str] = set()
+    if items and _keyword(items[0]) == "WITH":
+        ctes, position = _with_clause(items, ctes, None, tables)
+        items = items[position:]
+    if not items:
+        return None
+
+    statement = _keyword(items[0])
+    if statement == "INSERT" and len(items) > 2 and _keyword(items[1]) == "INTO":
+        target, position = _dotted_name(items, 2)
+        if position < len(items) and _keyword(items[position]) == "AS":
+            position += 2
+    elif statement == "CREATE":
+        position = 1
+        while (
+            position < len(items)
+            and isinstance(items[position], tuple)
+            and items[position][1].upper() in _CREATE_MODIFIERS
+        ):
+            position += 1
+        if position >= len(items) or not _is_name(items[position]):
+            return None
+        target, position = _dotted_name(items, position)
+    else:
+        return None
+
+    target_columns = None
+    if position < len(items) and isinstance(items[position], list) and not _is_query(items[position]):
+        target_columns = [_name(part[0]) for part in _split(items[position]) if part]
+        position += 1
+    if statement == "CREATE":
+        if position >= len(items) or _keyword(items[position]) != "AS":
+            return None
+        position += 1
+
+    body = items[position:]
+    if not body:
+        return None
+    for end, item in enumerate(body):
+        keyword = _keyword(item)
+        following = _keyword(body[end + 1]) if end + 1 < len(body) else None
+        if (
+            keyword == "RETURNING"
+            or keyword == "ON" and following == "CONFLICT"
+            or keyword == "WITH" and end > 0 and following in ("DATA", "NO DATA", "NO")
+        ):
+            body = body[:end]
+            break
+    query = _query(body, ctes)
+    names = target_columns or [name for name, _ in query.columns]
+    columns = {
+        name: refs for name, (_, refs) in zip(names, query.columns) if name
+    }
+    return StatementLineage(
+        target=target,
+        columns=columns,
+        sources=frozenset((query.tables | tables) - {target}),
+    )
+
+
+def statement_lineage(sql: str) -> Optional[StatementLineage]:
+    """Lineage of the first statement in ``sql``; None for statements that do not write rows from a query."""
+    return _statement_lineage(_nest(lexer.tokenize(sql)))
 
-    columns: List[str] = []
-    for token in collected_tokens:
-        columns.extend(_extract_identifier_tokens(token))
 
-    return columns
+def script_lineage(script: str) -> List[StatementLineage]:
+    """Lineage of every statement in ``script`` that writes rows from a query, in order."""
+    results = []
+    for statement in StatementSplitter().process(lexer.tokenize(script)):
+        lineage = _statement_lineage(_nest((token.ttype, token.value) for token in statement.tokens))
+        if lineage is not None:
+            results.append(lineage)
+    return results
@@ -0,0 +1,131 @@
+"""Cached dimensional reads from the warehouse for the API."""
+
+import asyncio
+import threading
+from typing import Any, Optional
+
+import asyncpg
+from cachetools import TTLCache
+
+CUSTOMER_SQL = """
+SELECT customer_sk, customer_id, customer_unique_id, zip_code_prefix, city, state
+FROM dw.dim_customer
+WHERE customer_id = $1
+"""
+
+ORDER_SQL = """
+SELECT f.order_id, c.customer_id, s.order_status, f.purchase_date_key, f.items_count,
+       f.order_item_total, f.freight_total, f.payment_total
+FROM dw.fact_orders f
+LEFT JOIN dw.dim_customer c ON c.customer_sk = f.customer_sk
+LEFT JOIN dw.dim_order_status s ON s.order_status_sk = f.order_status_sk
+WHERE f.order_id = $1
+"""
+
+CUSTOMER_ORDER_TOTALS_SQL = """
+SELECT c.customer_id,
+       count(f.order_id) AS orders_count,
+       coalesce(sum(f.items_count), 0) AS items_count,
+       coalesce(sum(f.order_item_total), 0) AS order_item_total,
+       coalesce(sum(f.freight_total), 0) AS freight_total,
+       coalesce(sum(f.payment_total), 0) AS payment_total
+FROM dw.dim_customer c
+LEFT JOIN dw.fact_orders f ON f.customer_sk = c.customer_sk
+WHERE c.customer_id = $1
+GROUP BY c.customer_id
+"""
+
+Rows = tuple[dict[str, Any], ...]
+
+
+class WarehouseReader:
+    """
+    Run read queries on an asyncpg pool and keep their results in an LRU cache with a TTL.
+
+    Concurrent misses for the same query share one database round trip; when the
+    request running it is cancelled, one of the others runs it again.
+    ``invalidate`` empties the cache and may be called from any thread, e.g. when an
+    ETL job finishes; queries already in flight at that point are answered but
+    not cached, so they cannot put pre-ETL rows back.
+    """
+
+    def __init__(
+        self,
+        dsn: str,
+        cache_size: int = 1024,
+        ttl: float = 300,
+        pool_size: int = 10,
+    ):
+        self.dsn = dsn
+        self.pool_size = pool_size
+        self._cache: TTLCache = TTLCache(maxsize=cache_size, ttl=ttl)
+        # Guards the cache and the generation; TTLCache is not thread-safe.
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._in_flight: dict[tuple, asyncio.Future] = {}
+        self._pool: Optional[asyncpg.Pool] = None
+        self._pool_lock = asyncio.Lock()
+
+    async def _connect(self) -> asyncpg.Pool:
+        # Created on first use so the API starts even while the warehouse is down.
+        async with self._pool_lock:
+            if self._pool is None:
+                self._pool = await asyncpg.create_pool(self.dsn, min_size=1, max_size=self.pool_size)
+        return self._pool
+
+    async def query(self, sql: str, *args) -> Rows:
+        """Rows of ``sql`` with ``args`` as dicts, from the cache when possible."""
+        key = (sql, args)
+        while True:
+            with self._lock:
+                generation = self._generation
+                rows = self._cache.get(key)
+            if rows is not None:
+                return rows
+
+            in_flight = self._in_flight.get((generation, key))
+            if in_flight is None:
+                break
+            try:
+                return await asyncio.shield(in_flight)
+            except asyncio.CancelledError:
+                # Only the request that ran the query was cancelled (e.g. its client went
+                # away); this one is still wanted, so it runs the query itself.
+                if not in_flight.cancelled():
+                    raise
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[(generation, key)] = future
+        try:
+            pool = await self._connect()
+            rows = tuple(dict(record) for record in await pool.fetch(sql, *args))
+        except Exception as error:
+            future.set_exception(error)
+            # Mark the exception retrieved when nobody else was waiting on it.
+            future.exception()
+            raise
+        else:
+            future.set_result(rows)
+        finally:
+            del self._in_flight[(generation, key)]
+            if not future.done():
+                future.cancel()
+
+        with self._lock:
+            if generation == self._generation:
+                self._cache[key] = rows
+        return rows
+
+    async def first(self, sql: str, *args) -> Optional[dict[str, Any]]:
+        rows = await self.query(sql, *args)
+        return rows[0] if rows else None
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._cache.clear()
+
+    async def close(self) -> None:
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
@@ -0,0 +1,203 @@
+"""Run ETL jobs submitted through the API on a bounded worker pool."""
+
+import logging
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Literal, Optional
+
+from _types import JobRequest, JobState, JobStatus
+from etl.db_connection import BLOCK_NAME
+from etl.flows.prefect_brazilian_ecommerce_dimensional import brazilian_ecommerce_dimensional_etl, select_datasets
+from etl.flows.transform import update_posts_users_table
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFull(RuntimeError):
+    """Every worker is busy and the queue is at its limit."""
+
+
+class FlowBusy(RuntimeError):
+    """A job for the same flow is already queued or running."""
+
+
+def validate_job(job_request: JobRequest) -> None:
+    """Reject requests that could only fail once they reach a worker."""
+    if job_request.flow == "brazilian_ecommerce_dimensional_etl":
+        select_datasets(job_request.datasets)
+    elif job_request.datasets is not None:
+        raise ValueError(f"{job_request.flow} does not take datasets")
+
+
+def process_job(job_request: JobRequest) -> None:
+    """
+    Run the flow named by ``job_request``.
+
+    ``mode="incremental"`` merges dimensions and rebuilds changed months from the
+    files that changed; ``mode="full"`` reloads every file and rebuilds the warehouse.
+    """
+    if job_request.flow == "brazilian_ecommerce_dimensional_etl":
+        incremental = job_request.mode == "incremental"
+        brazilian_ecommerce_dimensional_etl(
+            dimension_mode="merge" if incremental else "rebuild",
+            fact_mode="partition" if incremental else "full",
+            force_reload=not incremental,
+            datasets=job_request.datasets,
+        )
+    else:
+        update_posts_users_table(block_name=BLOCK_NAME)
+
+
+class JobStore:
+    """
+    Job statuses by id.
+
+    Queued and running jobs are never evicted, however many are submitted; finished
+    ones are dropped ``retention`` after they finished.
+    """
+
+    def __init__(self, retention: timedelta = timedelta(hours=1)):
+        self.retention = retention
+        self._jobs: dict[str, JobStatus] = {}
+        self._lock = threading.Lock()
+
+    def add(self, status: JobStatus) -> None:
+        """Add a queued job; raises ``FlowBusy`` while another job for its flow has not finished."""
+        with self._lock:
+            self._prune()
+            if status.job_id in self._jobs:
+                raise KeyError(f"Job {status.job_id} already exists")
+            for other in self._jobs.values():
+                if other.request.flow == status.request.flow and not other.state.finished:
+                    raise FlowBusy(f"Job {other.job_id} for {other.request.flow} has not finished yet")
+            self._jobs[status.job_id] = status
+
+    def update(self, job_id: str, **changes) -> JobStatus:
+        with self._lock:
+            current = self._jobs[job_id]
+            status = current.model_copy(update={**changes, "version": current.version + 1})
+            self._jobs[job_id] = status
+            return status
+
+    def get(self, job_id: str) -> Optional[JobStatus]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self) -> list[JobStatus]:
+        with self._lock:
+            self._prune()
+            return list(self._jobs.values())
+
+    def _prune(self) -> None:
+        cutoff = datetime.now(timezone.utc) - self.retention
+        expired = [
+            job_id
+            for job_id, status in self._jobs.items()
+            if status.state.finished and status.finished_at is not None and status.finished_at < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+class JobRunner:
+    """
+    Run jobs on ``workers`` threads, or processes with ``executor="process"``.
+
+    At most ``queue_size`` jobs wait for a free worker; ``submit`` raises
+    ``QueueFull`` beyond that instead of queueing without bound, so callers can
+    push back on clients. Jobs for the same flow share the staging and dw tables,
+    so ``submit`` also raises ``FlowBusy`` while a job for that flow is queued or
+    running; jobs for different flows run side by side. ``submit`` never blocks.
+    ``on_finished`` is called from the worker thread when a job ends, successful or
+    not, before its final status is published, so clients that see the status also
+    see the effects of the callback.
+    """
+
+    def __init__(
+        self,
+        workers: int = 2,
+        queue_size: int = 8,
+        executor: Literal["thread", "process"] = "thread",
+        store: Optional[JobStore] = None,
+        job: Callable[[JobRequest], None] = process_job,
+        on_finished: Optional[Callable[[JobRequest], None]] = None,
+    ):
+        self.store = store or JobStore()
+        self.job = job
+        self.on_finished = on_finished
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        # The threads hold the worker slots and track state; with processes they
+        # only wait on the process running the job.
+        self._threads = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="etl-job")
+        self._processes: Optional[Executor] = None
+        if executor == "process":
+            self._processes = ProcessPoolExecutor(max_workers=workers)
+
+    def submit(self, job_request: JobRequest) -> JobStatus:
+        if not self._slots.acquire(blocking=False):
+            raise QueueFull("Too many jobs are queued, retry later")
+        status = JobStatus(job_id=job_request.job_id, request=job_request)
+        try:
+            self.store.add(status)
+        except (KeyError, FlowBusy):
+            self._slots.release()
+            raise
+        self._threads.submit(self._run, job_request)
+        return status
+
+    def _run(self, job_request: JobRequest) -> None:
+        job_id = job_request.job_id
+        try:
+            self.store.update(
+                job_id,
+                state=JobState.running,
+                message=f"running {job_request.flow}",
+                started_at=datetime.now(timezone.utc),
+            )
+            if self._processes is not None:
+                self._processes.submit(self.job, job_request).result()
+            else:
+                self.job(job_request)
+        except Exception as error:
+            self._finished(job_request)
+            self.store.update(
+                job_id,
+                state=JobState.failed,
+                message="failed",
+                error=repr(error),
+                finished_at=datetime.now(timezone.utc),
+            )
+        else:
+            self._finished(job_request)
+            self.store.update(
+                job_id,
+                state=JobState.succeeded,
+                message="finished",
+                finished_at=datetime.now(timezone.utc),
+            )
+        finally:
+            self._slots.release()
+
+    def _finished(self, job_request: JobRequest) -> None:
+        if self.on_finished is not None:
+            try:
+                self.on_finished(job_request)
+            except Exception:
+                logger.exception("on_finished failed for job %s", job_request.job_id)
+
+    def shutdown(self) -> None:
+        """Stop taking jobs; queued ones are marked failed, running ones are waited for."""
+        self._threads.shutdown(wait=False, cancel_futures=True)
+        for status in self.store.list():
+            if status.state == JobState.queued:
+                self.store.update(
+                    status.job_id,
+                    state=JobState.failed,
+                    message="cancelled",
+                    error="server shut down",
+                    finished_at=datetime.now(timezone.utc),
+                )
+        self._threads.shutdown(wait=True)
+        if self._processes is not None:
+            self._processes.shutdown(wait=True)
@@ -0,0 +1,85 @@
+import csv
+import gzip
+import json
+import random
+from datetime import datetime, timezone
+
+from etl.chunked_export import ChunkedGzipWriter
+from etl.flows.prefect_dw_export import ExportPart, ExportResult, write_manifest
+
+
+def _rows(count):
+    randomness = random.Random(0)
+    return [f"o{i},{randomness.random()},\"line\none\"\n".encode() for i in range(count)]
+
+
+def test_files_roll_over_by_compressed_size_between_rows(tmp_path):
+    writer = ChunkedGzipWriter(tmp_path, "fact_orders_p201701", b"order_id,total,note\n", max_bytes=20_000)
+    rows = _rows(20000)
+    for row in rows:
+        writer.write(row)
+    files = writer.close()
+
+    assert len(files) > 2
+    assert all(chunk.bytes < 2 * 20_000 for chunk in files)
+    assert files[1].path.name == "fact_orders_p201701-00001.csv.gz"
+    read_back = []
+    for chunk in files:
+        with gzip.open(chunk.path, "rt", newline="") as handle:
+            header, *records = csv.reader(handle)
+        assert header == ["order_id", "total", "note"]
+        assert len(records) == chunk.rows
+        read_back += records
+    assert read_back == list(csv.reader(b"".join(rows).decode().splitlines(keepends=True)))
+
+
+def test_empty_table_gets_a_header_only_file(tmp_path):
+    files = ChunkedGzipWriter(tmp_path, "dim_seller", b"seller_sk\n", max_bytes=1024).close()
+
+    assert [(chunk.path.name, chunk.rows) for chunk in files] == [("dim_seller-00000.csv.gz", 0)]
+    assert gzip.decompress(files[0].path.read_bytes()) == b"seller_sk\n"
+
+
+def test_manifest_lists_files_per_table(tmp_path):
+    writer = ChunkedGzipWriter(tmp_path / "dw.fact_orders", "fact_orders_default", b"order_id\n", max_bytes=1024)
+    (tmp_path / "dw.fact_orders").mkdir()
+    writer.write(b"o1\n")
+    part = ExportPart(table="dw.fact_orders", relation="dw.fact_orders_default", partitioned=False)
+
+    files = writer.close()
+    path = write_manifest(tmp_path, [ExportResult(part, files, 0.1)], datetime(2018, 9, 1, tzinfo=timezone.utc))
+
+    manifest = json.loads(path.read_text())
+    assert manifest["exported_at"] == "2018-09-01T00:00:00+00:00"
+    assert manifest["tables"] == [
+        {
+            "table": "dw.fact_orders",
+            "exported_at": "2018-09-01T00:00:00+00:00",
+            "rows": 1,
+            "files": [
+                {"path": "dw.fact_orders/fact_orders_default-00000.csv.gz", "rows": 1, "bytes": files[0].bytes}
+            ],
+        }
+    ]
+    assert ExportPart("dw.fact_orders", "dw.fact_orders", partitioned=True).copy_statement() == (
+        "COPY (SELECT * FROM dw.fact_orders) TO STDOUT WITH (FORMAT CSV)"
+    )
+
+
+def test_manifest_keeps_the_tables_not_exported_again(tmp_path):
+    (tmp_path / "dw.dim_seller").mkdir()
+    (tmp_path / "dw.fact_orders").mkdir()
+    seller = ExportPart(table="dw.dim_seller", relation="dw.dim_seller", partitioned=False)
+    orders = ExportPart(table="dw.fact_orders", relation="dw.fact_orders", partitioned=True)
+    first, second = datetime(2018, 9, 1, tzinfo=timezone.utc), datetime(2018, 9, 2, tzinfo=timezone.utc)
+
+    def export(part):
+        return ExportResult(part, ChunkedGzipWriter(tmp_path / part.table, part.name, b"k\n", 1024).close(), 0.1)
+
+    write_manifest(tmp_path, [export(seller), export(orders)], first)
+    manifest = json.loads(write_manifest(tmp_path, [export(orders)], second).read_text())
+
+    assert [(entry["table"], entry["exported_at"]) for entry in manifest["tables"]] == [
+        ("dw.dim_seller", first.isoformat()),
+        ("dw.fact_orders", second.isoformat()),
+    ]
@@ -0,0 +1,30 @@
+import csv
+import io
+
+import pytest
+
+from etl.csv_chunks import mapped, record_ranges
+
+CSV_TEXT = (
+    "review_id,order_id,review_comment_message\n"
+    'r0,o0,"great,\n""really"""\n'
+    "r1,o1,\n"
+    'r2,o2,"line one\nline two\nline three"\n'
+    'r3,o3,"no ""newline"" here"\n'
+    "r4,o4,plain\n"
+)
+
+
+@pytest.mark.parametrize("chunks", [1, 2, 3, 5, 100])
+def test_record_ranges_keep_quoted_newlines_together(tmp_path, chunks):
+    path = tmp_path / "reviews.csv"
+    path.write_text(CSV_TEXT)
+
+    with mapped(path) as data:
+        header, ranges = record_ranges(data, chunks)
+        pieces = [data[start:end].decode() for start, end in ranges]
+
+    assert header == b"review_id,order_id,review_comment_message\n"
+    assert len(ranges) <= chunks
+    rows = [row for piece in pieces for row in csv.reader(io.StringIO(piece))]
+    assert rows == list(csv.reader(io.StringIO(CSV_TEXT)))[1:]
@@ -0,0 +1,100 @@
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import tasks
+from _types import JobRequest
+from etl.db_connection import BLOCK_NAME
+from main import app
+from tasks import JobRunner, process_job
+
+
+@pytest.fixture
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+def _wait_for(client, job_id, state):
+    for _ in range(100):
+        status = client.get(f"/job/{job_id}").json()
+        if status["state"] == state:
+            return status
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} never reached {state}: {status}")
+
+
+def test_job_runs_and_reports_status(client):
+    app.state.jobs = JobRunner(workers=1, queue_size=1, job=lambda job_request: None)
+
+    response = client.post("/job", json={"job_id": "a", "datasets": ["staging.orders"], "mode": "incremental"})
+
+    assert response.status_code == 202
+    _wait_for(client, "a", "succeeded")
+    assert [job["job_id"] for job in client.get("/jobs").json()] == ["a"]
+    events = client.get("/job/a/events").text
+    assert events.startswith("data: ") and '"state":"succeeded"' in events
+
+
+def test_full_queue_is_rejected(client):
+    release = threading.Event()
+    app.state.jobs = JobRunner(workers=1, queue_size=1, job=lambda job_request: release.wait())
+
+    assert client.post("/job", json={"job_id": "running"}).status_code == 202
+    assert client.post("/job", json={"job_id": "queued", "flow": "update_posts_users_table"}).status_code == 202
+    rejected = client.post("/job", json={"job_id": "rejected"})
+    release.set()
+
+    assert rejected.status_code == 429
+    assert rejected.headers["Retry-After"]
+    assert client.get("/job/rejected").status_code == 404
+    _wait_for(client, "queued", "succeeded")
+
+
+def test_second_job_for_a_busy_flow_is_rejected(client):
+    release = threading.Event()
+    app.state.jobs = JobRunner(workers=2, queue_size=2, job=lambda job_request: release.wait())
+
+    assert client.post("/job", json={"job_id": "first"}).status_code == 202
+    rejected = client.post("/job", json={"job_id": "second", "mode": "incremental"})
+    other_flow = client.post("/job", json={"job_id": "posts", "flow": "update_posts_users_table"})
+    release.set()
+
+    assert rejected.status_code == 409
+    assert client.get("/job/second").status_code == 404
+    assert other_flow.status_code == 202
+    _wait_for(client, "first", "succeeded")
+    assert client.post("/job", json={"job_id": "after"}).status_code == 202
+    _wait_for(client, "after", "succeeded")
+
+
+def test_unknown_dataset_is_rejected(client):
+    response = client.post("/job", json={"datasets": ["staging.nope"]})
+
+    assert response.status_code == 422
+
+
+def test_process_job_runs_the_requested_flow(monkeypatch):
+    calls = []
+    monkeypatch.setattr(tasks, "brazilian_ecommerce_dimensional_etl", lambda **kwargs: calls.append(("etl", kwargs)))
+    monkeypatch.setattr(tasks, "update_posts_users_table", lambda **kwargs: calls.append(("posts", kwargs)))
+
+    process_job(JobRequest(mode="incremental", datasets=["staging.orders"]))
+    process_job(JobRequest(mode="full"))
+    process_job(JobRequest(flow="update_posts_users_table"))
+
+    assert calls == [
+        (
+            "etl",
+            {
+                "dimension_mode": "merge",
+                "fact_mode": "partition",
+                "force_reload": False,
+                "datasets": ["staging.orders"],
+            },
+        ),
+        ("etl", {"dimension_mode": "rebuild", "fact_mode": "full", "force_reload": True, "datasets": None}),
+        ("posts", {"block_name": BLOCK_NAME}),
+    ]
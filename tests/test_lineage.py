@@ -0,0 +1,113 @@
+from datetime import date
+
+import pytest
+
+from etl.flows.prefect_brazilian_ecommerce_dimensional import (
+    FACT_LOADS,
+    SANDBOX_SQL_DIR,
+    aggregate_nodes,
+    dimension_nodes,
+    fact_nodes,
+    staging_sources,
+    warehouse_lineage,
+)
+from etl.lineage import LineageGraph
+from parse_sql import script_lineage, statement_lineage
+
+
+def test_statement_lineage_follows_aliases_ctes_and_subqueries():
+    lineage = statement_lineage(
+        """
+        WITH paid AS (
+            SELECT order_id, SUM(payment_value) AS total FROM staging.order_payments GROUP BY order_id
+        )
+        INSERT INTO dw.order_totals (order_id, customer, total, items)
+        SELECT
+            o.order_id,
+            c.customer_unique_id AS customer,
+            COALESCE(paid.total, 0),
+            (SELECT COUNT(*) FROM staging.order_items oi WHERE oi.order_id = o.order_id)
+        FROM staging.orders o
+        JOIN staging.customers c ON c.customer_id = o.customer_id
+        LEFT JOIN paid ON paid.order_id = o.order_id
+        ON CONFLICT (order_id) DO NOTHING;
+        """
+    )
+
+    assert lineage.target == "dw.order_totals"
+    assert lineage.columns == {
+        "order_id": {("staging.orders", "order_id")},
+        "customer": {("staging.customers", "customer_unique_id")},
+        "total": {("staging.order_payments", "payment_value")},
+        "items": set(),
+    }
+    assert lineage.sources == {
+        "staging.order_payments",
+        "staging.orders",
+        "staging.customers",
+        "staging.order_items",
+    }
+
+
+def test_script_lineage_of_the_sandbox_build():
+    lineage = {
+        statement.target: statement
+        for path in sorted(SANDBOX_SQL_DIR.glob("*.sql"))
+        for statement in script_lineage(path.read_text())
+    }
+
+    assert lineage["sdw.dim_product"].columns["weight"] == {("staging.products", "product_weight_g")}
+    # generate_series(0, payment_installments - 1) AS gs(n), through two CTEs.
+    assert lineage["sdw.fact_payment_schedule"].columns["installment_index"] == {
+        ("sdw.fact_payments", "payment_installments")
+    }
+    assert LineageGraph(lineage.values()).downstream({"sdw.fact_payments"}) == {"sdw.fact_payment_schedule"}
+
+
+def test_fact_dimensions_match_the_parsed_lineage():
+    lineage = warehouse_lineage()
+
+    for fact in FACT_LOADS:
+        joined = {table for table in lineage.upstream(fact.table) if table.startswith("dw.dim_")}
+        assert joined == set(fact.dimensions), fact.table
+
+
+def test_only_targets_downstream_of_changed_tables_are_rebuilt():
+    changed = {"staging.product_category_name_translation"}
+
+    assert [node.name for node in dimension_nodes("merge", changed)] == ["dw.dim_product"]
+    assert [node.name for node in fact_nodes("incremental", changed)] == ["dw.fact_order_items"]
+    assert dimension_nodes("merge", {"staging.geolocations"}) == []
+
+
+def test_aggregates_follow_changed_months_and_dimensions():
+    assert aggregate_nodes({"dw.fact_orders": []}) == []
+
+    (revenue,) = aggregate_nodes({"dw.fact_orders": [date(2018, 1, 1)]})
+    assert revenue.name == "dw.agg_revenue_by_month_state"
+    assert [label for label, _ in revenue.statements] == [
+        "delete dw.agg_revenue_by_month_state",
+        "dw.agg_revenue_by_month_state",
+        "analyze dw.agg_revenue_by_month_state",
+    ]
+    assert "month_key IN (201801)" in revenue.statements[0][1]
+
+    (revenue,) = aggregate_nodes({"dw.dim_customer": None})
+    assert revenue.statements[0][1] == "DELETE FROM dw.agg_revenue_by_month_state;"
+
+
+@pytest.mark.parametrize("sql", ["INSERT INTO t", "INSERT INTO t AS", "WITH x", "WITH x AS", "CREATE TABLE t AS"])
+def test_statements_cut_short_have_no_lineage(sql):
+    assert statement_lineage(sql) is None
+
+
+@pytest.mark.parametrize("mode", ["full", "incremental", "partition"])
+def test_facts_recreated_by_the_migration_are_rebuilt_by_the_next_run(mode):
+    for fact in FACT_LOADS:
+        # migrate_dw_tables forgets the load manifests of these tables, so the next run reloads them.
+        reloaded = set(staging_sources([fact.table]))
+        # An empty fact has no watermark, so partition mode rebuilds every month it has.
+        months = {fact.table: [date(2018, 1, 1), None]}
+
+        assert "staging.orders" in reloaded
+        assert fact.table in [node.name for node in fact_nodes(mode, reloaded, months)]
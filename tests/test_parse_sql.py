@@ -1,6 +1,6 @@
 import pytest
 
-from parse_sql import extract_columns
+from parse_sql import clear_parse_cache, extract_columns, extract_columns_from_script, normalize_sql
 
 
 @pytest.mark.parametrize(
@@ -18,3 +18,40 @@ from parse_sql import extract_columns
 )
 def test_extract_columns(query, expected):
     assert extract_columns(query) == expected
+
+
+def test_extract_columns_skips_subqueries_and_functions_with_from():
+    query = (
+        "WITH recent AS (SELECT order_id FROM orders) "
+        "SELECT order_id, extract(year from purchased_at) AS purchase_year, "
+        "(SELECT max(price) FROM items i WHERE i.order_id = r.order_id) AS max_price "
+        "FROM recent r"
+    )
+
+    assert extract_columns(query) == ["order_id", "purchase_year", "max_price"]
+
+
+def test_extract_columns_caches_by_normalized_sql(monkeypatch):
+    clear_parse_cache()
+    assert extract_columns("SELECT a, b AS c FROM t;") == ["a", "c"]
+
+    monkeypatch.setattr("parse_sql._parse_select_list", lambda select_list: pytest.fail("parsed again"))
+    assert extract_columns("  SELECT a,\n       b AS c\n FROM t ") == ["a", "c"]
+
+
+def test_normalize_sql_keeps_whitespace_inside_quoted_text():
+    sql = "SELECT  E'it\\'s  here',  $body$ a   b $body$,  $$ c  d $$,  'e  f'  FROM t ;"
+
+    assert normalize_sql(sql) == "SELECT E'it\\'s  here', $body$ a   b $body$, $$ c  d $$, 'e  f' FROM t"
+
+
+def test_extract_columns_from_script():
+    script = (
+        "-- load\n"
+        "TRUNCATE TABLE t;\n"
+        "INSERT INTO t (a, b) SELECT x AS a, y AS b FROM s;\n"
+        "CREATE FUNCTION f() RETURNS int LANGUAGE plpgsql AS $$ BEGIN RETURN 1; END $$;\n"
+        "SELECT 'a;b' AS literal, count(*) AS n FROM t\n"
+    )
+
+    assert extract_columns_from_script(script) == [[], ["a", "b"], [], ["literal", "n"]]
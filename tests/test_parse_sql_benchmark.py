@@ -0,0 +1,94 @@
+"""
+Micro-benchmark for parse_sql on the sandbox warehouse load scripts.
+
+Timings are too noisy for the test suite, which only counts parses and cache
+hits; for numbers, run
+
+    python -m tests.test_parse_sql_benchmark
+"""
+
+import time
+from pathlib import Path
+
+import sqlparse
+
+import parse_sql
+from parse_sql import clear_parse_cache, extract_columns, extract_columns_from_script, normalize_sql
+
+SCRIPT = (Path(__file__).parents[1] / "etl" / "sql" / "sandbox_dw" / "load_facts.sql").read_text()
+STATEMENTS = sqlparse.split(SCRIPT)
+
+
+def _seconds(function, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def _full_parse():
+    # What extract_columns used to cost: group every statement in full.
+    for statement in STATEMENTS:
+        sqlparse.parse(statement)
+
+
+def _cold():
+    clear_parse_cache()
+    for statement in STATEMENTS:
+        extract_columns(statement)
+
+
+def _warm():
+    for statement in STATEMENTS:
+        extract_columns(statement)
+
+
+def _cold_split():
+    clear_parse_cache()
+    for statement in sqlparse.split(SCRIPT):
+        extract_columns(statement)
+
+
+def _cold_script():
+    clear_parse_cache()
+    extract_columns_from_script(SCRIPT)
+
+
+def measure() -> dict[str, float]:
+    timings = {
+        "full sqlparse.parse": _seconds(_full_parse),
+        "extract_columns, cold cache": _seconds(_cold),
+        "sqlparse.split + extract_columns, cold cache": _seconds(_cold_split),
+        "extract_columns_from_script, cold cache": _seconds(_cold_script),
+    }
+    _warm()
+    timings["extract_columns, warm cache"] = _seconds(_warm)
+    return timings
+
+
+def test_each_statement_is_parsed_once_and_then_served_from_the_cache(monkeypatch):
+    parse = parse_sql._parse_select_list
+    parsed = []
+
+    def counting_parse(select_list):
+        parsed.append(select_list)
+        return parse(select_list)
+
+    monkeypatch.setattr(parse_sql, "_parse_select_list", counting_parse)
+    distinct_statements = len({normalize_sql(statement) for statement in STATEMENTS})
+
+    _cold()
+    assert len(parsed) == distinct_statements
+    _warm()
+    assert len(parsed) == distinct_statements
+
+    parsed.clear()
+    _cold_script()
+    assert len(parsed) == distinct_statements
+
+
+if __name__ == "__main__":
+    for name, seconds in measure().items():
+        print(f"{name:<46} {seconds * 1000:9.3f} ms")
@@ -0,0 +1,106 @@
+import io
+import os
+import subprocess
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+from etl import profiling
+from etl.profiling import HyperLogLog, ProfilingReader, TableProfile
+
+HEADER = ["order_id", "customer_id", "order_purchase_timestamp", "note"]
+CSV_TEXT = (
+    'o1,c1,2017-10-02 10:56:33,"multi\nline, ""quoted"""\n'
+    "o2,c2,2018-07-24 20:41:37,\n"
+    ",c2,not-a-date,plain\n"
+    "o4,c4,,\n"
+    "o5,c5\n"
+    "o6,c6,2016-09-04 21:15:19,last"
+)
+
+
+def _profile(keys=()):
+    return TableProfile.for_header(
+        "staging.orders", HEADER, {"order_purchase_timestamp": datetime.fromisoformat}, keys=keys
+    )
+
+
+@pytest.mark.parametrize("chunk", [1, 7, 64, 1024])
+def test_reader_profiles_every_record_whatever_the_chunk_size(chunk):
+    profile = _profile()
+    reader = ProfilingReader(io.BytesIO(CSV_TEXT.encode()), profile)
+    copied = b""
+    while data := reader.read(chunk):
+        copied += data
+
+    assert copied == CSV_TEXT.encode()
+    assert (profile.rows, profile.malformed_rows) == (6, 1)
+    timestamps = profile.columns["order_purchase_timestamp"]
+    assert (timestamps.nulls, timestamps.parse_failures) == (1, 1)
+    assert (timestamps.minimum, timestamps.maximum) == (
+        datetime(2016, 9, 4, 21, 15, 19),
+        datetime(2018, 7, 24, 20, 41, 37),
+    )
+    assert (profile.columns["note"].nulls, profile.columns["note"].distinct.estimate()) == (2, 3)
+    assert profile.columns["customer_id"].distinct.estimate() == 4
+
+
+def test_issues_report_empty_keys_duplicates_and_parse_failures(monkeypatch):
+    # Past the limit, duplicates are only estimated from the sketch.
+    monkeypatch.setattr(profiling, "EXACT_KEY_LIMIT", 1000)
+    profile = _profile(keys=["order_id"])
+    profile.add_rows([[f"o{i}", f"c{i}", "2017-01-01 00:00:00", ""] for i in range(5000)])
+    profile.add_rows([[f"o{i}", "c0", "2017-01-01", ""] for i in range(100)] + [["", "c0", "yesterday", ""]])
+
+    empty, duplicated, unparsed = profile.issues(required=["order_id"], unique=["order_id"])
+    assert empty == "1 rows have an empty order_id"
+    assert duplicated.startswith("order_id looks duplicated") and duplicated.endswith("in 5100 rows")
+    assert unparsed == "1 values of order_purchase_timestamp could not be parsed"
+
+
+def test_a_single_duplicate_key_is_found():
+    left, right = _profile(keys=["order_id"]), _profile(keys=["order_id"])
+    left.add_rows([[f"o{i}", "c0", "", ""] for i in range(50000)])
+    right.add_rows([["o123", "c0", "", ""]])
+    left.merge(right)
+
+    assert left.issues(unique=["order_id"]) == ["order_id has 1 duplicates in 50001 rows"]
+
+
+def test_merged_sketches_count_the_union():
+    left, right = HyperLogLog(), HyperLogLog()
+    left.update(str(i) for i in range(0, 60000))
+    right.update(str(i) for i in range(40000, 100000))
+    left.merge(right)
+
+    assert abs(left.estimate() - 100000) < 100000 * 3 * left.relative_error
+
+
+def test_exact_keys_stop_at_the_limit_shared_by_the_key_columns():
+    profile = TableProfile.for_header("staging.orders", HEADER, keys=["order_id", "customer_id"], exact_key_limit=20)
+    profile.add_rows([[f"o{i}", f"c{i % 5}", "", ""] for i in range(11)])
+
+    assert profile.columns["order_id"].values is None
+    assert profile.columns["customer_id"].values == {f"c{i}" for i in range(5)}
+
+
+def test_sketches_from_other_processes_can_be_merged():
+    script = (
+        "from etl.profiling import HyperLogLog; sketch = HyperLogLog(); "
+        "sketch.update(str(i) for i in range(1000)); print(sketch.registers.hex())"
+    )
+    registers = {
+        subprocess.run(
+            [sys.executable, "-c", script],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=Path(__file__).resolve().parents[1],
+            env={**os.environ, "PYTHONHASHSEED": seed},
+        ).stdout
+        for seed in ("1", "2")
+    }
+
+    assert len(registers) == 1
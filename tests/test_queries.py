@@ -0,0 +1,113 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from _types import JobRequest
+from main import app
+from queries import CUSTOMER_SQL, WarehouseReader
+from tasks import JobRunner
+
+
+class FakePool:
+    """Stands in for an asyncpg pool; answers every query with ``rows`` after ``release`` is set."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = 0
+        self.release = asyncio.Event()
+        self.release.set()
+
+    async def fetch(self, sql, *args):
+        self.calls += 1
+        await self.release.wait()
+        return self.rows
+
+    async def close(self):
+        pass
+
+
+def _reader(rows):
+    reader = WarehouseReader(dsn="postgresql://unused")
+    reader._pool = FakePool(rows)
+    return reader
+
+
+def test_concurrent_misses_share_one_query():
+    async def main():
+        reader = _reader([{"customer_id": "c1"}])
+        reader._pool.release.clear()
+        pending = [asyncio.create_task(reader.first(CUSTOMER_SQL, "c1")) for _ in range(5)]
+        await asyncio.sleep(0)
+        reader._pool.release.set()
+        results = await asyncio.gather(*pending)
+        await reader.first(CUSTOMER_SQL, "c1")
+        return reader._pool.calls, results
+
+    calls, results = asyncio.run(main())
+
+    assert calls == 1
+    assert results == [{"customer_id": "c1"}] * 5
+
+
+def test_waiting_requests_survive_the_cancelled_request_running_their_query():
+    async def main():
+        reader = _reader([{"customer_id": "c1"}])
+        reader._pool.release.clear()
+        leader = asyncio.create_task(reader.first(CUSTOMER_SQL, "c1"))
+        await asyncio.sleep(0)
+        followers = [asyncio.create_task(reader.first(CUSTOMER_SQL, "c1")) for _ in range(3)]
+        await asyncio.sleep(0)
+        leader.cancel()
+        await asyncio.sleep(0)
+        reader._pool.release.set()
+        return leader, await asyncio.gather(*followers), reader._pool.calls
+
+    leader, results, calls = asyncio.run(main())
+
+    assert leader.cancelled()
+    assert results == [{"customer_id": "c1"}] * 3
+    assert calls == 2
+
+
+def test_invalidate_during_a_query_does_not_cache_its_rows():
+    async def main():
+        reader = _reader([{"customer_id": "old"}])
+        reader._pool.release.clear()
+        pending = asyncio.create_task(reader.first(CUSTOMER_SQL, "c1"))
+        await asyncio.sleep(0)
+        reader.invalidate()
+        reader._pool.release.set()
+        stale = await pending
+        reader._pool.rows = [{"customer_id": "new"}]
+        return stale, await reader.first(CUSTOMER_SQL, "c1"), reader._pool.calls
+
+    stale, fresh, calls = asyncio.run(main())
+
+    assert stale == {"customer_id": "old"}
+    assert fresh == {"customer_id": "new"}
+    assert calls == 2
+
+
+def test_finished_job_invalidates_cached_reads():
+    customer = {
+        "customer_sk": 1,
+        "customer_id": "c1",
+        "customer_unique_id": "u1",
+        "zip_code_prefix": "01000",
+        "city": "sao paulo",
+        "state": "SP",
+    }
+    with TestClient(app) as client:
+        app.state.warehouse._pool = pool = FakePool([customer])
+        jobs = JobRunner(workers=1, queue_size=1, job=lambda job_request: None, on_finished=app.state.jobs.on_finished)
+
+        assert client.get("/customers/c1").json() == customer
+        assert client.get("/customers/c1").json() == customer
+        assert pool.calls == 1
+
+        jobs.submit(JobRequest(job_id="etl"))
+        jobs.shutdown()
+        pool.rows = []
+
+        assert client.get("/customers/c1").status_code == 404
+        assert pool.calls == 2
@@ -0,0 +1,31 @@
+import pytest
+
+from etl import scheduler
+from etl.instrumentation import StatementTiming
+from etl.scheduler import SqlNode, run_sql_graph
+
+
+def test_failed_node_still_publishes_finished_timings(monkeypatch):
+    started = []
+    published = []
+
+    def run_node(block_name, node, task_name, explain, timings):
+        started.append(node.name)
+        for label, _ in node.statements:
+            if label == "fail":
+                raise RuntimeError("boom")
+            timings.append(StatementTiming(label=label, seconds=0.0, rows=1))
+
+    monkeypatch.setattr(scheduler, "_run_node", run_node)
+    monkeypatch.setattr(scheduler, "publish_timings", lambda task_name, timings: published.append(timings))
+    nodes = [
+        SqlNode("a", (("a1", "SELECT 1;"),)),
+        SqlNode("b", (("b1", "SELECT 1;"), ("fail", "SELECT 1;")), depends_on=("a",)),
+        SqlNode("c", (("c1", "SELECT 1;"),), depends_on=("b",)),
+    ]
+
+    with pytest.raises(RuntimeError, match="boom"):
+        run_sql_graph("block", nodes, "load", max_parallel=2)
+
+    assert started == ["a", "b"]
+    assert [[timing.label for timing in timings] for timings in published] == [["a1", "b1"]]
@@ -0,0 +1,44 @@
+import bz2
+import gzip
+import lzma
+import zipfile
+
+import pytest
+
+from etl.sources import SourceFile
+
+CSV_TEXT = '\ufefforder_id,note\no1,"two\nlines"\no2,plain\n'
+
+
+@pytest.mark.parametrize(
+    "name, compress",
+    [
+        ("orders.csv", lambda data: data),
+        ("orders.csv.gz", gzip.compress),
+        ("orders.csv.bz2", bz2.compress),
+        ("orders.csv.xz", lzma.compress),
+    ],
+)
+def test_compressed_files_stream_as_text(tmp_path, name, compress):
+    (tmp_path / name).write_bytes(compress(CSV_TEXT.encode()))
+    source = SourceFile.at(tmp_path / name)
+
+    with source.open_text() as handle:
+        assert handle.read() == CSV_TEXT.lstrip("\ufeff")
+    assert source.compressed == (name != "orders.csv")
+
+
+def test_zip_members_are_addressed_through_the_archive(tmp_path):
+    with zipfile.ZipFile(tmp_path / "olist.zip", "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("olist/orders.csv", CSV_TEXT)
+        archive.writestr("olist/items.csv", "order_id\n")
+    source = SourceFile.at(tmp_path / "olist.zip" / "olist" / "orders.csv")
+
+    assert (source.path, source.member) == (tmp_path / "olist.zip", "olist/orders.csv")
+    assert source.name == "olist.zip/olist/orders.csv"
+    assert source.stat()[0] == len(CSV_TEXT.encode())
+    with source.open_text() as handle:
+        assert handle.readline() == "order_id,note\n"
+        assert handle.read() == 'o1,"two\nlines"\no2,plain\n'
+    with pytest.raises(ValueError):
+        SourceFile.at(tmp_path / "olist.zip")
@@ -0,0 +1,60 @@
+import csv
+
+from etl.flows.transform import csv_sink, drain, table_sink
+
+COLUMNS = ["post_id", "title"]
+
+
+class _Connector:
+    def __init__(self):
+        self.calls = []
+
+    def execute_many(self, operation, seq_of_parameters):
+        self.calls.append((operation, seq_of_parameters))
+
+
+def _batches(*batches):
+    return iter([(COLUMNS, rows) for rows in batches])
+
+
+def test_drain_feeds_every_batch_and_counts_the_rows():
+    seen = []
+
+    total = drain(_batches([(1, "a"), (2, "b")], [(3, "c")]), lambda columns, rows: seen.append((columns, rows)))
+
+    assert total == 3
+    assert seen == [(COLUMNS, [(1, "a"), (2, "b")]), (COLUMNS, [(3, "c")])]
+
+
+def test_csv_sink_writes_the_header_once(tmp_path):
+    path = tmp_path / "posts.csv"
+    with csv_sink(path) as sink:
+        drain(_batches([(1, "a, quoted")], [(2, "multi\nline")]), sink)
+
+    with path.open(newline="") as handle:
+        assert list(csv.reader(handle)) == [COLUMNS, ["1", "a, quoted"], ["2", "multi\nline"]]
+
+
+def test_csv_sink_writes_a_header_for_an_empty_result(tmp_path):
+    path = tmp_path / "posts.csv"
+    with csv_sink(path) as sink:
+        assert drain(_batches([]), sink) == 0
+
+    assert path.read_text() == "post_id,title\n"
+
+
+def test_table_sink_inserts_one_batch_per_call_and_skips_empty_ones():
+    connector = _Connector()
+    sink = table_sink(connector, "posts_copy")
+
+    assert drain(_batches([(1, "a"), (2, "b")], [], [(3, "c")]), sink) == 3
+    assert connector.calls == [
+        (
+            "INSERT INTO posts_copy (post_id, title) VALUES (:post_id, :title);",
+            [{"post_id": 1, "title": "a"}, {"post_id": 2, "title": "b"}],
+        ),
+        (
+            "INSERT INTO posts_copy (post_id, title) VALUES (:post_id, :title);",
+            [{"post_id": 3, "title": "c"}],
+        ),
+    ]